@@ -0,0 +1,113 @@
+"""
+Compare converting a long source to mp3 in a single ffmpeg process with converting it in chunks encoded in parallel.
+Also checks that chunk boundaries are gapless by comparing decoded samples of both outputs.
+Usage: python benchmarks/bench_chunked_transcode.py [-l LENGTH] [-c N_CHUNKS]
+"""
+import os
+import time
+import array
+import argparse
+import pathlib
+import tempfile
+import subprocess
+
+from ytcompdl import ffmpeg_utils
+from ytcompdl.ffmpeg_utils import convert_audio, convert_audio_chunked
+
+SAMPLE_RATE = 44100
+
+
+def make_source(output_fname: str, length: int) -> None:
+    """
+    Generate a synthetic aac source with lavfi. A sweep so misaligned samples don't cancel out.
+    """
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"aevalsrc=0.5*sin(2*PI*(200+5*t)*t):s={SAMPLE_RATE}:d={length}",
+            "-c:a",
+            "aac",
+            output_fname,
+        ],
+        check=True,
+    )
+
+
+def decode(fname: str) -> array.array:
+    """
+    Decode audio to mono 16-bit samples.
+    """
+    pcm = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", fname, "-ac", "1", "-f", "s16le", "-"],
+        capture_output=True,
+        check=True,
+    ).stdout
+    samples = array.array("h")
+    samples.frombytes(pcm)
+    return samples
+
+
+def max_boundary_error(single: str, chunked: str, bounds) -> int:
+    """
+    Largest sample difference between outputs around each chunk boundary.
+    Single output is aligned to the chunked output by its offset at the first boundary.
+    """
+    single_samples, chunked_samples = decode(single), decode(chunked)
+    frame = ffmpeg_utils.MP3_FRAME_SAMPLES
+    window = 4 * frame
+
+    def diff(offset: int, pos: int) -> int:
+        return max(
+            abs(single_samples[i + offset] - chunked_samples[i])
+            for i in range(pos - window, pos + window)
+        )
+
+    first = bounds[1] * frame
+    offset = min(range(-2 * frame, 2 * frame), key=lambda off: diff(off, first))
+    return max(diff(offset, bound * frame) for bound in bounds[1:-1])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("-l", "--length", default=1800, type=int)
+    ap.add_argument("-c", "--n_chunks", default=os.cpu_count() or 1, type=int)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        src = str(workdir / "source.m4a")
+        make_source(src, args.length)
+
+        single = str(workdir / "single.mp3")
+        start = time.perf_counter()
+        convert_audio(src, single, remove_original=False)
+        single_time = time.perf_counter() - start
+
+        chunked = str(workdir / "chunked.mp3")
+        start = time.perf_counter()
+        convert_audio_chunked(src, chunked, args.n_chunks, remove_original=False)
+        chunked_time = time.perf_counter() - start
+
+        bounds = ffmpeg_utils.mp3_chunk_bounds(args.length, SAMPLE_RATE, args.n_chunks)
+        print(f"\n{args.length}s source, {len(bounds) - 1} chunks")
+        print(f"{'single':>8} {single_time:>8.2f}s")
+        print(
+            f"{'chunked':>8} {chunked_time:>8.2f}s ({single_time / chunked_time:.2f}x)"
+        )
+        if len(bounds) > 2:
+            # Encoders differ by a few LSB. A gap or overlap shows up as a large error.
+            print(
+                f"max sample error at boundaries: {max_boundary_error(single, chunked, bounds)}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
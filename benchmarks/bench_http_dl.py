@@ -0,0 +1,110 @@
+"""
+Download throughput with different numbers of connections from a local HTTP server supporting Range requests.
+Each response is throttled like YouTube throttles a single connection. Every download is checked against the source.
+The server can also drop connections mid-response or ignore Range headers to exercise retries and the fallback.
+Usage: python benchmarks/bench_http_dl.py [-s SIZE_MB] [-r RATE_MBPS] [-c 1 2 4 8] [--drop] [--no-ranges]
+"""
+import os
+import re
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ytcompdl import http_dl
+
+# Small segments so a short benchmark still has many ranges.
+SEGMENT_SIZE = 1024**2
+
+
+def make_handler(payload: bytes, rate: float, drop: bool, ranges: bool):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, len(payload) - 1
+            range_match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if ranges and range_match:
+                start = int(range_match.group(1))
+                end = min(int(range_match.group(2) or end), end)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+
+            body = memoryview(payload)[start : end + 1]
+            # Drop some responses partway through.
+            drop_at = (
+                random.randrange(len(body))
+                if drop and len(body) > 1 and random.random() < 0.2
+                else None
+            )
+            step = 64 * 1024
+            for pos in range(0, len(body), step):
+                if drop_at is not None and pos >= drop_at:
+                    self.close_connection = True
+                    return
+                self.wfile.write(body[pos : pos + step])
+                time.sleep(step / rate)
+
+    return Handler
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients close connections early. ex. size probes of servers without ranges.
+        pass
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("-s", "--size", default=32, type=int, help="File size in MB.")
+    ap.add_argument("-r", "--rate", default=8, type=float, help="MB/s per connection.")
+    ap.add_argument("-c", "--connections", nargs="+", default=[1, 2, 4, 8], type=int)
+    ap.add_argument("--drop", action="store_true", help="Drop some responses.")
+    ap.add_argument("--no-ranges", action="store_true", help="Ignore Range headers.")
+    args = ap.parse_args()
+
+    payload = os.urandom(args.size * 1024**2)
+    checksum = hashlib.sha256(payload).hexdigest()
+    handler = make_handler(
+        payload, args.rate * 1024**2, args.drop, not args.no_ranges
+    )
+    server = QuietServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/stream"
+
+    print(f"{args.size} MB at {args.rate} MB/s per connection")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_connections in args.connections:
+            output_fname = os.path.join(tmp, f"{n_connections}.bin")
+            start = time.perf_counter()
+            http_dl.download(
+                url,
+                output_fname,
+                n_connections=n_connections,
+                segment_size=SEGMENT_SIZE,
+            )
+            elapsed = time.perf_counter() - start
+            with open(output_fname, "rb") as output_file:
+                ok = hashlib.sha256(output_file.read()).hexdigest() == checksum
+            failed |= not ok
+            print(
+                f"{n_connections:>3} connections {args.size / elapsed:>8.1f} MB/s "
+                f"{'ok' if ok else 'CORRUPT'}"
+            )
+    server.shutdown()
+    return int(failed)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+"""
+Startup cost of the CLI. Measures import time of ytcompdl.__main__ with -X importtime and wall time of help and
+usage errors against bare interpreter startup.
+Fails if the import time is over budget or if a heavy dependency is imported before args are parsed.
+Usage: python benchmarks/bench_import_time.py [-b BUDGET_MS] [-n N_RUNS]
+"""
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+# Only needed once a job runs.
+HEAVY_MODULES = (
+    "googleapiclient",
+    "pytube",
+    "tqdm",
+    "ffmpeg",
+    "yaml",
+    "dotenv",
+    "requests",
+)
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """
+    Cumulative import time of each module imported by a fresh interpreter importing module.
+    :return: microseconds keyed by module name.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    # ex. import time:       175 |      48125 |             google.auth.crypt
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def wall_ms(cmd: List[str], n_runs: int) -> float:
+    """
+    Median wall time of a command in ms. Exit code is ignored. ex. usage errors exit with 2.
+    """
+    elapsed = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed.append((time.perf_counter() - start) * 1000)
+    return statistics.median(elapsed)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument(
+        "-b", "--budget", default=50, type=float, help="Max import time in ms."
+    )
+    ap.add_argument("-n", "--n_runs", default=10, type=int)
+    args = ap.parse_args()
+
+    # Best of several runs as the first may read modules from a cold disk cache.
+    runs = [import_times("ytcompdl.__main__") for _ in range(args.n_runs)]
+    import_ms = min(times["ytcompdl.__main__"] for times in runs) / 1000
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)
+    heavy = sorted(
+        name
+        for name in runs[-1]
+        if any(name == mod or name.startswith(f"{mod}.") for mod in HEAVY_MODULES)
+    )
+
+    baseline_ms = wall_ms([sys.executable, "-c", "pass"], args.n_runs)
+    print(f"{'python -c pass':<28} {baseline_ms:>8.1f} ms")
+    for cli_args in (["-h"], [], ["-u", "x"]):
+        cmd = [sys.executable, "-m", "ytcompdl", *cli_args]
+        print(
+            f"{' '.join(['ytcompdl', *cli_args]):<28} {wall_ms(cmd, args.n_runs):>8.1f} ms"
+        )
+
+    print("\nSlowest imports (cumulative):")
+    for name, usec in slowest[:10]:
+        print(f"{usec / 1000:>8.1f} ms {name}")
+
+    failed = False
+    print(
+        f"\nimport ytcompdl.__main__: {import_ms:.1f} ms (budget {args.budget:.1f} ms)"
+    )
+    if import_ms > args.budget:
+        print("FAIL: over budget.")
+        failed = True
+    if heavy:
+        print(f"FAIL: imported before args are parsed: {', '.join(heavy[:10])}")
+        failed = True
+    return int(failed)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
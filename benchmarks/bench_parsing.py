@@ -0,0 +1,201 @@
+"""
+Benchmark timestamp parsing, validation, formatting and comment ranking on synthetic comment corpora.
+Runs without network access on a YTCompDL with injected video information.
+Reports ops/sec (passes over a corpus) and peak memory and fails on regressions against a baseline.
+Usage: python benchmarks/bench_parsing.py [-n N_COMMENTS] [-b BASELINE] [--update-baseline] [-t THRESHOLD]
+Or as a module from the repo root: python -m benchmarks.bench_parsing
+A baseline is machine-specific so create one with --update-baseline before checking for regressions.
+"""
+import json
+import dataclasses
+import timeit
+import argparse
+import pathlib
+import tracemalloc
+from typing import Callable, Dict, List
+
+try:
+    from .corpora import VIDEO_SECONDS, build_corpora
+except ImportError:
+    # Run as a script. ex. python benchmarks/bench_parsing.py
+    from corpora import VIDEO_SECONDS, build_corpora
+from ytcompdl.yt_comp_dl import YTCompDL
+from ytcompdl.video_info import VideoInfo
+
+DEFAULT_BASELINE = pathlib.Path(__file__).with_name("baseline_parsing.json")
+
+
+def fake_ytcompdl(regex_config: str) -> YTCompDL:
+    """
+    YTCompDL with video information injected instead of requested from the API.
+    """
+    dl = object.__new__(YTCompDL)
+    dl.regex_config = regex_config
+    dl.load_config_regex()
+    dl.info = VideoInfo.from_response(
+        "benchmark",
+        {
+            "snippet": {"title": "Benchmark", "description": "", "channelTitle": ""},
+            "contentDetails": {"duration": f"PT{VIDEO_SECONDS // 3600}H0M0S"},
+        },
+    )
+    dl.choose_comment = False
+    # Rank whole corpus.
+    dl.good_enough = float("inf")
+    dl.save_timestamps = False
+    return dl
+
+
+def uniform_timestamps(dl: YTCompDL, corpus: List[str]) -> Dict[str, list]:
+    """
+    Found timestamps of each comment with a single timestamp style.
+    """
+    found = {comment: list(dl.find_timestamps(comment)) for comment in corpus}
+    return {
+        comment: timestamps
+        for comment, timestamps in found.items()
+        if timestamps and len({len(timestamp) for timestamp in timestamps}) == 1
+    }
+
+
+def cases(dl: YTCompDL, corpus: List[str]) -> Dict[str, Callable[[], None]]:
+    """
+    Functions to benchmark. Each call is one pass over the corpus.
+    """
+    comment_timestamps = uniform_timestamps(dl, corpus)
+    found = list(comment_timestamps.values())
+    valid = []
+    for comment, timestamps in comment_timestamps.items():
+        dl.set_timestamp_style(timestamps)
+        if dl.validate_timestamps(timestamps):
+            valid.append(comment)
+
+    def find_timestamps():
+        for comment in corpus:
+            list(dl.find_timestamps(comment))
+
+    def clean_timestamps():
+        for timestamps in found:
+            dl.clean_timestamps(timestamps)
+
+    def set_timestamp_style():
+        for timestamps in found:
+            dl.set_timestamp_style(timestamps)
+
+    def validate_timestamps():
+        for timestamps in found:
+            dl.set_timestamp_style(timestamps)
+            dl.validate_timestamps(timestamps)
+
+    def format_timestamps():
+        for description in valid:
+            dl.info = dataclasses.replace(dl.info, description=description)
+            dl.format_timestamps()
+
+    def rank_comments():
+        dl.rank_comments(iter(corpus))
+
+    return {
+        func.__name__: func
+        for func in (
+            find_timestamps,
+            clean_timestamps,
+            set_timestamp_style,
+            validate_timestamps,
+            format_timestamps,
+            rank_comments,
+        )
+    }
+
+
+def measure(func: Callable[[], None], repeat: int) -> Dict[str, float]:
+    timer = timeit.Timer(func)
+    ops_per_sec = max(
+        number / elapsed
+        for number, elapsed in (timer.autorange() for _ in range(repeat))
+    )
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ops_per_sec": round(ops_per_sec, 2), "peak_kib": round(peak / 1024, 1)}
+
+
+def regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """
+    Cases slower or using more memory than baseline by more than threshold (0-1).
+    """
+    failed = []
+    for name, res in results.items():
+        if not (base := baseline.get(name)):
+            continue
+        if res["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            failed.append(
+                f"{name}: {res['ops_per_sec']} ops/sec < baseline {base['ops_per_sec']}"
+            )
+        if res["peak_kib"] > base["peak_kib"] * (1 + threshold):
+            failed.append(
+                f"{name}: {res['peak_kib']} KiB peak > baseline {base['peak_kib']}"
+            )
+    return failed
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("-x", "--regex_cfg", default="config/config_regex.yaml")
+    ap.add_argument("-n", "--n_comments", default=500, type=int)
+    ap.add_argument("-r", "--repeat", default=3, type=int)
+    ap.add_argument("-s", "--seed", default=0, type=int)
+    ap.add_argument("-b", "--baseline", default=DEFAULT_BASELINE, type=pathlib.Path)
+    ap.add_argument("-t", "--threshold", default=0.2, type=float)
+    ap.add_argument(
+        "-k", "--filter", default="", help="Only run cases containing this string."
+    )
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args()
+
+    dl = fake_ytcompdl(args.regex_cfg)
+    results = {}
+    print(f"{'case':>34} {'ops/sec':>10} {'peak KiB':>10}")
+    for corpus_name, corpus in build_corpora(args.n_comments, args.seed).items():
+        for func_name, func in cases(dl, corpus).items():
+            if args.filter not in (name := f"{corpus_name}/{func_name}"):
+                continue
+            results[name] = measure(func, args.repeat)
+            print(
+                f"{name:>34} {results[name]['ops_per_sec']:>10.1f} {results[name]['peak_kib']:>10.1f}"
+            )
+
+    if args.update_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        print(f"Baseline saved to {args.baseline}.")
+        return 0
+
+    if not args.baseline.exists():
+        print(
+            f"No baseline at {args.baseline}. Run with --update-baseline to create one."
+        )
+        # Nothing was checked so don't report success.
+        return 1
+
+    if failed := regressions(
+        results, json.loads(args.baseline.read_text()), args.threshold
+    ):
+        print(f"Regressions (threshold {args.threshold:.0%}):")
+        for msg in failed:
+            print(f"  {msg}")
+        return 1
+    print(f"No regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+"""
+Compare the three pass (slice -> fade -> metadata) track pipeline with the single pass render_track.
+Usage: python benchmarks/bench_render_track.py [-o audio|video] [-n N_TRACKS] [-l TRACK_LENGTH]
+"""
+import os
+import time
+import argparse
+import pathlib
+import tempfile
+import subprocess
+
+from ytcompdl.ffmpeg_utils import slice_source, apply_fade, apply_metadata, render_track
+
+TAGS = {"album": "Benchmark", "album_artist": "ytcompdl"}
+
+
+def make_source(output_fname: str, output_type: str, length: int) -> None:
+    """
+    Generate a synthetic source file with lavfi.
+    """
+    inputs = ["-f", "lavfi", "-i", f"sine=frequency=440:duration={length}"]
+    if output_type == "video":
+        inputs += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=size=640x360:rate=30:duration={length}",
+        ]
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *inputs, output_fname],
+        check=True,
+    )
+
+
+def three_pass(src: str, workdir: pathlib.Path, ext: str, tracks, fade_end, fade_time):
+    bytes_written = 0
+    for num, duration in enumerate(tracks, 1):
+        slice_path = slice_source(src, str(workdir / f"slice_{num}.{ext}"), duration)
+        bytes_written += os.path.getsize(slice_path)
+        fade_path = apply_fade(
+            slice_path,
+            str(workdir / f"fade_{num}.{ext}"),
+            fade_end=fade_end,
+            duration=duration,
+            seconds=fade_time,
+            remove_original=False,
+        )
+        if fade_path != slice_path:
+            bytes_written += os.path.getsize(fade_path)
+        final = apply_metadata(
+            fade_path,
+            str(workdir / f"three_{num}.{ext}"),
+            f"Track {num}",
+            num,
+            TAGS,
+            remove_original=False,
+        )
+        bytes_written += os.path.getsize(final)
+        for path in {slice_path, fade_path}:
+            os.remove(path)
+    return bytes_written
+
+
+def single_pass(src: str, workdir: pathlib.Path, ext: str, tracks, fade_end, fade_time):
+    bytes_written = 0
+    for num, duration in enumerate(tracks, 1):
+        final = render_track(
+            src,
+            str(workdir / f"single_{num}.{ext}"),
+            duration,
+            f"Track {num}",
+            num,
+            TAGS,
+            fade_end=fade_end,
+            seconds=fade_time,
+        )
+        bytes_written += os.path.getsize(final)
+    return bytes_written
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("-o", "--output_type", default="audio", choices=("audio", "video"))
+    ap.add_argument("-n", "--n_tracks", default=10, type=int)
+    ap.add_argument("-l", "--track_length", default=30, type=int)
+    ap.add_argument("-f", "--fade", default="both")
+    ap.add_argument("-ft", "--fade_time", default=0.5, type=float)
+    args = ap.parse_args()
+
+    ext = "mp3" if args.output_type == "audio" else "mp4"
+    tracks = [
+        (i * args.track_length, (i + 1) * args.track_length)
+        for i in range(args.n_tracks)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        src = str(workdir / f"source.{ext}")
+        make_source(src, args.output_type, args.n_tracks * args.track_length)
+
+        results = {}
+        for name, func in (("three_pass", three_pass), ("single_pass", single_pass)):
+            start = time.perf_counter()
+            bytes_written = func(src, workdir, ext, tracks, args.fade, args.fade_time)
+            elapsed = time.perf_counter() - start
+            results[name] = (elapsed, bytes_written)
+
+    print(f"{args.n_tracks} {args.output_type} tracks, fade: {args.fade}")
+    for name, (elapsed, bytes_written) in results.items():
+        print(
+            f"{name:>12}: {elapsed / args.n_tracks * 1000:8.1f} ms/track "
+            f"{bytes_written / args.n_tracks / 1024:10.1f} KiB written/track"
+        )
+    three, single = results["three_pass"], results["single_pass"]
+    print(
+        f"{'savings':>12}: {(1 - single[0] / three[0]) * 100:8.1f} % time "
+        f"{(1 - single[1] / three[1]) * 100:10.1f} % bytes"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
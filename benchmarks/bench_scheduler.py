@@ -0,0 +1,103 @@
+"""
+Throughput of rendering tracks with different splits of a CPU budget between concurrent ffmpeg jobs and threads per job.
+Each worker count is run with ffmpeg's default threads (all cores per job) and with the budget split between jobs.
+Usage: python benchmarks/bench_scheduler.py [-o audio|video] [-n N_TRACKS] [-l TRACK_LENGTH] [-c CPU_BUDGET]
+"""
+import os
+import time
+import argparse
+import pathlib
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+try:
+    from .bench_render_track import TAGS, make_source
+except ImportError:
+    # Run as a script. ex. python benchmarks/bench_scheduler.py
+    from bench_render_track import TAGS, make_source
+from ytcompdl.ffmpeg_utils import render_track
+from ytcompdl.scheduler import plan, job_kind
+
+
+def run(
+    src: str, workdir: pathlib.Path, ext: str, tracks, n_workers: int, threads: int
+) -> float:
+    """
+    Render all tracks with n_workers concurrent ffmpeg jobs.
+    :return: tracks per second
+    """
+    args = [
+        (
+            src,
+            str(workdir / f"{n_workers}_{threads}_{num}.{ext}"),
+            duration,
+            f"Track {num}",
+            num,
+            TAGS,
+        )
+        for num, duration in enumerate(tracks, 1)
+    ]
+
+    def render(arg):
+        render_track(
+            *arg,
+            fade_end="both",
+            seconds=0.5,
+            threads=threads,
+            filter_threads=max(1, threads // 2) if threads else 0,
+        )
+        os.remove(arg[1])
+
+    start = time.perf_counter()
+    with ThreadPool(n_workers) as pool:
+        pool.map(render, args)
+    return len(tracks) / (time.perf_counter() - start)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("-o", "--output_type", default="video", choices=("audio", "video"))
+    ap.add_argument("-n", "--n_tracks", default=8, type=int)
+    ap.add_argument("-l", "--track_length", default=10, type=int)
+    ap.add_argument("-c", "--cpu_budget", default=os.cpu_count() or 1, type=int)
+    args = ap.parse_args()
+
+    ext = "mp3" if args.output_type == "audio" else "mp4"
+    tracks = [
+        (i * args.track_length, (i + 1) * args.track_length)
+        for i in range(args.n_tracks)
+    ]
+    scheduled = plan(
+        job_kind(args.output_type, stream_copy=False), args.n_tracks, args.cpu_budget
+    )
+    worker_counts = sorted(
+        {1, 2, args.cpu_budget // 2, args.cpu_budget, scheduled.n_workers} - {0}
+    )
+
+    print(
+        f"{args.n_tracks} {args.output_type} tracks of {args.track_length}s, budget {args.cpu_budget} cores"
+    )
+    print(f"scheduler: {scheduled.n_workers} workers x {scheduled.threads} threads")
+    print(f"{'workers':>8} {'default threads':>16} {'split threads':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        src = str(workdir / f"source.{ext}")
+        make_source(src, args.output_type, args.n_tracks * args.track_length)
+        for n_workers in worker_counts:
+            threads = (
+                max(1, args.cpu_budget // n_workers)
+                if args.output_type == "video"
+                else 1
+            )
+            default = run(src, workdir, ext, tracks, n_workers, 0)
+            split = run(src, workdir, ext, tracks, n_workers, threads)
+            marker = " <- scheduled" if n_workers == scheduled.n_workers else ""
+            print(
+                f"{n_workers:>8} {default:>12.2f} t/s {split:>10.2f} t/s "
+                f"(x{threads} threads){marker}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
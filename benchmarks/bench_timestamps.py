@@ -0,0 +1,88 @@
+"""
+Compare the legacy pad + strptime timestamp conversion with the integer millisecond parser.
+Usage: python benchmarks/bench_timestamps.py [-n N_TIMESTAMPS] [-r REPEAT] [-s SEED]
+"""
+import time
+import random
+import argparse
+import datetime
+
+from ytcompdl.timestamps import parse_timestamp_ms
+
+BASE_TIME = datetime.datetime.strptime("1900-01-01 00:00:00", "%Y-%m-%d %H:%M:%S")
+
+
+def legacy_convert(str_time: str) -> int:
+    """
+    Previous YTCompDL.convert_str_time algorithm for a single time, in milliseconds.
+    """
+    while len(str_time) < 8:
+        if (len(str_time) + 1) % 3 == 0:
+            str_time = ":" + str_time
+        else:
+            str_time = "0" + str_time
+    delta = datetime.datetime.strptime(str_time, "%H:%M:%S") - BASE_TIME
+    return int(delta.total_seconds()) * 1000
+
+
+def make_corpus(n_timestamps: int, seed: int):
+    """
+    Mix of M:SS, MM:SS and H:MM:SS times as found in comments. Hours stay below 24 so both parsers accept them.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n_timestamps):
+        hours, minutes, seconds = (
+            rng.randrange(24),
+            rng.randrange(60),
+            rng.randrange(60),
+        )
+        style = rng.randrange(3)
+        if style == 0:
+            corpus.append(f"{minutes % 10}:{seconds:02}")
+        elif style == 1:
+            corpus.append(f"{minutes:02}:{seconds:02}")
+        else:
+            corpus.append(f"{hours}:{minutes:02}:{seconds:02}")
+    return corpus
+
+
+def best_of(func, corpus, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for str_time in corpus:
+            func(str_time)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("-n", "--n_timestamps", default=100_000, type=int)
+    ap.add_argument("-r", "--repeat", default=5, type=int)
+    ap.add_argument("-s", "--seed", default=0, type=int)
+    args = ap.parse_args()
+
+    corpus = make_corpus(args.n_timestamps, args.seed)
+    mismatches = [t for t in corpus if legacy_convert(t) != parse_timestamp_ms(t)]
+    if mismatches:
+        print(f"Parsers disagree on {len(mismatches)} timestamps. ex. {mismatches[:5]}")
+        return 1
+
+    results = {
+        "legacy": best_of(legacy_convert, corpus, args.repeat),
+        "parse_ms": best_of(parse_timestamp_ms, corpus, args.repeat),
+    }
+    print(f"{args.n_timestamps} timestamps, best of {args.repeat}")
+    for name, elapsed in results.items():
+        print(
+            f"{name:>10}: {elapsed * 1000:8.1f} ms "
+            f"{elapsed / args.n_timestamps * 1e9:8.0f} ns/timestamp"
+        )
+    print(f"{'speedup':>10}: {results['legacy'] / results['parse_ms']:8.1f} x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
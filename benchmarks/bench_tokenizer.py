@@ -0,0 +1,95 @@
+"""
+Compare the timestamp tokenizer with the start/duration regex chain on adversarial comment lines.
+Checks that the tokenizer's cost grows linearly with line length. Equivalence is tested in tests/test_tokenizer.py.
+Usage: python benchmarks/bench_tokenizer.py [-x REGEX_CFG] [-l MAX_LENGTH] [-r REPEAT]
+"""
+import time
+import random
+import argparse
+
+from ytcompdl.yt_comp_dl import load_regex_patterns
+
+
+def adversarial_lines(length: int, seed: int):
+    """
+    Long spam-like lines. Mostly spacers and punctuation that the (.*?)(?:spacers)*(time) patterns backtrack on.
+    """
+    rng = random.Random(seed)
+    punct = "-[]―.,!?~*=_ "
+    return {
+        "spacers": "-" * length,
+        "spacers_then_time": "[-" * (length // 2) + "1:00 title",
+        # Each start position backtracks through the whole spacer run.
+        "spacers_then_text": "-" * length + "x 1:00",
+        "spacers_then_duration": "-" * length + "x 1:00-2:00",
+        "punctuation": "".join(rng.choice(punct) for _ in range(length)),
+        "near_times": "1:" * (length // 2),
+        "digits_colons": "".join(rng.choice("0123456789:-") for _ in range(length)),
+        "time_at_end": "x" * length + " 1:00",
+    }
+
+
+def regex_chain(patterns, line):
+    time_regex, _, start_regex, dur_regex, _ = patterns
+    if timestamps := time_regex.findall(line):
+        if len(timestamps) == 1:
+            return start_regex.findall(line)
+        elif len(timestamps) == 2:
+            return dur_regex.findall(line)
+    return []
+
+
+def tokenizer(patterns, line):
+    timestamp = patterns[-1].tokenize(line)
+    return [timestamp] if timestamp else []
+
+
+def best_of(func, patterns, line, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(patterns, line)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("-x", "--regex_cfg", default="config/config_regex.yaml")
+    ap.add_argument("-l", "--max_length", default=4000, type=int)
+    ap.add_argument("-r", "--repeat", default=5, type=int)
+    ap.add_argument("-s", "--seed", default=0, type=int)
+    args = ap.parse_args()
+
+    patterns = load_regex_patterns(args.regex_cfg)
+    if patterns[-1] is None:
+        print("Config has custom timestamp patterns. Tokenizer not used.")
+        return 1
+
+    lengths = [args.max_length // 4, args.max_length // 2, args.max_length]
+    print(f"{'line':>21} {'length':>7} {'regex ms':>10} {'tokenizer ms':>13}")
+    worst = {}
+    for length in lengths:
+        for name, line in adversarial_lines(length, args.seed).items():
+            regex_time = best_of(regex_chain, patterns, line, args.repeat)
+            token_time = best_of(tokenizer, patterns, line, args.repeat)
+            worst[name] = worst.get(name, []) + [token_time]
+            print(
+                f"{name:>21} {length:>7} {regex_time * 1000:>10.2f} {token_time * 1000:>13.3f}"
+            )
+
+    # Doubling the line length should at most roughly double the tokenizer's time.
+    # Allow 3x for timer noise.
+    superlinear = [
+        name
+        for name, times in worst.items()
+        if times[-1] > 3 * times[-2] and times[-1] > 1e-4
+    ]
+    if superlinear:
+        print(f"Tokenizer cost grows faster than linear on: {', '.join(superlinear)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
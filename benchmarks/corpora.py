@@ -0,0 +1,135 @@
+"""
+Synthetic comment corpora for parsing benchmarks.
+Each corpus is a list of comments for a video of VIDEO_SECONDS seconds.
+"""
+import random
+from typing import Callable, Dict, List
+
+VIDEO_SECONDS = 3600
+TITLE_WORDS = ["Intro", "Theme", "Night", "Drive", "Echo", "Rain", "City", "Outro"]
+MULTILINGUAL_WORDS = [
+    "夜明け",
+    "Дорога",
+    "ليلة",
+    "Café",
+    "Straße",
+    "雨の街",
+    "Ελπίδα",
+    "bientôt",
+]
+CHATTER = [
+    "This is the best mix on YouTube.",
+    "Who else is listening in 2022?",
+    "Track 3 is a masterpiece!!",
+    "Thanks for uploading",
+]
+
+
+def fmt_time(seconds: int) -> str:
+    """
+    Format seconds like comments do. M:SS, MM:SS or H:MM:SS.
+    """
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{secs:02}"
+    return f"{minutes}:{secs:02}"
+
+
+def track_starts(rng: random.Random, n_tracks: int) -> List[int]:
+    starts = sorted(rng.sample(range(1, VIDEO_SECONDS - 60), n_tracks - 1))
+    return [0, *starts]
+
+
+def title(rng: random.Random, words: List[str]) -> str:
+    return " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+
+
+def start_comment(rng: random.Random, words: List[str] = TITLE_WORDS) -> str:
+    lines = []
+    for start in track_starts(rng, rng.randint(5, 20)):
+        time = fmt_time(start)
+        if rng.random() < 0.5:
+            lines.append(f"{time} {title(rng, words)}")
+        else:
+            lines.append(f"{title(rng, words)} - [{time}]")
+    return "\n".join(lines)
+
+
+def duration_comment(rng: random.Random, words: List[str] = TITLE_WORDS) -> str:
+    starts = track_starts(rng, rng.randint(5, 20))
+    ends = [*starts[1:], VIDEO_SECONDS]
+    return "\n".join(
+        f"{fmt_time(start)}-{fmt_time(end)} {title(rng, words)}"
+        for start, end in zip(starts, ends)
+    )
+
+
+def chatter_comment(rng: random.Random) -> str:
+    return rng.choice(CHATTER)
+
+
+def adversarial_comment(rng: random.Random) -> str:
+    """
+    Long punctuation-heavy spam with time-like fragments and a few real timestamps.
+    """
+    lines = [start_comment(rng)]
+    for _ in range(rng.randint(3, 10)):
+        spam = "".join(rng.choice("-[]―!?.~ ") for _ in range(rng.randint(200, 800)))
+        lines.append(spam + rng.choice(["x 1:00", "wow", "1:2:3:4:5", "12:3"]))
+    rng.shuffle(lines)
+    return "\n".join(lines)
+
+
+def start_corpus(rng: random.Random, n_comments: int) -> List[str]:
+    return [
+        start_comment(rng) if rng.random() < 0.3 else chatter_comment(rng)
+        for _ in range(n_comments)
+    ]
+
+
+def duration_corpus(rng: random.Random, n_comments: int) -> List[str]:
+    return [
+        duration_comment(rng) if rng.random() < 0.3 else chatter_comment(rng)
+        for _ in range(n_comments)
+    ]
+
+
+def mixed_corpus(rng: random.Random, n_comments: int) -> List[str]:
+    makers = [start_comment, duration_comment, chatter_comment, chatter_comment]
+    return [rng.choice(makers)(rng) for _ in range(n_comments)]
+
+
+def adversarial_corpus(rng: random.Random, n_comments: int) -> List[str]:
+    return [
+        adversarial_comment(rng) if rng.random() < 0.3 else chatter_comment(rng)
+        for _ in range(n_comments)
+    ]
+
+
+def multilingual_corpus(rng: random.Random, n_comments: int) -> List[str]:
+    makers = [start_comment, duration_comment]
+    return [
+        rng.choice(makers)(rng, MULTILINGUAL_WORDS)
+        if rng.random() < 0.3
+        else chatter_comment(rng)
+        for _ in range(n_comments)
+    ]
+
+
+CORPORA: Dict[str, Callable[[random.Random, int], List[str]]] = {
+    "start": start_corpus,
+    "duration": duration_corpus,
+    "mixed": mixed_corpus,
+    "adversarial": adversarial_corpus,
+    "multilingual": multilingual_corpus,
+}
+
+
+def build_corpora(n_comments: int, seed: int = 0) -> Dict[str, List[str]]:
+    """
+    Build every corpus with a fixed seed so runs are comparable.
+    """
+    return {
+        name: make(random.Random(seed), n_comments) for name, make in CORPORA.items()
+    }
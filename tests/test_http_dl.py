@@ -0,0 +1,165 @@
+"""
+Ranged downloads against a local HTTP server. See benchmarks/bench_http_dl.py for throughput.
+"""
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+
+import pytest
+
+from ytcompdl import http_dl
+
+SEGMENT_SIZE = 64 * 1024
+PAYLOAD = os.urandom(5 * SEGMENT_SIZE + 1234)
+
+
+class StreamServer(ThreadingHTTPServer):
+    """
+    Serves PAYLOAD. Records the Range header of each request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, ranges: bool = True, drop: bool = False) -> None:
+        # Ignore Range headers and always respond with 200 if False.
+        self.ranges = ranges
+        # Drop the first response of each range halfway through if True. Retries of a range aren't dropped.
+        self.drop = drop
+        self.requests: List[Optional[str]] = []
+        self.dropped = set()
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), StreamHandler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/stream"
+
+    def handle_error(self, request, client_address):
+        # Clients close connections early. ex. size probes of servers without ranges.
+        pass
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StreamServer
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        with self.server.lock:
+            self.server.requests.append(range_header)
+
+        start, end = 0, len(PAYLOAD) - 1
+        range_match = re.match(r"bytes=(\d+)-(\d*)", range_header or "")
+        if self.server.ranges and range_match:
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or end), end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+
+        body = PAYLOAD[start : end + 1]
+        with self.server.lock:
+            # Retries resume at another start but end at the same byte.
+            drop = self.server.drop and len(body) > 1 and end not in self.server.dropped
+            self.server.dropped.add(end)
+        if drop:
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(request) -> Iterator[StreamServer]:
+    server = StreamServer(**getattr(request, "param", {}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def read(fname: str) -> bytes:
+    with open(fname, "rb") as file:
+        return file.read()
+
+
+def test_ranged_download(server: StreamServer, tmp_path):
+    output = str(tmp_path / "stream.bin")
+    fname = http_dl.download(
+        server.url, output, n_connections=4, segment_size=SEGMENT_SIZE
+    )
+    assert fname == output
+
+    assert read(output) == PAYLOAD
+    # Size probe and one request per range.
+    ranges = http_dl.segments(len(PAYLOAD), SEGMENT_SIZE)
+    assert len(ranges) == 6
+    assert sorted(server.requests[1:]) == sorted(
+        f"bytes={start}-{end}" for start, end in ranges
+    )
+    assert not os.path.exists(output + http_dl.PART_EXT)
+    assert not os.path.exists(output + http_dl.JOURNAL_EXT)
+
+
+@pytest.mark.parametrize("server", [{"drop": True}], indirect=True)
+def test_dropped_connection_resumes_range(server: StreamServer, tmp_path):
+    output = str(tmp_path / "stream.bin")
+    http_dl.download(server.url, output, n_connections=2, segment_size=SEGMENT_SIZE)
+
+    assert read(output) == PAYLOAD
+    # Each range was dropped once and retried from the last byte written instead of from its start.
+    requested = [
+        tuple(map(int, header[len("bytes=") :].split("-")))
+        for header in server.requests[1:]
+    ]
+    for start, end in http_dl.segments(len(PAYLOAD), SEGMENT_SIZE):
+        retry_starts = [
+            req_start for req_start, req_end in requested if req_end == end
+        ][1:]
+        assert retry_starts, f"Range {start}-{end} wasn't retried."
+        assert all(retry_start > start for retry_start in retry_starts)
+
+
+@pytest.mark.parametrize("server", [{"ranges": False}], indirect=True)
+def test_server_without_ranges(server: StreamServer, tmp_path):
+    output = str(tmp_path / "stream.bin")
+    http_dl.download(server.url, output, n_connections=4, segment_size=SEGMENT_SIZE)
+
+    assert read(output) == PAYLOAD
+    # Size probe then a single request for everything.
+    assert len(server.requests) == 2
+    assert server.requests[1] is None
+    assert not os.path.exists(output + http_dl.PART_EXT)
+
+
+def test_server_without_ranges_rejects_segment(tmp_path):
+    """
+    A range request answered with the whole content fails instead of writing it at the range's offset.
+    """
+    server = StreamServer(ranges=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        output = str(tmp_path / "stream.bin")
+        with pytest.raises(http_dl.PyTubeError):
+            # Size given so the range support probe is skipped.
+            http_dl.download(
+                server.url,
+                output,
+                filesize=len(PAYLOAD),
+                n_connections=2,
+                segment_size=SEGMENT_SIZE,
+            )
+        assert not os.path.exists(output)
+    finally:
+        server.shutdown()
+        server.server_close()
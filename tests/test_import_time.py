@@ -0,0 +1,66 @@
+"""
+Startup cost of the CLI. See benchmarks/bench_import_time.py for a breakdown of slow imports.
+"""
+import sys
+import pathlib
+import subprocess
+from typing import Dict, List
+
+import pytest
+
+REPO_DIR = pathlib.Path(__file__).resolve().parents[1]
+# Only needed once a job runs.
+HEAVY_MODULES = (
+    "googleapiclient",
+    "pytube",
+    "tqdm",
+    "ffmpeg",
+    "yaml",
+    "dotenv",
+    "requests",
+)
+IMPORT_BUDGET_MS = 50
+N_RUNS = 5
+
+
+def import_times(python_args: List[str]) -> Dict[str, int]:
+    """
+    Cumulative import time of each module imported by a fresh interpreter.
+    :param python_args: interpreter args. ex. ["-m", "ytcompdl", "-h"]
+    :return: microseconds keyed by module name.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *python_args],
+        capture_output=True,
+        text=True,
+        cwd=REPO_DIR,
+    )
+    assert proc.returncode == 0, proc.stderr
+    times = {}
+    # ex. import time:       175 |      48125 |             google.auth.crypt
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def is_heavy(name: str) -> bool:
+    return any(name == mod or name.startswith(f"{mod}.") for mod in HEAVY_MODULES)
+
+
+@pytest.mark.parametrize("cli_args", [["-h"], ["serve", "-h"]])
+def test_help_skips_heavy_imports(cli_args: List[str]):
+    times = import_times(["-m", "ytcompdl", *cli_args])
+    assert "ytcompdl" in times
+    assert sorted(filter(is_heavy, times)) == []
+
+
+def test_import_within_budget():
+    # Best of several runs as the first may read modules from a cold disk cache.
+    import_usec = min(
+        import_times(["-c", "import ytcompdl.__main__"])["ytcompdl.__main__"]
+        for _ in range(N_RUNS)
+    )
+    assert import_usec / 1000 <= IMPORT_BUDGET_MS
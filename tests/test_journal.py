@@ -0,0 +1,156 @@
+"""
+Interrupted runs resume from the track journal and only render unfinished tracks.
+"""
+import json
+import shutil
+import pathlib
+import subprocess
+from typing import List
+
+import pytest
+
+from ytcompdl import yt_comp_dl
+from ytcompdl.yt_comp_dl import YTCompDL
+from ytcompdl.video_info import VideoInfo
+from ytcompdl.journal import TrackJournal, RENDERING, RENDERED
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None, reason="ffmpeg not an available executable."
+)
+
+TITLES = ["First", "Second", "Third"]
+TIMES = [(0, 4000), (4000, 8000), (8000, 12000)]
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory) -> pathlib.Path:
+    src = tmp_path_factory.mktemp("source") / "source.mp4"
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=size=160x120:rate=25:duration=12",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=frequency=440:duration=12",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-c:a",
+            "aac",
+            str(src),
+        ],
+        check=True,
+    )
+    return src
+
+
+def fake_ytcompdl(single_decode: bool) -> YTCompDL:
+    """
+    YTCompDL with injected video information and timestamps. No API requests.
+    """
+    dl = object.__new__(YTCompDL)
+    dl.info = VideoInfo(
+        video_id="abcdefghijk",
+        title="Video",
+        safe_title="Video",
+        description="",
+        channel="Channel",
+        year_uploaded="2020",
+        duration_ms=TIMES[-1][1],
+        metadata=(("album", "Video"),),
+    )
+    dl.titles, dl.times = TITLES, TIMES
+    dl.output_type = "video"
+    dl.fade_end = "none"
+    dl.fade_time = 0.5
+    dl.keyframe_tolerance = 0
+    dl.single_decode = single_decode
+    dl.n_processes = 1
+    dl.track_timeout = None
+    dl.cancel_event = None
+    return dl
+
+
+@pytest.fixture
+def rendered(monkeypatch) -> List[str]:
+    """
+    Names of outputs rendered by ffmpeg.
+    """
+    outputs = []
+    run_jobs = yt_comp_dl.run_jobs
+
+    def recording_run_jobs(jobs, *args, **kwargs):
+        jobs = list(jobs)
+        for job in jobs:
+            outputs.extend(pathlib.Path(fname).name for fname in job.output_fnames)
+        return run_jobs(jobs, *args, **kwargs)
+
+    monkeypatch.setattr(yt_comp_dl, "run_jobs", recording_run_jobs)
+    return outputs
+
+
+def render(dl: YTCompDL, source: pathlib.Path, title_folder: pathlib.Path):
+    if dl.single_decode:
+        return dl._postprocess_single_decode(source, title_folder)
+    return dl._postprocess_tracks(source, title_folder)
+
+
+@pytest.mark.parametrize("single_decode", [False, True])
+def test_resume_renders_unfinished_tracks(
+    source: pathlib.Path, tmp_path: pathlib.Path, rendered: List[str], single_decode
+):
+    dl = fake_ytcompdl(single_decode)
+    outputs = [pathlib.Path(path) for path in render(dl, source, tmp_path)]
+    assert [output.name for output in outputs] == [f"{title}.mp4" for title in TITLES]
+    assert rendered == [f"{title}.part.mp4" for title in TITLES]
+
+    # Interrupt while rendering the last track: its output is partial and only marked as started.
+    journal = TrackJournal(tmp_path)
+    last_key = next(
+        key
+        for key, entry in journal.entries.items()
+        if entry["output"] == outputs[-1].name
+    )
+    journal.entries[last_key] = {"stage": RENDERING, "output": outputs[-1].name}
+    journal.save()
+    outputs[-1].unlink()
+    orphan = tmp_path / "Third.part.mp4"
+    orphan.write_bytes(b"partial")
+    # ex. from a run with other timestamps.
+    stale_orphan = tmp_path / "Old.part.mp4"
+    stale_orphan.write_bytes(b"partial")
+    finished_mtimes = [output.stat().st_mtime_ns for output in outputs[:-1]]
+
+    rendered.clear()
+    render(fake_ytcompdl(single_decode), source, tmp_path)
+
+    assert rendered == ["Third.part.mp4"]
+    assert not orphan.exists()
+    assert not stale_orphan.exists()
+    assert outputs[-1].read_bytes() != b"partial"
+    assert [output.stat().st_mtime_ns for output in outputs[:-1]] == finished_mtimes
+    with open(tmp_path / TrackJournal.FNAME) as jfile:
+        entries = json.load(jfile)
+    assert sorted(entry["output"] for entry in entries.values()) == sorted(
+        output.name for output in outputs
+    )
+    assert all(entry["stage"] == RENDERED for entry in entries.values())
+
+
+def test_changed_output_is_rendered_again(
+    source: pathlib.Path, tmp_path: pathlib.Path, rendered: List[str]
+):
+    render(fake_ytcompdl(False), source, tmp_path)
+    (tmp_path / "Second.mp4").write_bytes(b"truncated")
+
+    rendered.clear()
+    render(fake_ytcompdl(False), source, tmp_path)
+    assert rendered == ["Second.part.mp4"]
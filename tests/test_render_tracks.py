@@ -0,0 +1,129 @@
+"""
+Tracks rendered by a single ffmpeg process match tracks rendered one at a time.
+"""
+import shutil
+import pathlib
+import subprocess
+from typing import Dict
+
+import pytest
+
+from ytcompdl.ffmpeg_utils import render_track, render_tracks
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None, reason="ffmpeg not an available executable."
+)
+
+TAGS = {"album": "Test", "album_artist": "ytcompdl"}
+# Start and end of each track. The first starts on the source's first keyframe, the others between keyframes.
+DURATIONS = [(0, 20), (20, 27), (27, 40)]
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory) -> str:
+    """
+    h264 and aac source with B-frames and a keyframe every 10s so cuts fall between keyframes.
+    """
+    src = str(tmp_path_factory.mktemp("source") / "source.mp4")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=size=160x120:rate=25:duration=40",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=frequency=440:duration=40",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-bf",
+            "2",
+            "-g",
+            "250",
+            "-keyint_min",
+            "250",
+            "-sc_threshold",
+            "0",
+            "-c:a",
+            "aac",
+            src,
+        ],
+        check=True,
+    )
+    return src
+
+
+def packet_counts(fname: str) -> Dict[str, int]:
+    """
+    Number of video and audio packets of a file.
+    """
+    counts = {}
+    for stream_type in ("v", "a"):
+        proc = subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-i",
+                fname,
+                "-map",
+                f"0:{stream_type}",
+                "-c",
+                "copy",
+                "-f",
+                "framecrc",
+                "-",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        counts[stream_type] = sum(
+            not line.startswith("#") for line in proc.stdout.splitlines()
+        )
+    return counts
+
+
+def test_stream_copy_matches_per_track(source: str, tmp_path: pathlib.Path):
+    single = [str(tmp_path / f"single_{num}.mp4") for num in range(len(DURATIONS))]
+    exit_code = render_tracks(
+        source,
+        [
+            (output, duration, f"Track {num}", num)
+            for num, (output, duration) in enumerate(zip(single, DURATIONS))
+        ],
+        TAGS,
+        fade_end="none",
+    )
+    assert exit_code == 0
+
+    for num, duration in enumerate(DURATIONS):
+        per_track = render_track(
+            source,
+            str(tmp_path / f"track_{num}.mp4"),
+            duration,
+            f"Track {num}",
+            num,
+            TAGS,
+            fade_end="none",
+        )
+        counts = packet_counts(single[num])
+        assert counts["v"] > 0
+        assert counts == packet_counts(per_track)
+
+
+def test_failed_render_returns_exit_code(tmp_path: pathlib.Path):
+    exit_code = render_tracks(
+        str(tmp_path / "missing.mp4"),
+        [(str(tmp_path / "track.mp4"), (0, 10), "Track", 1)],
+        TAGS,
+        fade_end="none",
+    )
+    assert exit_code != 0
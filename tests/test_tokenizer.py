@@ -0,0 +1,93 @@
+"""
+Timestamp tokenizer gives the same timestamps as the start/duration regex chain, including on adversarial lines.
+See benchmarks/bench_tokenizer.py for timings against the regex chain.
+"""
+import time
+import random
+import pathlib
+from typing import Dict, List
+
+import pytest
+
+from ytcompdl.yt_comp_dl import load_regex_patterns
+
+REGEX_CFG = (
+    pathlib.Path(__file__).resolve().parents[1].joinpath("config", "config_regex.yaml")
+)
+NORMAL_LINES = [
+    "0:00 Intro",
+    "Intro - 1:00",
+    "[12:34] Track title",
+    "1:00:00-1:05:30 Long track",
+    "[1:00][2:00]Song",
+    "1:00 - 2:00 Song",
+    "a 1:00 b 2:00",
+    "1:00 2:00 3:00 Three times",
+    "― 4:20 ― Spacers around time",
+    "no timestamps here",
+    "",
+]
+# Short enough that the backtracking regex chain finishes quickly.
+ADVERSARIAL_LENGTHS = (50, 200, 400)
+# Long enough that a backtracking tokenizer would blow the time limit.
+LONG_LINE_LENGTH = 50_000
+LONG_LINE_MAX_SECONDS = 1.0
+
+
+def adversarial_lines(length: int, seed: int = 0) -> Dict[str, str]:
+    """
+    Long spam-like lines. Mostly spacers and punctuation that the (.*?)(?:spacers)*(time) patterns backtrack on.
+    """
+    rng = random.Random(seed)
+    punct = "-[]―.,!?~*=_ "
+    return {
+        "spacers": "-" * length,
+        "spacers_then_time": "[-" * (length // 2) + "1:00 title",
+        "spacers_then_text": "-" * length + "x 1:00",
+        "spacers_then_duration": "-" * length + "x 1:00-2:00",
+        "punctuation": "".join(rng.choice(punct) for _ in range(length)),
+        "near_times": "1:" * (length // 2),
+        "digits_colons": "".join(rng.choice("0123456789:-") for _ in range(length)),
+        "time_at_end": "x" * length + " 1:00",
+    }
+
+
+@pytest.fixture(scope="module")
+def patterns():
+    patterns = load_regex_patterns(str(REGEX_CFG))
+    assert patterns[-1] is not None, "Default config should use the tokenizer."
+    return patterns
+
+
+def regex_chain(patterns, line: str) -> List[tuple]:
+    time_regex, _, start_regex, dur_regex, _ = patterns
+    if timestamps := time_regex.findall(line):
+        if len(timestamps) == 1:
+            return start_regex.findall(line)
+        elif len(timestamps) == 2:
+            return dur_regex.findall(line)
+    return []
+
+
+def tokenizer(patterns, line: str) -> List[tuple]:
+    timestamp = patterns[-1].tokenize(line)
+    return [timestamp] if timestamp else []
+
+
+@pytest.mark.parametrize("line", NORMAL_LINES)
+def test_normal_lines_match_regex(patterns, line: str):
+    assert tokenizer(patterns, line) == regex_chain(patterns, line)
+
+
+@pytest.mark.parametrize("length", ADVERSARIAL_LENGTHS)
+@pytest.mark.parametrize("seed", range(3))
+def test_adversarial_lines_match_regex(patterns, length: int, seed: int):
+    for name, line in adversarial_lines(length, seed).items():
+        assert tokenizer(patterns, line) == regex_chain(patterns, line), name
+
+
+def test_long_adversarial_lines_bounded(patterns):
+    for name, line in adversarial_lines(LONG_LINE_LENGTH).items():
+        start = time.perf_counter()
+        tokenizer(patterns, line)
+        assert time.perf_counter() - start < LONG_LINE_MAX_SECONDS, name
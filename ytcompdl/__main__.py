@@ -1,19 +1,43 @@
 import os
+import sys
 import argparse
 import pathlib
-from .yt_comp_dl import YTCompDL
+from .timestamps import GOOD_ENOUGH_SIMILARITY
 
 
-def main() -> int:
-    ap = argparse.ArgumentParser(
-        description="Command-line program to download and segment Youtube videos."
-    )
+def build_parser(serve_mode: bool = False) -> argparse.ArgumentParser:
+    """
+    Parser of CLI args. Args after the url group are in YTCompDL positional order.
+    :param serve_mode: parse args of serve mode. Urls are given per job and args are defaults of each job.
+
+    :return: argument parser
+    """
+    if serve_mode:
+        ap = argparse.ArgumentParser(
+            prog="ytcompdl serve",
+            description="Keep a warm API client and caches and run jobs submitted over HTTP.",
+        )
+    else:
+        ap = argparse.ArgumentParser(
+            description="Command-line program to download and segment Youtube videos."
+        )
 
     # Required arguments.
     ap.add_argument(
         "-k", "--key", required=True, type=str, help="Youtube API key as .env file."
     )
-    ap.add_argument("-u", "--url", required=True, type=str, help="Youtube URL")
+    # Urls are given per job in serve mode.
+    if not serve_mode:
+        url_group = ap.add_mutually_exclusive_group(required=True)
+        url_group.add_argument(
+            "-u", "--url", type=str, help="Youtube video or playlist URL"
+        )
+        url_group.add_argument(
+            "-uf",
+            "--url_file",
+            type=str,
+            help="File with one Youtube video or playlist URL per line. Use - to read from stdin.",
+        )
     ap.add_argument(
         "-o",
         "--output_type",
@@ -71,8 +95,120 @@ def main() -> int:
         action="store_true",
         help="Remove downloaded source file after processing.",
     )
+    ap.add_argument(
+        "-sd",
+        "--single_decode",
+        action="store_true",
+        help="Cut all tracks with a single ffmpeg process that reads the source once.",
+    )
+    ap.add_argument(
+        "-kt",
+        "--keyframe_tolerance",
+        type=float,
+        default=1.0,
+        help="Max seconds to snap unfaded (stream copy) cuts to the nearest keyframe.",
+    )
+    ap.add_argument(
+        "--cache",
+        type=str,
+        help="Path to SQLite file to cache YouTube Data API responses in.",
+    )
+    ap.add_argument(
+        "--cache_ttl",
+        type=float,
+        default=86400,
+        help="Seconds a cached API response is used without revalidation.",
+    )
+    ap.add_argument(
+        "--cache_size",
+        type=int,
+        default=256,
+        help="Max size of API response cache in MB.",
+    )
+    ap.add_argument(
+        "--quota_budget",
+        type=int,
+        help="Max YouTube Data API quota units to use. Comment scanning stops before exceeding it.",
+    )
+    ap.add_argument(
+        "--quota_stats",
+        type=str,
+        help="Path to json file to write API usage stats to.",
+    )
+    ap.add_argument(
+        "-ge",
+        "--good_enough",
+        default=GOOD_ENOUGH_SIMILARITY,
+        type=float,
+        help="Stop scanning comments once one's timestamps cover this fraction (0-1) of the video.",
+    )
+    ap.add_argument(
+        "--trace",
+        type=str,
+        help="Path to json file to write a Chrome trace of pipeline stages to.",
+    )
+    ap.add_argument(
+        "--metrics",
+        type=str,
+        help="Path to Prometheus textfile to write per-stage metrics to.",
+    )
+    ap.add_argument(
+        "-st",
+        "--stream",
+        action="store_true",
+        help="Pipe downloaded audio into ffmpeg while downloading instead of saving the source stream first.",
+    )
+    ap.add_argument(
+        "-ch",
+        "--chunked",
+        action="store_true",
+        help="Convert unsliced audio in chunks encoded in parallel by each core.",
+    )
+    ap.add_argument(
+        "-cn",
+        "--connections",
+        type=int,
+        default=4,
+        help="Number of connections used to download each stream.",
+    )
+    ap.add_argument(
+        "--store",
+        type=str,
+        help="Directory to store downloaded streams in for reuse by other output directories and types.",
+    )
+    ap.add_argument(
+        "--store_size",
+        type=int,
+        default=10240,
+        help="Max size of stored streams in MB. Least recently used streams are removed first.",
+    )
+    ap.add_argument(
+        "--track_timeout",
+        type=float,
+        help="Max seconds to render a track before its ffmpeg process is killed.",
+    )
+
+    if serve_mode:
+        ap.add_argument(
+            "--host",
+            default="127.0.0.1",
+            type=str,
+            help="Address to listen on. Jobs are unauthenticated so only bind to trusted interfaces.",
+        )
+        ap.add_argument("--port", default=8765, type=int, help="Port to listen on.")
+        ap.add_argument(
+            "--queue_size",
+            default=100,
+            type=int,
+            help="Max jobs waiting to run. Further jobs are rejected with 429 until one starts.",
+        )
+    return ap
 
-    args = vars(ap.parse_args())
+
+def main() -> int:
+    serve_mode = sys.argv[1:2] == ["serve"]
+    ap = build_parser(serve_mode)
+    args = vars(ap.parse_args(sys.argv[2:] if serve_mode else sys.argv[1:]))
 
     # Make output directory.
     if isinstance(args["directory"], str):
@@ -81,6 +217,35 @@ def main() -> int:
     if not args["directory"].exists():
         args["directory"].mkdir(parents=True, exist_ok=True)
 
+    # Imported once args are valid so help and usage errors don't wait on googleapiclient, pytube and ffmpeg.
+    from .yt_comp_dl import YTCompDL
+    from .batch import read_urls, run_batch
+    from .yt_api import playlist_id
+
+    if serve_mode:
+        if args["comment"]:
+            ap.error("--comment prompts on stdin and can't be used in serve mode.")
+        from .server import serve
+
+        # Placeholder in YTCompDL positional order replaced by each job's url.
+        args = {"key": args.pop("key"), "url": None, **args}
+        host, port, queue_size = (
+            args.pop("host"),
+            args.pop("port"),
+            args.pop("queue_size"),
+        )
+        return serve(args, host, port, queue_size)
+
+    # Process all urls with shared resources.
+    if url_file := args.pop("url_file"):
+        if url_file == "-":
+            return run_batch(read_urls(sys.stdin), args)
+        with open(url_file, "r") as url_fobj:
+            return run_batch(read_urls(url_fobj), args)
+    # Playlists are processed as a batch of its videos.
+    if playlist_id(args["url"]):
+        return run_batch([args["url"]], args)
+
     dl = YTCompDL(*args.values())
 
     return dl.download()
@@ -0,0 +1,154 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Tuple
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+
+class APICache:
+    """
+    Persistent cache of YouTube Data API responses stored in a single SQLite file.
+    * Entries younger than ttl are returned without a request.
+    * Stale entries are revalidated with their ETag (If-None-Match).
+    * Least recently used entries are evicted once the cache is larger than max_bytes.
+    Safe to share between threads and processes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            etag TEXT,
+            body TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+    """
+    # Query parameters not part of a response's identity.
+    IGNORED_PARAMS = ("key", "alt")
+
+    def __init__(self, path: str, ttl: float = 86400, max_bytes: int = 256 * 1024**2):
+        """
+        :param path: SQLite file path.
+        :param ttl: Seconds a cached response is fresh.
+        :param max_bytes: Max total size of cached responses.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # Wait on other processes' write locks instead of failing.
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(self.SCHEMA)
+
+    @classmethod
+    def request_key(cls, request) -> str:
+        """
+        Cache key of a request from its endpoint, parameters and page token.
+        """
+        uri = urlparse(request.uri)
+        params = sorted(
+            (param, value)
+            for param, value in parse_qsl(uri.query)
+            if param not in cls.IGNORED_PARAMS
+        )
+        return f"{request.method} {uri.path}?{urlencode(params)}"
+
+    def execute(self, request) -> dict:
+        """
+        Execute an API request through the cache.
+        :param request: googleapiclient HttpRequest.
+        :return: response (dict)
+        """
+        return self.fetch(request)[0]
+
+    def fetch(self, request) -> Tuple[dict, bool]:
+        """
+        Execute an API request through the cache.
+        :param request: googleapiclient HttpRequest.
+        :return: response (dict) and whether it was served without a request (bool)
+        """
+        key = self.request_key(request)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, body, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is not None:
+            etag, body, fetched_at = row
+            if now - fetched_at < self.ttl:
+                self.hits += 1
+                self._touch(key, now, fetched=False)
+                return json.loads(body), True
+            if etag:
+                # Copy headers as list_next shallow copies requests and shares them.
+                request.headers = {**request.headers, "If-None-Match": etag}
+
+        try:
+            response = request.execute()
+        except HttpError as e:
+            if row is not None and e.resp.status == 304:
+                logger.debug(f"Revalidated cached response for {key}.")
+                self.revalidated += 1
+                self._touch(key, now, fetched=True)
+                return json.loads(row[1]), False
+            raise
+
+        self.misses += 1
+        self._store(key, response, now)
+        return response, False
+
+    def _touch(self, key: str, now: float, fetched: bool) -> None:
+        with self._lock, self._conn:
+            if fetched:
+                self._conn.execute(
+                    "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                    (now, now, key),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+
+    def _store(self, key: str, response: dict, now: float) -> None:
+        body = json.dumps(response)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response.get("etag"), body, len(body), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """
+        Remove least recently used responses until cache is within max_bytes.
+        Must be called within a transaction.
+        """
+        total_size = 0
+        evicted = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at DESC"
+        ):
+            total_size += size
+            if total_size > self.max_bytes:
+                evicted.append((key,))
+        if evicted:
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            logger.info(f"Evicted {len(evicted)} cached responses.")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
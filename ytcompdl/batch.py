@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import itertools
+import pathlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+from .yt_api import (
+    YT_VIDEO_URL,
+    MAX_IDS_PER_REQUEST,
+    build_yt_client,
+    resolve_videos,
+    video_id,
+    playlist_id,
+    playlist_video_ids,
+)
+from .yt_comp_dl import YTCompDL
+from .api_cache import APICache
+from .source_store import SourceStore
+from .quota import QuotaTracker
+from .errors import QuotaExceededError, JobCancelledError
+from . import tracing
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchResult:
+    url: str
+    title: str
+    status: str
+    n_tracks: int
+    elapsed: float
+
+
+@dataclass
+class BatchContext:
+    """
+    Resources shared by all videos of a batch.
+    """
+
+    args: Dict
+    yt_client: Any
+    index: "ProcessedIndex"
+    api_cache: Optional[APICache]
+    quota: QuotaTracker
+    source_store: Optional[SourceStore] = None
+
+
+class ProcessedIndex:
+    """
+    Local index of processed videos stored in the output directory.
+    Maps video id to the output of each output type so already processed videos can be skipped.
+    """
+
+    INDEX_FNAME = ".ytcompdl_index.json"
+
+    def __init__(self, output_dir: pathlib.Path) -> None:
+        self.path = pathlib.Path(output_dir).joinpath(self.INDEX_FNAME)
+        self.entries: Dict[str, Dict[str, str]] = {}
+        try:
+            with open(self.path, "r") as jfile:
+                self.entries = json.load(jfile)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            logger.warning(
+                f"Invalid processed index at {self.path}. Starting new index."
+            )
+
+    def is_processed(self, vid_id: str, output_type: str) -> bool:
+        """
+        Check if a video was already processed and its output still exists.
+        """
+        output = self.entries.get(vid_id, {}).get(output_type)
+        return output is not None and os.path.exists(output)
+
+    def add(self, vid_id: str, output_type: str, output: str) -> None:
+        """
+        Record a processed video and save index.
+        """
+        self.entries.setdefault(vid_id, {})[output_type] = str(output)
+        # Write to temp file first so an interrupted run never leaves a partial index.
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as jfile:
+            json.dump(self.entries, jfile, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def read_urls(url_file: TextIO) -> Iterator[str]:
+    """
+    Read urls line-by-line. Blank lines and lines starting with # are skipped.
+    :param url_file: file object with one url per line.
+    :return: urls (iterator of str)
+    """
+    for line in url_file:
+        if (url := line.strip()) and not url.startswith("#"):
+            yield url
+
+
+def expand_urls(
+    yt_client,
+    urls: Iterator[str],
+    api_cache: Optional[APICache] = None,
+    quota: Optional[QuotaTracker] = None,
+) -> Iterator[str]:
+    """
+    Expand playlist urls into urls of each video in the playlist.
+    :param yt_client: YouTube Data API client.
+    :param urls: Youtube video or playlist urls.
+    :param api_cache: optional response cache.
+    :param quota: optional quota tracker.
+    :return: video urls (iterator of str)
+    """
+    for url in urls:
+        if list_id := playlist_id(url):
+            logger.info(f"Listing videos of playlist {list_id}.")
+            for vid_id in playlist_video_ids(yt_client, list_id, api_cache, quota):
+                yield YT_VIDEO_URL.format(video_id=vid_id)
+        else:
+            yield url
+
+
+def build_context(args: Dict) -> BatchContext:
+    """
+    Build resources shared by all videos from CLI args.
+    :param args: CLI args in YTCompDL positional order.
+
+    :return: batch context
+    """
+    return BatchContext(
+        args=args,
+        yt_client=build_yt_client(args["key"]),
+        index=ProcessedIndex(args["directory"]),
+        api_cache=(
+            APICache(args["cache"], args["cache_ttl"], args["cache_size"] * 1024**2)
+            if args["cache"]
+            else None
+        ),
+        quota=QuotaTracker(args["quota_budget"]),
+        source_store=(
+            SourceStore(args["store"], args["store_size"] * 1024**2)
+            if args["store"]
+            else None
+        ),
+    )
+
+
+def run_batch(urls: Iterator[str], args: Dict) -> int:
+    """
+    Download and process multiple videos with one shared API client, caches and quota.
+    Playlist urls are expanded and videos already in the output directory's index are skipped.
+    :param urls: Youtube video or playlist urls.
+    :param args: CLI args in YTCompDL positional order. "url" is replaced per video.
+
+    :return: 0 if all videos processed. Otherwise, 1.
+    """
+    ctx = build_context(args)
+
+    results: List[BatchResult] = []
+    batch_start = time.perf_counter()
+    urls = expand_urls(ctx.yt_client, urls, ctx.api_cache, ctx.quota)
+    try:
+        # Resolve video information for a chunk of videos per request.
+        while chunk := list(itertools.islice(urls, MAX_IDS_PER_REQUEST)):
+            vid_ids = {url: video_id(url) for url in chunk}
+            pending_ids = [
+                vid_id
+                for vid_id in filter(None, vid_ids.values())
+                if not ctx.index.is_processed(vid_id, args["output_type"])
+            ]
+            video_infos = dict(
+                resolve_videos(
+                    ctx.yt_client,
+                    pending_ids,
+                    YTCompDL.YT_VIDEO_PARTS,
+                    ctx.api_cache,
+                    ctx.quota,
+                )
+            )
+            for url, vid_id in vid_ids.items():
+                results.append(process_video(ctx, url, vid_id, video_infos.get(vid_id)))
+    except QuotaExceededError:
+        logger.warning("Stopping batch. Quota budget reached.")
+    batch_elapsed = time.perf_counter() - batch_start
+
+    print_summary(results, batch_elapsed)
+    print(ctx.quota.summary())
+    if ctx.source_store is not None:
+        print(ctx.source_store.summary())
+    if args["quota_stats"]:
+        ctx.quota.save(args["quota_stats"])
+    tracing.save(args["trace"], args["metrics"])
+    return 0 if all(res.status in ("done", "skipped") for res in results) else 1
+
+
+def process_video(
+    ctx: BatchContext,
+    url: str,
+    vid_id: Optional[str],
+    video_info: Optional[dict],
+    cancel_event: Optional[threading.Event] = None,
+) -> BatchResult:
+    """
+    Download and process a single video of a batch.
+    Reaching the quota budget or cancelling raises so the batch or job stops. Neither adds the video to the index.
+    """
+    start = time.perf_counter()
+    title, n_tracks = "", 0
+    output_type = ctx.args["output_type"]
+    if vid_id and ctx.index.is_processed(vid_id, output_type):
+        logger.info(f"Skipping already processed video {vid_id}.")
+        return BatchResult(url, title, "skipped", n_tracks, 0.0)
+    try:
+        with span("video", url=url):
+            # Stats and traces are saved once for the whole batch.
+            per_video_args = dict(
+                ctx.args, url=url, quota_stats=None, trace=None, metrics=None
+            )
+            dl = YTCompDL(
+                *per_video_args.values(),
+                yt_client=ctx.yt_client,
+                video_info=video_info,
+                api_cache=ctx.api_cache,
+                source_store=ctx.source_store,
+                quota=ctx.quota,
+                cancel_event=cancel_event,
+            )
+            title = dl.title
+            dl.download()
+        n_tracks = len(dl.titles) if dl.slice_output else 0
+        status = "done"
+        ctx.index.add(dl.video_id, output_type, dl.output_path)
+    except (QuotaExceededError, JobCancelledError):
+        # Stop the batch or job instead of failing each remaining video.
+        raise
+    except Exception as e:
+        # Keep going so one bad video doesn't stop the batch.
+        logger.exception(f"Failed to process {url}.")
+        status = f"failed ({e.__class__.__name__})"
+    return BatchResult(url, title, status, n_tracks, time.perf_counter() - start)
+
+
+def print_summary(
+    results: List[BatchResult], elapsed: float, file: TextIO = sys.stdout
+) -> None:
+    """
+    Print per-video summary and throughput of batch.
+    :param results: batch results.
+    :param elapsed: total seconds elapsed.
+    :param file: file object to print to.
+    """
+    print("\nBatch summary:", file=file)
+    for res in results:
+        print(
+            f"[{res.status}] {res.title or res.url} "
+            f"({res.n_tracks} tracks, {res.elapsed:.1f}s)",
+            file=file,
+        )
+    n_done = sum(res.status == "done" for res in results)
+    throughput = n_done / (elapsed / 3600) if elapsed > 0 else 0.0
+    print(
+        f"Processed {n_done}/{len(results)} videos in {elapsed:.1f}s "
+        f"({throughput:.1f} videos/hour).",
+        file=file,
+    )
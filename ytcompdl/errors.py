@@ -10,6 +10,10 @@ class YTAPIError(Exception):
         super().__init__(message)
 
 
+class QuotaExceededError(YTAPIError):
+    pass
+
+
 class PostProcessError(Exception):
     def __init__(self, message):
         logger.error(message)
@@ -21,3 +25,7 @@ class PyTubeError(Exception):
         logger.error(message)
         super().__init__(message)
 
+
+class JobCancelledError(Exception):
+    pass
+
@@ -0,0 +1,167 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from . import tracing
+from .tracing import Span, file_size
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of a cancel event while waiting on jobs.
+CANCEL_POLL_INTERVAL = 0.2
+# Put in the result queue once the event loop is done.
+_DONE = object()
+
+
+@dataclass
+class FFmpegJob:
+    """
+    ffmpeg command run as a child process by run_jobs.
+    """
+
+    key: Any
+    cmd: List[str]
+    # Span name. ex. ffmpeg.render_track
+    stage: str
+    input_fnames: List[str] = field(default_factory=list)
+    output_fnames: List[str] = field(default_factory=list)
+    # Seconds before the process is killed. No limit if None.
+    timeout: Optional[float] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class JobResult:
+    key: Any
+    exit_code: int
+    timed_out: bool
+    span: Span
+
+
+async def _run_job(job: FFmpegJob, semaphore: asyncio.Semaphore) -> JobResult:
+    async with semaphore:
+        attrs = {**job.attrs, "bytes_in": sum(map(file_size, job.input_fnames))}
+        start = time.time()
+        perf_start = time.perf_counter()
+        # stdin is closed so concurrent ffmpeg processes don't read keys from the terminal.
+        proc = await asyncio.create_subprocess_exec(
+            *job.cmd, stdin=asyncio.subprocess.DEVNULL
+        )
+        timed_out = False
+        try:
+            exit_code = await asyncio.wait_for(proc.wait(), job.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Killing {job.stage} {job.key} after {job.timeout}s.")
+            timed_out = True
+            _kill(proc)
+            exit_code = await proc.wait()
+            attrs["error"] = "TimeoutError"
+        except asyncio.CancelledError:
+            _kill(proc)
+            await proc.wait()
+            raise
+
+        attrs["exit_code"] = exit_code
+        attrs["bytes_out"] = sum(map(file_size, job.output_fnames))
+        # Each child process gets its own row in the trace.
+        span = Span(
+            name=job.stage,
+            category="ffmpeg",
+            start=start,
+            duration=time.perf_counter() - perf_start,
+            pid=proc.pid,
+            tid=proc.pid,
+            attrs=attrs,
+        )
+        return JobResult(job.key, exit_code, timed_out, span)
+
+
+def _kill(proc: asyncio.subprocess.Process) -> None:
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        # Already exited.
+        pass
+
+
+async def _run_all(
+    jobs: Iterable[FFmpegJob], max_concurrency: int, results: queue.Queue
+) -> None:
+    """
+    Run jobs and put each result in results as it finishes. Remaining jobs are killed if cancelled.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    tasks = [asyncio.ensure_future(_run_job(job, semaphore)) for job in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            results.put(await next_done)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _run_loop(
+    loop: asyncio.AbstractEventLoop, main: asyncio.Task, results: queue.Queue
+) -> None:
+    try:
+        loop.run_until_complete(main)
+    except BaseException as e:
+        # Raised in the caller's thread. ex. ffmpeg not found.
+        results.put(e)
+    finally:
+        results.put(_DONE)
+        loop.close()
+
+
+def run_jobs(
+    jobs: Iterable[FFmpegJob],
+    max_concurrency: int,
+    cancel_event: Optional[threading.Event] = None,
+) -> Iterator[JobResult]:
+    """
+    Run ffmpeg jobs as child processes of an event loop with at most max_concurrency running at once.
+    Unlike a process pool, no interpreter is started and no arguments are pickled per worker.
+    The loop runs in its own thread so jobs keep being started and reaped while the caller handles a result.
+    Closing the iterator, ex. on an error or KeyboardInterrupt, kills running jobs and skips the rest.
+    Setting cancel_event does the same and ends the iterator early.
+    :param jobs: ffmpeg jobs.
+    :param max_concurrency: max concurrent ffmpeg processes.
+    :param cancel_event: optional event to stop on. ex. a cancelled server job.
+
+    :return: result of each job as it finishes. Its span is added to the tracer.
+    """
+    results: queue.Queue = queue.Queue()
+    loop = asyncio.new_event_loop()
+    main = loop.create_task(_run_all(list(jobs), max_concurrency, results))
+    thread = threading.Thread(
+        target=_run_loop, args=(loop, main, results), name="ytcompdl-ffmpeg-exec"
+    )
+    thread.start()
+    try:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Cancelled. Killing running ffmpeg jobs.")
+                return
+            try:
+                result = results.get(timeout=CANCEL_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if result is _DONE:
+                return
+            if isinstance(result, BaseException):
+                raise result
+            tracing.tracer.add([result.span])
+            yield result
+    finally:
+        if thread.is_alive():
+            try:
+                loop.call_soon_threadsafe(main.cancel)
+            except RuntimeError:
+                # Loop closed after its last job.
+                pass
+        thread.join()
@@ -1,26 +1,42 @@
 import os
+import json
+import math
 import shlex
+import bisect
 import shutil
+import tempfile
 import subprocess
 import logging
 import functools
+import contextlib
 import tqdm
-from ffmpeg import probe
-from typing import List, Dict, Tuple, Union, Callable
+from ffmpeg import probe, Error as FFmpegError
+from typing import List, Dict, Iterable, Tuple, Union, Callable
 
 from .errors import PostProcessError
+from .tracing import span, file_size
+from .ffmpeg_exec import FFmpegJob, run_jobs
 
 logger = logging.getLogger(__name__)
 
+# Samples per mp3 (MPEG-1 Layer III) frame.
+MP3_FRAME_SAMPLES = 1152
+# Frames encoded before a chunk's start and dropped on concat. Primes the encoder with the preceding audio.
+CHUNK_PREROLL_FRAMES = 16
+# Frames encoded after a chunk's end and dropped on concat so its last kept frame is complete.
+CHUNK_TAIL_FRAMES = 2
+# Shortest chunk worth a separate ffmpeg process.
+MIN_CHUNK_SECONDS = 60
+
 
 # from better_ffmpeg_progress https://github.com/CrypticSignal/better-ffmpeg-progress
-def run_ffmpeg_w_progress(ffmpeg_cmd: List[str], desc: str) -> None:
+def run_ffmpeg_w_progress(ffmpeg_cmd: List[str], desc: str) -> int:
     """
     Run ffmpeg commands with progress bar.
     :param ffmpeg_cmd: ffmpeg cmd as list of str.
     :param desc: Description to print before progress bar.
 
-    :return: None
+    :return: exit code of ffmpeg
     """
     index_of_filepath = ffmpeg_cmd.index("-i") + 1
     filepath = ffmpeg_cmd[index_of_filepath]
@@ -57,6 +73,27 @@ def run_ffmpeg_w_progress(ffmpeg_cmd: List[str], desc: str) -> None:
                     # subtract seconds added by previous s_elapsed to get number of seconds added to add to prog bar.
                     pb.update(secs - s_elapsed)
                     s_elapsed = secs
+    return process.wait()
+
+
+def run_ffmpeg(
+    ffmpeg_cmd: List[str], stage: str, input_fnames: List[str], output_fnames: List[str]
+) -> int:
+    """
+    Run ffmpeg command in a traced span with its exit code and bytes read and written.
+    :param ffmpeg_cmd: ffmpeg cmd as list of str.
+    :param stage: span name.
+    :param input_fnames: input files.
+    :param output_fnames: output files.
+
+    :return: exit code of ffmpeg
+    """
+    with span(
+        stage, category="ffmpeg", bytes_in=sum(map(file_size, input_fnames))
+    ) as attrs:
+        attrs["exit_code"] = subprocess.run(ffmpeg_cmd, shell=False).returncode
+        attrs["bytes_out"] = sum(map(file_size, output_fnames))
+    return attrs["exit_code"]
 
 
 def check_ffmpeg(func: Callable) -> Callable:
@@ -77,8 +114,223 @@ def check_ffmpeg(func: Callable) -> Callable:
     return inner_func
 
 
+def _check_fade_args(
+    input_fname: str,
+    fade_end: str,
+    duration: Tuple[Union[int, float], Union[int, float]],
+    seconds: Union[int, float],
+) -> Union[int, float]:
+    """
+    Validate fade arguments for a track.
+    :param input_fname: input file path
+    :param fade_end: fade start, end, both start and end, or none.
+    :param duration: duration start and end
+    :param seconds: seconds to fade. float or int
+
+    :return: track length in seconds.
+    """
+    if duration == (0, 0):
+        raise PostProcessError("No track duration given.")
+    elif any(
+        [
+            isinstance(duration, tuple) is False,
+            all(isinstance(dur, (int, float)) for dur in duration) is False,
+            len(duration) != 2,
+        ]
+    ):
+        raise PostProcessError(
+            f"Invalid duration ({duration}) provided for {input_fname}."
+        )
+    else:
+        track_time = duration[1] - duration[0]
+        if seconds > track_time:
+            raise PostProcessError(
+                f"Invalid fade time. Longer than track length. ({seconds} > {track_time})"
+            )
+    if not (isinstance(seconds, int) or isinstance(seconds, float)):
+        raise PostProcessError(
+            f"Invalid fade time. Not a number. ({seconds}: {type(seconds)})"
+        )
+    if fade_end.lower() not in ("in", "out", "both", "none"):
+        raise PostProcessError(f"Invalid fade option. ({fade_end})")
+
+    return track_time
+
+
+def keyframe_index(input_fname: str) -> List[float]:
+    """
+    Get keyframe timestamps of a source.
+    Index is built once with ffprobe and cached next to the source as json keyed by its size and mtime.
+    :param input_fname: input source file
+
+    :return: sorted keyframe timestamps in seconds. Empty if source can't be probed.
+    """
+    index_fname = f"{input_fname}.keyframes.json"
+    src_stat = os.stat(input_fname)
+    src_key = {"size": src_stat.st_size, "mtime": src_stat.st_mtime_ns}
+
+    try:
+        with open(index_fname, "r") as jfile:
+            index = json.load(jfile)
+        if index["source"] == src_key:
+            return index["keyframes"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    keyframes = []
+    # Use video keyframes if any. Otherwise, audio packets.
+    for stream in ("v:0", "a:0"):
+        try:
+            packets = probe(
+                input_fname,
+                select_streams=stream,
+                show_entries="packet=pts_time,flags",
+            ).get("packets", [])
+        except (FFmpegError, OSError) as e:
+            logger.warning(f"Unable to build keyframe index for {input_fname}: {e}")
+            return []
+        keyframes = sorted(
+            float(packet["pts_time"])
+            for packet in packets
+            if "K" in packet.get("flags", "") and "pts_time" in packet
+        )
+        if keyframes:
+            break
+
+    # Write to temp file first so concurrent readers never see a partial index.
+    tmp_index_fname = f"{index_fname}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_index_fname, "w") as jfile:
+            json.dump({"source": src_key, "keyframes": keyframes}, jfile)
+        os.replace(tmp_index_fname, index_fname)
+        logger.info(
+            f"Saved keyframe index ({len(keyframes)} keyframes) to {index_fname}"
+        )
+    except OSError as e:
+        logger.error(f"Unable to save keyframe index due to: {e}")
+
+    return keyframes
+
+
+def snap_to_keyframe(
+    time: Union[int, float], keyframes: List[float], tolerance: float
+) -> Union[int, float]:
+    """
+    Snap a time to the nearest keyframe if within some tolerance.
+    :param time: time in seconds
+    :param keyframes: sorted keyframe timestamps in seconds.
+    :param tolerance: max distance in seconds to snap.
+
+    :return: keyframe timestamp or original time.
+    """
+    pos = bisect.bisect_left(keyframes, time)
+    nearest = min(
+        keyframes[max(pos - 1, 0) : pos + 1],
+        key=lambda keyframe: abs(keyframe - time),
+        default=None,
+    )
+    if nearest is not None and abs(nearest - time) <= tolerance:
+        return nearest
+    return time
+
+
+def _fade_filters(
+    fade_end: str, seconds: Union[int, float], track_time: int
+) -> Dict[str, str]:
+    """
+    Build video and audio fade filters for a track.
+    :param fade_end: fade start, end, or both start and end.
+    :param seconds: seconds to fade. float or int
+    :param track_time: track length in seconds.
+
+    :return: filter strings keyed by stream type ("video", "audio").
+    """
+    # https://stackoverflow.com/questions/43818892/fade-out-video-audio-with-ffmpeg
+    fades = {
+        "in": [f"in:st=0:d={seconds}"],
+        "out": [f"out:st=0:d={seconds}"],
+        "both": [
+            f"in:st=0:d={seconds}",
+            f"out:st={track_time - seconds}:d={seconds}",
+        ],
+    }[fade_end.lower()]
+
+    return {
+        "video": ", ".join(f"fade={fade}" for fade in fades),
+        "audio": ", ".join(f"afade={fade}" for fade in fades),
+    }
+
+
+def can_stream_copy(input_fname: str, output_fname: str) -> bool:
+    """
+    Check if streams of input can be copied into output without encoding.
+    Only when both have the same container. ex. aac in m4a can't be copied into mp3.
+    :param input_fname: input file
+    :param output_fname: output file
+
+    :return: True if streams can be copied.
+    """
+    input_ext, output_ext = (
+        os.path.splitext(fname)[1].lower() for fname in (input_fname, output_fname)
+    )
+    return input_ext == output_ext
+
+
+def _thread_args(threads: int, filter_threads: int) -> Tuple[List[str], List[str]]:
+    """
+    ffmpeg options limiting threads used by decoders, filters and encoders.
+    :param threads: decoder and encoder threads. ffmpeg default (all cores) if 0.
+    :param filter_threads: filter threads. ffmpeg default (all cores) if 0.
+    :return: options placed before input and options placed before each output.
+    """
+    input_args, output_args = [], []
+    if filter_threads:
+        input_args += [
+            "-filter_threads",
+            str(filter_threads),
+            "-filter_complex_threads",
+            str(filter_threads),
+        ]
+    if threads:
+        input_args += ["-threads", str(threads)]
+        output_args += ["-threads", str(threads)]
+    return input_args, output_args
+
+
+def _metadata_args(title: str, track: int, album_tags: Dict[str, str]) -> List[str]:
+    """
+    Build ffmpeg metadata arguments for a track.
+    :param title: title to add
+    :param track: track to add
+    :param album_tags: tags
+
+    :return: metadata args as list of str.
+    """
+    metadata_args = []
+
+    # compile album tags
+    for tag, tag_val in album_tags.items():
+        tag_value_qt = shlex.split(shlex.quote(tag_val))[0]
+        tag_str = f"{tag}={tag_value_qt}"
+        metadata_args.append("-metadata")
+        metadata_args.append(tag_str)
+
+    # Add track if mp3
+    # If title is blank give just generic title.
+    # Title should already be escaped and safe at this point.
+    metadata_args += [
+        "-metadata",
+        f"title={title}",
+        "-metadata",
+        f"track={str(track)}",
+    ]
+    return metadata_args
+
+
 @check_ffmpeg
-def slice_source(input_fname: str, output_fname: str, duration: Tuple[int, int]) -> str:
+def slice_source(
+    input_fname: str, output_fname: str, duration: Tuple[float, float]
+) -> str:
     """
     Slice source by single duration given.
     :param input_fname: input source file
@@ -87,28 +339,29 @@ def slice_source(input_fname: str, output_fname: str, duration: Tuple[int, int])
     :return: escaped output file path
     """
     if not isinstance(duration, tuple) and all(
-        isinstance(time, int) for time in duration
+        isinstance(time, (int, float)) for time in duration
     ):
         raise PostProcessError("Invalid duration times.")
 
     input_fname_qt = shlex.quote(input_fname)
     output_fname_qt = shlex.quote(output_fname)
 
-    # ss arg for position, c for codec/copy
+    # ss arg for position before input to seek instead of demuxing up to position.
+    # t for length, c for codec/copy
     # -map_metadata 0 copy metadata from source to output
     cmd = [
         "ffmpeg",
         "-hide_banner",
         "-loglevel",
         "error",
+        "-ss",
+        f"{duration[0]}",
         "-i",
         *shlex.split(input_fname_qt),
+        "-t",
+        f"{duration[1] - duration[0]}",
         "-map_metadata",
         "0",
-        "-ss",
-        f"{duration[0]}",
-        "-to",
-        f"{duration[1]}",
         "-c",
         "copy",
         *shlex.split(output_fname_qt),
@@ -119,7 +372,7 @@ def slice_source(input_fname: str, output_fname: str, duration: Tuple[int, int])
         # if contains characters that can't be encoded.
         logger.info(f"Sliced source from {duration[0]}-{duration[1]}")
 
-    subprocess.run(cmd, shell=False)
+    run_ffmpeg(cmd, "ffmpeg.slice", [input_fname], [output_fname])
 
     return shlex.split(output_fname_qt)[0]
 
@@ -147,65 +400,21 @@ def apply_fade(
     input_fname_qt = shlex.quote(input_fname)
     output_fname_qt = shlex.quote(output_fname)
 
-    if duration == (0, 0):
-        raise PostProcessError("No track duration given.")
-    elif any(
-        [
-            isinstance(duration, tuple) is False,
-            all(isinstance(dur, int) for dur in duration) is False,
-            len(duration) != 2,
-        ]
-    ):
-        raise PostProcessError(
-            f"Invalid duration ({duration}) provided for {input_fname}."
-        )
-    else:
-        track_time = duration[1] - duration[0]
-        if seconds > track_time:
-            raise PostProcessError(
-                f"Invalid fade time. Longer than track length. ({seconds} > {track_time})"
-            )
-    if not (isinstance(seconds, int) or isinstance(seconds, float)):
-        raise PostProcessError(
-            f"Invalid fade time. Not a number. ({seconds}: {type(seconds)})"
-        )
-    if fade_end.lower() not in ("in", "out", "both", "none"):
-        raise PostProcessError(f"Invalid fade option. ({fade_end})")
+    track_time = _check_fade_args(input_fname, fade_end, duration, seconds)
 
     if fade_end.lower() == "none":
         # if no fade, return source file path.
         return shlex.split(input_fname_qt)[0]
 
-    # https://stackoverflow.com/questions/43818892/fade-out-video-audio-with-ffmpeg
+    fade_filters = _fade_filters(fade_end, seconds, track_time)
     fade_cmds = {
-        "video": {
-            "in": [
-                "-filter_complex",
-                f"fade=in:st=0:d={seconds}",
-                "-filter_complex",
-                f"afade=in:st=0:d={seconds}",
-            ],
-            "out": [
-                "-filter_complex",
-                f"fade=t=out:st=0:d={seconds}",
-                "-filter_complex",
-                f"afade=t=out:st=0:d={seconds}",
-            ],
-            "both": [
-                "-filter_complex",
-                f"fade=in:st=0:d={seconds}, fade=out:st={track_time - seconds}:d={seconds}",
-                "-filter_complex",
-                f"afade=in:st=0:d={seconds}, afade=out:st={track_time - seconds}:d={seconds}",
-            ],
-        },
-        "audio": {
-            "in": ["-filter_complex", f"afade=in:st=0:d={seconds}"],
-            "out": ["-filter_complex", f"afade=out:st=0:d={seconds}"],
-            "both": [
-                "-filter_complex",
-                f"afade=in:st=0:d={seconds}, afade=out:st={track_time - seconds}:d={seconds}",
-            ],
-        },
+        "video": [
+            "-filter_complex",
+            fade_filters["video"],
+            "-filter_complex",
+            fade_filters["audio"],
+        ],
+        "audio": ["-filter_complex", fade_filters["audio"]],
     }
 
     output_type = "audio" if output_fname.endswith(".mp3") else "video"
@@ -220,11 +429,11 @@ def apply_fade(
         "0",
         "-max_muxing_queue_size",
         "1024",
-        *fade_cmds[output_type][fade_end.lower()],
+        *fade_cmds[output_type],
         *shlex.split(output_fname_qt),
     ]
 
-    subprocess.run(cmd, shell=False)
+    run_ffmpeg(cmd, "ffmpeg.fade", [input_fname], [output_fname])
 
     try:
         if remove_original:
@@ -263,24 +472,7 @@ def apply_metadata(
     input_fname_qt = shlex.quote(input_fname)
     output_fname_qt = shlex.quote(output_fname)
 
-    metadata_args = []
-
-    # compile album tags
-    for tag, tag_val in album_tags.items():
-        tag_value_qt = shlex.split(shlex.quote(tag_val))[0]
-        tag_str = f"{tag}={tag_value_qt}"
-        metadata_args.append("-metadata")
-        metadata_args.append(tag_str)
-
-    # Add track if mp3
-    # If title is blank give just generic title.
-    # Title should already be escaped and safe at this point.
-    metadata_args += [
-        "-metadata",
-        f"title={title}",
-        "-metadata",
-        f"track={str(track)}",
-    ]
+    metadata_args = _metadata_args(title, track, album_tags)
 
     cmd = [
         "ffmpeg",
@@ -295,7 +487,7 @@ def apply_metadata(
         *shlex.split(output_fname_qt),
     ]
 
-    subprocess.run(cmd, shell=False)
+    run_ffmpeg(cmd, "ffmpeg.metadata", [input_fname], [output_fname])
 
     try:
         if remove_original:
@@ -310,6 +502,284 @@ def apply_metadata(
     return shlex.split(output_fname_qt)[0]
 
 
+def render_track_cmd(
+    input_fname: str,
+    output_fname: str,
+    duration: Tuple[float, float],
+    title: str,
+    track: int,
+    album_tags: Dict[str, str],
+    fade_end: str = "both",
+    seconds: Union[int, float] = 1,
+    threads: int = 0,
+    filter_threads: int = 0,
+) -> List[str]:
+    """
+    ffmpeg command to slice, fade and tag a single track in one pass. See render_track.
+    :param input_fname: input source file
+    :param output_fname: output file
+    :param duration: durations start and end timestamp
+    :param title: title to add
+    :param track: track to add
+    :param album_tags: tags
+    :param fade_end: fade start, end, both start and end, or none.
+    :param seconds: seconds to fade. float or int
+    :param threads: ffmpeg decoder and encoder threads. ffmpeg default if 0.
+    :param filter_threads: ffmpeg filter threads. ffmpeg default if 0.
+
+    :return: ffmpeg cmd as list of str.
+    """
+    input_fname_qt = shlex.quote(input_fname)
+    output_fname_qt = shlex.quote(output_fname)
+
+    track_time = _check_fade_args(input_fname, fade_end, duration, seconds)
+    output_type = "audio" if output_fname.endswith(".mp3") else "video"
+
+    # Seek on input so only the track is demuxed and filter timestamps start at 0 for the track.
+    seek_args = ["-ss", f"{duration[0]}", "-t", f"{track_time}"]
+    if fade_end.lower() == "none":
+        # No filters so stream copy the slice like slice_source.
+        # Otherwise, encode the slice to the output's default codec. ex. m4a -> mp3
+        slice_args = (
+            ["-c", "copy"] if can_stream_copy(input_fname, output_fname) else []
+        )
+    else:
+        fade_filters = _fade_filters(fade_end, seconds, track_time)
+        slice_args = ["-max_muxing_queue_size", "1024", "-af", fade_filters["audio"]]
+        if output_type == "video":
+            slice_args += ["-vf", fade_filters["video"]]
+
+    input_thread_args, output_thread_args = _thread_args(threads, filter_threads)
+
+    # -map_metadata 0 copy metadata from source to output
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        *input_thread_args,
+        *seek_args,
+        "-i",
+        *shlex.split(input_fname_qt),
+        "-map_metadata",
+        "0",
+        *slice_args,
+        *output_thread_args,
+        *_metadata_args(title, track, album_tags),
+        *shlex.split(output_fname_qt),
+    ]
+
+
+@check_ffmpeg
+def render_track(
+    input_fname: str,
+    output_fname: str,
+    duration: Tuple[float, float],
+    title: str,
+    track: int,
+    album_tags: Dict[str, str],
+    fade_end: str = "both",
+    seconds: Union[int, float] = 1,
+    threads: int = 0,
+    filter_threads: int = 0,
+) -> str:
+    """
+    Slice, fade and tag a single track in one ffmpeg pass.
+    Equivalent to slice_source -> apply_fade -> apply_metadata without intermediate files.
+    :param input_fname: input source file
+    :param output_fname: output file
+    :param duration: durations start and end timestamp
+    :param title: title to add
+    :param track: track to add
+    :param album_tags: tags
+    :param fade_end: fade start, end, both start and end, or none.
+    :param seconds: seconds to fade. float or int
+    :param threads: ffmpeg decoder and encoder threads. ffmpeg default if 0.
+    :param filter_threads: ffmpeg filter threads. ffmpeg default if 0.
+
+    :return: escaped output file path
+    """
+    cmd = render_track_cmd(
+        input_fname,
+        output_fname,
+        duration,
+        title,
+        track,
+        album_tags,
+        fade_end,
+        seconds,
+        threads,
+        filter_threads,
+    )
+    output_fname_qt = shlex.quote(output_fname)
+
+    run_ffmpeg(cmd, "ffmpeg.render_track", [input_fname], [output_fname])
+
+    try:
+        logger.info(f"Completed render command: {' '.join(cmd)}")
+    except (UnicodeEncodeError, UnicodeError):
+        logger.info(
+            f"Rendered track {track} from {duration[0]}-{duration[1]} "
+            f"with fade: {fade_end} for {seconds} seconds."
+        )
+
+    return shlex.split(output_fname_qt)[0]
+
+
+def render_tracks_cmd(
+    input_fname: str,
+    tracks: List[Tuple[str, Tuple[float, float], str, int]],
+    album_tags: Dict[str, str],
+    fade_end: str = "both",
+    seconds: Union[int, float] = 1,
+    threads: int = 0,
+    filter_threads: int = 0,
+) -> List[str]:
+    """
+    ffmpeg command to slice, fade and tag all tracks of a source in one process. See render_tracks.
+    With fades, the source is read and decoded once and each track is written as a separate output.
+    Without, each track seeks on its own input like render_track so stream copied tracks keep the same frames.
+    :param input_fname: input source file
+    :param tracks: output file, duration, title and track number of each track.
+    :param album_tags: tags
+    :param fade_end: fade start, end, both start and end, or none.
+    :param seconds: seconds to fade. float or int
+    :param threads: ffmpeg decoder and encoder threads of each output. ffmpeg default if 0.
+    :param filter_threads: ffmpeg filter threads. ffmpeg default if 0.
+
+    :return: ffmpeg cmd as list of str.
+    """
+    input_fname_qt = shlex.quote(input_fname)
+    output_fnames = [shlex.split(shlex.quote(track[0]))[0] for track in tracks]
+    output_type = "audio" if output_fnames[0].endswith(".mp3") else "video"
+    stream_types = ["audio"] if output_type == "audio" else ["video", "audio"]
+
+    track_times = [
+        _check_fade_args(input_fname, fade_end, duration, seconds)
+        for _, duration, _, _ in tracks
+    ]
+
+    input_thread_args, output_thread_args = _thread_args(threads, filter_threads)
+    input_args = []
+    filter_args = []
+    output_args = []
+    if fade_end.lower() == "none":
+        # Stream copy each slice if possible.
+        # Seeking on the output would drop stream copied video up to the next keyframe.
+        # So, like render_track_cmd, each track seeks on its own input and only its slice is demuxed.
+        codec_args = (
+            ["-c", "copy"] if can_stream_copy(input_fname, output_fnames[0]) else []
+        )
+        for i, (output_fname, (_, duration, title, num), track_time) in enumerate(
+            zip(output_fnames, tracks, track_times)
+        ):
+            input_args += [
+                *input_thread_args,
+                "-ss",
+                f"{duration[0]}",
+                "-t",
+                f"{track_time}",
+                "-i",
+                *shlex.split(input_fname_qt),
+            ]
+            for stream_type in stream_types:
+                output_args += ["-map", f"{i}:{stream_type[0]}:0"]
+            output_args += [
+                "-map_metadata",
+                str(i),
+                *codec_args,
+                *output_thread_args,
+                *_metadata_args(title, num, album_tags),
+                output_fname,
+            ]
+    else:
+        input_args = [*input_thread_args, "-i", *shlex.split(input_fname_qt)]
+        # Split each decoded stream once per track, then trim and fade each copy.
+        # https://ffmpeg.org/ffmpeg-filters.html#split_002c-asplit
+        filter_chains = []
+        for stream_type in stream_types:
+            prefix, label = ("a", "a") if stream_type == "audio" else ("", "v")
+            split_pads = "".join(f"[{label}{i}]" for i in range(len(tracks)))
+            filter_chains.append(f"[0:{label}]{prefix}split={len(tracks)}{split_pads}")
+            for i, ((_, duration, _, _), track_time) in enumerate(
+                zip(tracks, track_times)
+            ):
+                fade_filter = _fade_filters(fade_end, seconds, track_time)[stream_type]
+                filter_chains.append(
+                    f"[{label}{i}]{prefix}trim=start={duration[0]}:end={duration[1]},"
+                    f"{prefix}setpts=PTS-STARTPTS,{fade_filter}[{label}out{i}]"
+                )
+        filter_args = ["-filter_complex", "; ".join(filter_chains)]
+
+        for i, (output_fname, (_, _, title, num)) in enumerate(
+            zip(output_fnames, tracks)
+        ):
+            for stream_type in stream_types:
+                label = "a" if stream_type == "audio" else "v"
+                output_args += ["-map", f"[{label}out{i}]"]
+            output_args += [
+                "-map_metadata",
+                "0",
+                "-max_muxing_queue_size",
+                "1024",
+                *output_thread_args,
+                *_metadata_args(title, num, album_tags),
+                output_fname,
+            ]
+
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        *input_args,
+        *filter_args,
+        *output_args,
+    ]
+
+
+@check_ffmpeg
+def render_tracks(
+    input_fname: str,
+    tracks: List[Tuple[str, Tuple[float, float], str, int]],
+    album_tags: Dict[str, str],
+    fade_end: str = "both",
+    seconds: Union[int, float] = 1,
+    threads: int = 0,
+    filter_threads: int = 0,
+) -> int:
+    """
+    Slice, fade and tag all tracks of a source with a single ffmpeg process.
+    With fades, the source is read and decoded once and each track is written as a separate output.
+    :param input_fname: input source file
+    :param tracks: output file, duration, title and track number of each track.
+    :param album_tags: tags
+    :param fade_end: fade start, end, both start and end, or none.
+    :param seconds: seconds to fade. float or int
+    :param threads: ffmpeg decoder and encoder threads of each output. ffmpeg default if 0.
+    :param filter_threads: ffmpeg filter threads. ffmpeg default if 0.
+
+    :return: exit code of ffmpeg
+    """
+    if not tracks:
+        return 0
+
+    cmd = render_tracks_cmd(
+        input_fname, tracks, album_tags, fade_end, seconds, threads, filter_threads
+    )
+    output_fnames = [track[0] for track in tracks]
+    exit_code = run_ffmpeg(cmd, "ffmpeg.render_tracks", [input_fname], output_fnames)
+
+    try:
+        logger.info(f"Completed multi-output render command: {' '.join(cmd)}")
+    except (UnicodeEncodeError, UnicodeError):
+        logger.info(
+            f"Rendered {len(tracks)} tracks with fade: {fade_end} for {seconds} seconds."
+        )
+
+    return exit_code
+
+
 @check_ffmpeg
 def convert_audio(
     input_video_fname: str, output_audio_fname: str, remove_original: bool = True
@@ -336,10 +806,22 @@ def convert_audio(
         *shlex.split(output_video_fname_qt),
     ]
 
-    run_ffmpeg_w_progress(
-        cmd,
-        desc=f"Converting {input_video_fname_qt} to audio file, {output_video_fname_qt}.",
-    )
+    with span(
+        "ffmpeg.convert_audio",
+        category="ffmpeg",
+        bytes_in=file_size(input_video_fname),
+    ) as attrs:
+        attrs["exit_code"] = run_ffmpeg_w_progress(
+            cmd,
+            desc=f"Converting {input_video_fname_qt} to audio file, {output_video_fname_qt}.",
+        )
+        attrs["bytes_out"] = file_size(output_audio_fname)
+
+    # Keep the original so a failed conversion can be retried.
+    if attrs["exit_code"] != 0:
+        raise PostProcessError(
+            f"Unable to convert {input_video_fname} to audio. (exit code {attrs['exit_code']})"
+        )
 
     try:
         if remove_original:
@@ -354,6 +836,269 @@ def convert_audio(
     return shlex.split(output_video_fname_qt)[0]
 
 
+def mp3_chunk_bounds(duration: float, sample_rate: int, n_chunks: int) -> List[int]:
+    """
+    Split audio into chunks at mp3 frame boundaries.
+    :param duration: audio duration in seconds.
+    :param sample_rate: audio sample rate in Hz.
+    :param n_chunks: max number of chunks. Fewer if chunks would be shorter than MIN_CHUNK_SECONDS.
+
+    :return: first frame of each chunk followed by the total number of frames.
+    """
+    n_frames = math.ceil(duration * sample_rate / MP3_FRAME_SAMPLES)
+    n_chunks = max(1, min(n_chunks, int(duration // MIN_CHUNK_SECONDS)))
+    return [round(i * n_frames / n_chunks) for i in range(n_chunks + 1)]
+
+
+def _concat_entry(
+    fname: str, duration: float, inpoint: float = None, outpoint: float = None
+) -> str:
+    """
+    File entry of a concat demuxer script.
+    https://ffmpeg.org/ffmpeg-formats.html#concat-1
+    """
+    fname_escaped = fname.replace("'", "'\\''")
+    # Duration offsets timestamps of the next file. Otherwise, taken from outpoint and inpoint.
+    lines = [f"file '{fname_escaped}'", f"duration {duration}"]
+    if inpoint is not None:
+        lines.append(f"inpoint {inpoint}")
+    if outpoint is not None:
+        lines.append(f"outpoint {outpoint}")
+    return "\n".join(lines)
+
+
+@check_ffmpeg
+def convert_audio_chunked(
+    input_video_fname: str,
+    output_audio_fname: str,
+    n_chunks: int,
+    remove_original: bool = True,
+) -> str:
+    """
+    Convert video/multiple stream file to an mp3 file by encoding chunks of it in parallel.
+    Chunks are cut at mp3 frame boundaries and each is encoded with some preceding audio and without the bit reservoir
+    so its frames don't depend on other chunks. Chunks are then joined with the concat demuxer without encoding,
+    dropping the extra frames, so the output is gapless.
+    Falls back to convert_audio if the output isn't mp3 or the source is too short to split.
+    :params input_video_fname: input video file
+    :params output_audio_fname: output mp3 file.
+    :param n_chunks: max number of chunks encoded at once.
+    :param remove_original: remove original file.
+
+    :return: path to param output_fname
+    """
+    if n_chunks < 2 or not output_audio_fname.endswith(".mp3"):
+        return convert_audio(input_video_fname, output_audio_fname, remove_original)
+
+    try:
+        audio_info = probe(input_video_fname, select_streams="a:0")
+        sample_rate = int(audio_info["streams"][0]["sample_rate"])
+        duration = float(audio_info["format"]["duration"])
+    except (FFmpegError, OSError, KeyError, IndexError, ValueError) as e:
+        logger.warning(f"Unable to probe {input_video_fname} for chunking: {e}")
+        return convert_audio(input_video_fname, output_audio_fname, remove_original)
+
+    bounds = mp3_chunk_bounds(duration, sample_rate, n_chunks)
+    if len(bounds) < 3:
+        return convert_audio(input_video_fname, output_audio_fname, remove_original)
+
+    input_video_fname_qt = shlex.quote(input_video_fname)
+    output_audio_fname_qt = shlex.quote(output_audio_fname)
+    frame_time = MP3_FRAME_SAMPLES / sample_rate
+    chunk_dir = tempfile.mkdtemp(
+        prefix=".chunks_",
+        dir=os.path.dirname(os.path.abspath(output_audio_fname)),
+    )
+
+    chunk_cmds, concat_entries = [], []
+    for i, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        chunk_fname = os.path.join(chunk_dir, f"chunk_{i:04}.mp3")
+        preroll = min(CHUNK_PREROLL_FRAMES, start)
+        # Seek on input to a frame boundary so frames of every chunk line up with the frames of a single encode.
+        chunk_cmds.append(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-threads",
+                "1",
+                "-ss",
+                f"{(start - preroll) * frame_time}",
+                "-t",
+                f"{(preroll + end - start + CHUNK_TAIL_FRAMES) * frame_time}",
+                "-i",
+                *shlex.split(input_video_fname_qt),
+                "-vn",
+                "-c:a",
+                "libmp3lame",
+                "-reservoir",
+                "0",
+                "-write_xing",
+                "0",
+                chunk_fname,
+            ]
+        )
+        # Keep frames from start to end. Points are mid-frame so rounding can't move a cut to a neighbouring frame.
+        concat_entries.append(
+            _concat_entry(
+                chunk_fname,
+                duration=(end - start) * frame_time,
+                inpoint=(preroll + 0.5) * frame_time if preroll else None,
+                outpoint=(preroll + end - start - 0.5) * frame_time
+                if end != bounds[-1]
+                else None,
+            )
+        )
+
+    chunk_jobs = [
+        FFmpegJob(
+            key=i,
+            cmd=chunk_cmd,
+            stage="ffmpeg.convert_audio_chunk",
+            output_fnames=[chunk_cmd[-1]],
+        )
+        for i, chunk_cmd in enumerate(chunk_cmds)
+    ]
+    concat_fname = os.path.join(chunk_dir, "chunks.txt")
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        concat_fname,
+        "-c",
+        "copy",
+        *shlex.split(output_audio_fname_qt),
+    ]
+
+    prog_bar_len = shutil.get_terminal_size().columns
+    max_width = int(prog_bar_len * 0.55)
+    print(
+        f"\nConverting {input_video_fname_qt} to audio file, {output_audio_fname_qt}, "
+        f"in {len(chunk_cmds)} chunks."
+    )
+    try:
+        with span(
+            "ffmpeg.convert_audio",
+            category="ffmpeg",
+            bytes_in=file_size(input_video_fname),
+            n_chunks=len(chunk_cmds),
+        ) as attrs:
+            # Closed before the chunk directory is removed so a failed chunk kills the others still writing to it.
+            with contextlib.closing(
+                run_jobs(chunk_jobs, n_chunks)
+            ) as results, tqdm.tqdm(
+                total=len(chunk_cmds),
+                bar_format=f" ↳ |{{bar:{max_width}}}| {{percentage:3.0f}}.0%",
+                leave=True,
+                position=0,
+            ) as pb:
+                for result in results:
+                    if result.exit_code != 0:
+                        raise PostProcessError(
+                            f"Unable to encode chunk of {input_video_fname}. (exit code {result.exit_code})"
+                        )
+                    pb.update(1)
+
+            with open(concat_fname, "w") as concat_file:
+                concat_file.write("\n".join(concat_entries) + "\n")
+            attrs["exit_code"] = run_ffmpeg(
+                cmd, "ffmpeg.concat", [], [output_audio_fname]
+            )
+            attrs["bytes_out"] = file_size(output_audio_fname)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    if attrs["exit_code"] != 0:
+        raise PostProcessError(
+            f"Unable to join chunks of {input_video_fname}. (exit code {attrs['exit_code']})"
+        )
+
+    try:
+        if remove_original:
+            os.remove(input_video_fname)
+            logger.info(f"Removed {input_video_fname}")
+        logger.info(
+            f"Completed chunked audio conversion ({len(chunk_cmds)} chunks) command: {' '.join(cmd)}"
+        )
+    except OSError as e:
+        logger.error(f"Unable to remove file due to: {e}")
+    except (UnicodeEncodeError, UnicodeError):
+        logger.info(f"Converted {input_video_fname} to {output_audio_fname}.")
+
+    return shlex.split(output_audio_fname_qt)[0]
+
+
+@check_ffmpeg
+def convert_audio_stream(chunks: Iterable[bytes], output_audio_fname: str) -> str:
+    """
+    Convert a media stream to an audio file while it is being read.
+    Chunks are piped into ffmpeg's stdin so no copy of the source is written to disk.
+    Input must be streamable. ex. fragmented mp4 or webm as served by YouTube.
+    :params chunks: chunks of source media.
+    :params output_audio_fname: output audio file.
+
+    :return: path to param output_fname
+    """
+    output_audio_fname_qt = shlex.quote(output_audio_fname)
+
+    # -y as stdin is the source so ffmpeg can't prompt to overwrite.
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        "pipe:0",
+        "-vn",
+        *shlex.split(output_audio_fname_qt),
+    ]
+
+    with span("ffmpeg.convert_audio_stream", category="ffmpeg", bytes_in=0) as attrs:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+                attrs["bytes_in"] += len(chunk)
+        except BrokenPipeError:
+            # ffmpeg exited early. Error reported by exit code.
+            pass
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            attrs["exit_code"] = process.wait()
+        attrs["bytes_out"] = file_size(output_audio_fname)
+
+    if attrs["exit_code"] != 0:
+        # Don't leave a partial output that would be mistaken for a finished download.
+        try:
+            os.remove(output_audio_fname)
+        except FileNotFoundError:
+            pass
+        raise PostProcessError(
+            f"Unable to convert streamed audio to {output_audio_fname}. (exit code {attrs['exit_code']})"
+        )
+
+    try:
+        logger.info(f"Completed streamed audio conversion command: {' '.join(cmd)}")
+    except (UnicodeEncodeError, UnicodeError):
+        logger.info(f"Converted streamed audio to {output_audio_fname}.")
+
+    return shlex.split(output_audio_fname_qt)[0]
+
+
 @check_ffmpeg
 def merge_codecs(
     input_audio_fname: str,
@@ -373,6 +1118,10 @@ def merge_codecs(
     input_video_fname_qt = shlex.quote(input_video_fname)
     output_video_fname_qt = shlex.quote(output_video_fname)
 
+    # Audio stream is usually aac in mp4 already. Only encode if it isn't.
+    audio_codec = (
+        "copy" if can_stream_copy(input_audio_fname, output_video_fname) else "aac"
+    )
     cmd = [
         "ffmpeg",
         "-hide_banner",
@@ -383,15 +1132,27 @@ def merge_codecs(
         "-i",
         *shlex.split(input_video_fname_qt),
         "-c:a",
-        "aac",
+        audio_codec,
         "-c:v",
         "copy",
         *shlex.split(output_video_fname_qt),
     ]
 
-    run_ffmpeg_w_progress(
-        cmd, desc=f"Merging {input_audio_fname_qt} and {input_video_fname_qt}."
-    )
+    with span(
+        "ffmpeg.merge_codecs",
+        category="ffmpeg",
+        bytes_in=file_size(input_audio_fname) + file_size(input_video_fname),
+    ) as attrs:
+        attrs["exit_code"] = run_ffmpeg_w_progress(
+            cmd, desc=f"Merging {input_audio_fname_qt} and {input_video_fname_qt}."
+        )
+        attrs["bytes_out"] = file_size(output_video_fname)
+
+    # Keep the originals so a failed merge can be retried.
+    if attrs["exit_code"] != 0:
+        raise PostProcessError(
+            f"Unable to merge {input_audio_fname} and {input_video_fname}. (exit code {attrs['exit_code']})"
+        )
 
     try:
         if remove_original:
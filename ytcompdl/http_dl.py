@@ -0,0 +1,336 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .errors import PyTubeError
+
+logger = logging.getLogger(__name__)
+
+# Same as pytube.request.default_range_size. YouTube throttles longer requests.
+SEGMENT_SIZE = 9437184
+CHUNK_SIZE = 256 * 1024
+# Headers pytube sends with each request.
+HEADERS = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+MAX_RETRIES = 3
+TIMEOUT = 30
+# Partial download and its journal of completed ranges.
+PART_EXT = ".part"
+JOURNAL_EXT = ".part.json"
+
+
+def build_session(n_connections: int) -> requests.Session:
+    """
+    Session keeping up to n_connections keep-alive connections open per host.
+    :param n_connections: max concurrent connections.
+
+    :return: session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=n_connections, max_retries=MAX_RETRIES
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def segments(size: int, segment_size: int = SEGMENT_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split a file into byte ranges.
+    :param size: file size in bytes.
+    :param segment_size: max bytes per range.
+
+    :return: first and last byte (inclusive) of each range.
+    """
+    return [
+        (start, min(start + segment_size, size) - 1)
+        for start in range(0, size, segment_size)
+    ]
+
+
+def content_length(session: requests.Session, url: str) -> Tuple[int, bool]:
+    """
+    Get size of a url's content and if it can be requested in ranges.
+    :param session: requests session
+    :param url: url
+
+    :return: size in bytes and if ranges are supported.
+    """
+    with session.get(
+        url, headers={"Range": "bytes=0-0"}, stream=True, timeout=TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            # ex. bytes 0-0/1234
+            return int(response.headers["Content-Range"].rsplit("/", 1)[1]), True
+        return int(response.headers.get("Content-Length", 0)), False
+
+
+class DownloadJournal:
+    """
+    Sidecar journal of a partial download.
+    Records which ranges of the .part file are complete with their checksums so a restarted download fetches only
+    the missing ranges. Only valid for the same stream (itag), size and range size.
+    """
+
+    def __init__(
+        self, fname: str, itag: Optional[int], size: int, segment_size: int
+    ) -> None:
+        self.fname = fname
+        self.source = {"itag": itag, "size": size, "segment_size": segment_size}
+        # First byte of range -> last byte and sha1 of range.
+        self.ranges: Dict[int, Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(
+        cls,
+        fname: str,
+        part_fname: str,
+        itag: Optional[int],
+        size: int,
+        segment_size: int,
+    ) -> "DownloadJournal":
+        """
+        Load journal of a partial download. Ranges whose bytes in the .part file no longer match are dropped.
+        :param fname: journal file.
+        :param part_fname: partial download.
+        :param itag: stream itag.
+        :param size: stream size in bytes.
+        :param segment_size: bytes per range.
+
+        :return: journal. Empty if missing, invalid or for another stream.
+        """
+        journal = cls(fname, itag, size, segment_size)
+        try:
+            with open(fname, "r") as jfile:
+                saved = json.load(jfile)
+            if saved["source"] != journal.source:
+                logger.info(f"Journal {fname} is for another stream. Starting over.")
+                return journal
+            with open(part_fname, "rb") as part_file:
+                for start, end, checksum in saved["ranges"]:
+                    part_file.seek(start)
+                    data = part_file.read(end - start + 1)
+                    if hashlib.sha1(data).hexdigest() == checksum:
+                        journal.ranges[start] = (end, checksum)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return journal
+
+    @property
+    def bytes_done(self) -> int:
+        return sum(end - start + 1 for start, (end, _) in self.ranges.items())
+
+    def add(self, segment: Tuple[int, int], checksum: str) -> None:
+        """
+        Record a completed range and save the journal.
+        """
+        with self._lock:
+            self.ranges[segment[0]] = (segment[1], checksum)
+            self.save()
+
+    def save(self) -> None:
+        # Write to temp file first so a crash never leaves a partial journal.
+        tmp_fname = f"{self.fname}.{os.getpid()}.tmp"
+        with open(tmp_fname, "w") as jfile:
+            json.dump(
+                {
+                    "source": self.source,
+                    "ranges": [
+                        [start, end, checksum]
+                        for start, (end, checksum) in sorted(self.ranges.items())
+                    ],
+                },
+                jfile,
+            )
+        os.replace(tmp_fname, self.fname)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.fname)
+        except FileNotFoundError:
+            pass
+
+
+def _fetch_segment(
+    session: requests.Session,
+    url: str,
+    output_fname: str,
+    segment: Tuple[int, int],
+    on_chunk: Callable[[int], None],
+) -> str:
+    """
+    Download a byte range into its place in a preallocated file.
+    Retries resume from the last byte written.
+
+    :return: sha1 of range.
+    """
+    start, end = segment
+    pos = start
+    checksum = hashlib.sha1()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with session.get(
+                url,
+                headers={"Range": f"bytes={pos}-{end}"},
+                stream=True,
+                timeout=TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise PyTubeError(
+                        f"Server ignored range request for bytes {pos}-{end}. (status {response.status_code})"
+                    )
+                with open(output_fname, "r+b") as output_file:
+                    output_file.seek(pos)
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        output_file.write(chunk)
+                        checksum.update(chunk)
+                        pos += len(chunk)
+                        on_chunk(len(chunk))
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as e:
+            logger.warning(
+                f"Segment {start}-{end} interrupted at {pos} (attempt {attempt + 1}): {e}"
+            )
+            continue
+        if pos > end:
+            return checksum.hexdigest()
+        logger.warning(f"Segment {start}-{end} ended early at {pos}.")
+    raise PyTubeError(
+        f"Unable to download bytes {start}-{end} after {MAX_RETRIES + 1} attempts."
+    )
+
+
+def _fetch_whole(
+    session: requests.Session,
+    url: str,
+    output_fname: str,
+    on_chunk: Callable[[int], None],
+) -> None:
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        with open(output_fname, "wb") as output_file:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                output_file.write(chunk)
+                on_chunk(len(chunk))
+
+
+def is_complete(fname: str, filesize: Optional[int]) -> bool:
+    """
+    Check if a downloaded file exists and has its expected size.
+    :param fname: downloaded file.
+    :param filesize: expected size in bytes. Any size if None.
+
+    :return: True if complete.
+    """
+    try:
+        size = os.path.getsize(fname)
+    except OSError:
+        return False
+    return size == filesize if filesize is not None else size > 0
+
+
+def download(
+    url: str,
+    output_fname: str,
+    filesize: Optional[int] = None,
+    n_connections: int = 4,
+    segment_size: int = SEGMENT_SIZE,
+    session: Optional[requests.Session] = None,
+    on_chunk: Optional[Callable[[int], None]] = None,
+    itag: Optional[int] = None,
+) -> str:
+    """
+    Download a url to a file with ranged requests over several connections at once.
+    Written to a preallocated .part file with each range written at its offset as it arrives.
+    Completed ranges are recorded in a journal next to it so an interrupted download resumes where it stopped.
+    The .part file is renamed to the output file once complete.
+    Falls back to a single request without resuming if the server doesn't support ranges.
+    :param url: url
+    :param output_fname: output file.
+    :param filesize: size of content in bytes. Requested if None.
+    :param n_connections: max concurrent connections.
+    :param segment_size: max bytes per range request.
+    :param session: requests session. Built with n_connections pooled connections if None.
+    :param on_chunk: called with the number of bytes of each chunk written. Called from multiple threads.
+    :param itag: stream itag. Journals of other streams aren't resumed.
+
+    :return: output file path.
+    """
+    session = session or build_session(n_connections)
+    on_chunk = on_chunk or (lambda n_bytes: None)
+
+    supports_ranges = True
+    if filesize is None:
+        filesize, supports_ranges = content_length(session, url)
+
+    if filesize and is_complete(output_fname, filesize):
+        logger.info(f"Found complete download {output_fname}.")
+        on_chunk(filesize)
+        return output_fname
+
+    part_fname = f"{output_fname}{PART_EXT}"
+    if not supports_ranges or not filesize:
+        logger.info(f"Downloading {output_fname} with a single request.")
+        _fetch_whole(session, url, part_fname, on_chunk)
+        os.replace(part_fname, output_fname)
+        return output_fname
+
+    journal = DownloadJournal.load(
+        f"{output_fname}{JOURNAL_EXT}", part_fname, itag, filesize, segment_size
+    )
+    if journal.ranges and is_complete(part_fname, filesize):
+        logger.info(
+            f"Resuming {output_fname} from journal. ({journal.bytes_done}/{filesize} bytes)"
+        )
+        on_chunk(journal.bytes_done)
+    else:
+        journal.ranges.clear()
+        with open(part_fname, "wb") as part_file:
+            part_file.truncate(filesize)
+        journal.save()
+
+    byte_ranges = [
+        segment
+        for segment in segments(filesize, segment_size)
+        if segment[0] not in journal.ranges
+    ]
+    n_workers = max(1, min(n_connections, len(byte_ranges)))
+    logger.info(
+        f"Downloading {output_fname} ({filesize} bytes) in {len(byte_ranges)} ranges "
+        f"over {n_workers} connections."
+    )
+    # Stop remaining ranges once one fails.
+    failed = threading.Event()
+
+    def fetch(segment: Tuple[int, int]) -> None:
+        if failed.is_set():
+            return
+        try:
+            journal.add(
+                segment, _fetch_segment(session, url, part_fname, segment, on_chunk)
+            )
+        except BaseException:
+            failed.set()
+            raise
+
+    # Completed ranges are kept on failure to resume from.
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        for future in [executor.submit(fetch, segment) for segment in byte_ranges]:
+            future.result()
+
+    os.replace(part_fname, output_fname)
+    journal.remove()
+    return output_fname
@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import logging
+import pathlib
+from typing import Any, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Stages of a track. Slicing, fading and tagging are done by a single ffmpeg pass.
+RENDERING = "rendering"
+RENDERED = "rendered"
+# Marks temporary outputs. ex. title.part.mp3
+PART_SUFFIX = ".part"
+
+
+def track_key(*parts: Any) -> str:
+    """
+    Stable key of a track from everything that determines its output.
+    Unlike hash(), the same in every process and run.
+    """
+    key_json = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(key_json.encode("utf-8")).hexdigest()[:16]
+
+
+def part_path(output: pathlib.Path) -> pathlib.Path:
+    """
+    Temporary path of an output while it's written. Extension is kept so ffmpeg can infer the format.
+    ex. title.mp3 -> title.part.mp3
+    """
+    return output.with_name(f"{output.stem}{PART_SUFFIX}{output.suffix}")
+
+
+def file_checksum(path: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        while block := file.read(1024**2):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class TrackJournal:
+    """
+    Journal of the tracks of a video stored in its title folder.
+    Records the stage reached by each track and the size and checksum of its output
+    so an interrupted run only renders unfinished tracks.
+    Only the parent process writes to it.
+    """
+
+    FNAME = ".ytcompdl_journal.json"
+
+    def __init__(self, title_folder: pathlib.Path) -> None:
+        self.folder = pathlib.Path(title_folder)
+        self.path = self.folder.joinpath(self.FNAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.path, "r") as jfile:
+                self.entries = json.load(jfile)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            logger.warning(
+                f"Invalid track journal at {self.path}. Starting new journal."
+            )
+
+    def is_done(self, key: str, output: pathlib.Path) -> bool:
+        """
+        Check if a track was rendered and its output is unchanged.
+        """
+        entry = self.entries.get(key, {})
+        if entry.get("stage") != RENDERED or entry.get("output") != output.name:
+            return False
+        try:
+            return output.stat().st_size == entry.get("size")
+        except OSError:
+            return False
+
+    def start(self, tracks: Dict[str, pathlib.Path]) -> None:
+        """
+        Record tracks about to be rendered and save journal.
+        :param tracks: output of each track keyed by track key.
+        """
+        for key, output in tracks.items():
+            self.entries[key] = {"stage": RENDERING, "output": output.name}
+        self.save()
+
+    def done(self, key: str, output: pathlib.Path, checksum: str) -> None:
+        """
+        Record a rendered track and save journal.
+        """
+        self.entries[key] = {
+            "stage": RENDERED,
+            "output": output.name,
+            "size": output.stat().st_size,
+            "sha1": checksum,
+        }
+        self.save()
+
+    def prune(self, keys: Iterable[str]) -> None:
+        """
+        Remove entries of tracks no longer part of the video. ex. different timestamps or fade.
+        """
+        keys = set(keys)
+        self.entries = {
+            key: entry for key, entry in self.entries.items() if key in keys
+        }
+
+    def remove_orphans(self) -> None:
+        """
+        Remove temporary outputs left by an interrupted run.
+        """
+        for orphan in self.folder.glob(f"*{PART_SUFFIX}.*"):
+            logger.info(f"Removing unfinished output {orphan}.")
+            try:
+                os.remove(orphan)
+            except OSError as e:
+                logger.error(f"Unable to remove file due to: {e}")
+
+    def save(self) -> None:
+        # Write to temp file first so an interrupted run never leaves a partial journal.
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as jfile:
+            json.dump(self.entries, jfile, indent=2)
+        os.replace(tmp_path, self.path)
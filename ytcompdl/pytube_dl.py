@@ -1,11 +1,21 @@
+import os
 import logging
+import contextlib
 import pathlib
+import itertools
+import threading
 import pytube
-from typing import Dict
-from pytube.cli import on_progress
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.error import HTTPError
+from pytube.cli import on_progress, display_progress_bar
 
-from .ffmpeg_utils import merge_codecs, convert_audio
+from . import http_dl
+from .ffmpeg_utils import merge_codecs, convert_audio_chunked, convert_audio_stream
 from .errors import PyTubeError
+from .source_store import SourceStore
+from .tracing import span, file_size
 
 logger = logging.getLogger(__name__)
 
@@ -22,10 +32,26 @@ class Pytube_Dl:
         "144p",
     )
 
-    def __init__(self, url: str, res: str = "720p") -> None:
+    def __init__(
+        self,
+        url: str,
+        res: str = "720p",
+        stream: bool = False,
+        n_chunks: int = 1,
+        n_connections: int = 4,
+        source_store: Optional[SourceStore] = None,
+    ) -> None:
 
         self.url = url
         self.res = res
+        # Pipe audio into ffmpeg while downloading.
+        self.stream = stream
+        # Chunks of downloaded audio converted in parallel.
+        self.n_chunks = n_chunks
+        # Connections used to download each stream.
+        self.n_connections = n_connections
+        # Downloaded streams shared with other outputs.
+        self.source_store = source_store
 
         self.adap_streams: bool = False
         self.output_files: Dict[str, str] = {}
@@ -41,8 +67,27 @@ class Pytube_Dl:
 
         filename = pathlib.Path(output).name
 
-        output_type = "audio" if output.endswith(".mp3") else "video"
+        output_type = "audio" if output.endswith((".mp3", ".m4a")) else "video"
 
+        # Audio stream is aac in mp4. Keep it as is if output is m4a.
+        if output.endswith(".m4a"):
+            audio_stream = next(self.streams(output_type))
+            print(f'Downloading audio of "{self.url}" as "{filename}".')
+            logger.info(f"Downloading {audio_stream.title} as {filename}.")
+            self.download_streams({"audio": (audio_stream, output)})
+            return output
+
+        if output_type == "audio" and self.stream:
+            audio_stream = next(self.streams(output_type))
+            print(f'Streaming audio of "{self.url}" into "{filename}".')
+            logger.info(f"Streaming {audio_stream.title} into {output}.")
+            with span("pytube.download", stream="audio") as attrs:
+                with self.partial_output(output) as part_output:
+                    convert_audio_stream(self.stream_chunks(audio_stream), part_output)
+                attrs["bytes_out"] = file_size(output)
+            return output
+
+        downloads = {}
         for stream in self.streams(output_type):
             if output_type == "video" and self.adap_streams:
                 # Add output type to prevent overwriting files when downloading video
@@ -53,33 +98,176 @@ class Pytube_Dl:
                     f"Downloading {categ} stream of {stream.title} "
                     f"as {categ}_{stream.default_filename}."
                 )
-                self.output_files[categ] = stream.download(
-                    output_path=output_dir,
-                    filename=filename,
-                    filename_prefix=f"{categ}_",
-                )
+                downloads[categ] = (stream, str(output_dir / f"{categ}_{filename}"))
             else:
                 print(f'Downloading audio of "{self.url}" as "audio_{filename}".')
                 logger.info(f"Downloading {stream.title} as {stream.default_filename}.")
-                self.output_files["audio"] = stream.download(
-                    output_path=output_dir, filename=filename, filename_prefix="audio_"
-                )
+                downloads["audio"] = (stream, str(output_dir / f"audio_{filename}"))
+
+        # Adaptive audio and video streams are downloaded at the same time.
+        self.output_files.update(self.download_streams(downloads))
 
         if len(self.output_files) == 0:
             raise PyTubeError("No streams downloaded.")
 
         # Video: Merge codecs if source streams were adaptive. Otherwise, do nothing.
-        # Audio: Convert to single audio stream mp3.
+        # Audio: Convert to single audio stream mp3. In parallel chunks if more than one.
         if output_type == "video" and self.adap_streams:
             logger.debug("Merging audio and video codecs.")
 
-            merge_codecs(self.output_files["audio"], self.output_files["video"], output)
+            with self.partial_output(output) as part_output:
+                merge_codecs(
+                    self.output_files["audio"], self.output_files["video"], part_output
+                )
 
         elif output_type == "audio":
-            convert_audio(self.output_files["audio"], output)
+            with self.partial_output(output) as part_output:
+                convert_audio_chunked(
+                    self.output_files["audio"], part_output, self.n_chunks
+                )
 
         return output
 
+    def is_downloaded(self, output: str) -> bool:
+        """
+        Check if output of pytube_dl is complete.
+        Downloaded streams must have the stream's size. Outputs of ffmpeg are only renamed into place once complete.
+        :param output: output path.
+
+        :return: True if complete.
+        """
+        if output.endswith(".m4a"):
+            return http_dl.is_complete(output, next(self.streams("audio")).filesize)
+        return http_dl.is_complete(output, None)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def partial_output(output: str) -> Iterator[str]:
+        """
+        Write an output under a temporary name and rename it to output once written.
+        The temporary output is removed instead if writing it fails.
+        Extension is kept so ffmpeg can infer the output format. ex. title.mp3 -> title.part.mp3
+        :param output: output path.
+
+        :return: temporary output path.
+        """
+        output_path = pathlib.Path(output)
+        part_output = str(
+            output_path.with_name(f"{output_path.stem}.part{output_path.suffix}")
+        )
+        # Left by an interrupted run. ffmpeg won't overwrite it.
+        if os.path.exists(part_output):
+            os.remove(part_output)
+        try:
+            yield part_output
+        except BaseException:
+            # A partial output must never be renamed into place.
+            if os.path.exists(part_output):
+                os.remove(part_output)
+            raise
+        if not os.path.exists(part_output):
+            raise PyTubeError(f"Unable to create {output}.")
+        os.replace(part_output, output)
+
+    def download_streams(
+        self, downloads: Dict[str, Tuple[pytube.Stream, str]]
+    ) -> Dict[str, str]:
+        """
+        Download streams concurrently. Each is fetched as ranges over n_connections connections.
+        Streams in the source store are linked instead of downloaded and downloaded streams are added to it.
+        Progress of all streams is shown as one progress bar.
+        :param downloads: stream and output path keyed by category (audio or video).
+
+        :return: output paths keyed by category.
+        """
+        if not downloads:
+            return {}
+
+        total_size = sum(stream.filesize for stream, _ in downloads.values())
+        session = http_dl.build_session(self.n_connections * len(downloads))
+        lock = threading.Lock()
+        bytes_received = 0
+
+        def show_progress(n_bytes: int) -> None:
+            nonlocal bytes_received
+            with lock:
+                bytes_received += n_bytes
+                display_progress_bar(bytes_received, total_size)
+
+        def download(categ: str, stream: pytube.Stream, output_fname: str) -> str:
+            with span(
+                "pytube.download", stream=categ, connections=self.n_connections
+            ) as attrs:
+                store_key = None
+                if self.source_store is not None:
+                    store_key = SourceStore.stream_key(
+                        self.pt.video_id, stream.itag, stream.filesize
+                    )
+                    if self.source_store.get(store_key, output_fname):
+                        attrs["stored"] = True
+                        show_progress(stream.filesize)
+                        return output_fname
+                try:
+                    http_dl.download(
+                        stream.url,
+                        output_fname,
+                        filesize=stream.filesize,
+                        n_connections=self.n_connections,
+                        session=session,
+                        on_chunk=show_progress,
+                        itag=stream.itag,
+                    )
+                except requests.HTTPError as e:
+                    if e.response is None or e.response.status_code != 404:
+                        raise PyTubeError(f"Unable to download {categ} stream: {e}")
+                    # Some adaptive streams need to be requested with sequence numbers. Let pytube handle them.
+                    logger.info(f"Ranged download of {categ} stream not found: {e}")
+                    stream.download(
+                        output_path=os.path.dirname(output_fname),
+                        filename=os.path.basename(output_fname),
+                    )
+                except requests.RequestException as e:
+                    raise PyTubeError(f"Unable to download {categ} stream: {e}")
+                attrs["bytes_in"] = file_size(output_fname)
+                if store_key is not None:
+                    self.source_store.put(store_key, output_fname)
+            return output_fname
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+                futures = {
+                    categ: executor.submit(download, categ, stream, output_fname)
+                    for categ, (stream, output_fname) in downloads.items()
+                }
+                return {categ: future.result() for categ, future in futures.items()}
+        finally:
+            session.close()
+            print()
+
+    @staticmethod
+    def stream_chunks(stream: pytube.Stream) -> Iterator[bytes]:
+        """
+        Download a stream in chunks instead of to a file. Same requests as pytube.Stream.download.
+        :param stream: pytube stream.
+
+        :return: Generator of chunks.
+        """
+        bytes_remaining = stream.filesize
+        try:
+            chunks = pytube.request.stream(stream.url)
+            first_chunk = next(chunks, b"")
+        except HTTPError as e:
+            if e.code != 404:
+                raise
+            # Some adaptive streams need to be requested with sequence numbers
+            chunks = pytube.request.seq_stream(stream.url)
+            first_chunk = next(chunks, b"")
+
+        for chunk in itertools.chain([first_chunk], chunks):
+            bytes_remaining -= len(chunk)
+            on_progress(stream, chunk, bytes_remaining)
+            yield chunk
+
     def list_available_resolutions(self):
         resolutions = {
             stream.resolution for stream in self.pt.streams.filter(type="video")
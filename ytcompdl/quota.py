@@ -0,0 +1,132 @@
+import json
+import logging
+import threading
+import contextlib
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class APICall:
+    method: str
+    video_id: Optional[str]
+    cost: int
+    latency: float
+    size: int
+    cached: bool
+
+
+class QuotaTracker:
+    """
+    Account YouTube Data API quota used by requests.
+    Records unit cost, latency and response size of each call per video and per run.
+    """
+
+    # https://developers.google.com/youtube/v3/determine_quota_cost
+    UNIT_COSTS = {
+        "youtube.videos.list": 1,
+        "youtube.commentThreads.list": 1,
+        "youtube.playlistItems.list": 1,
+    }
+    DEFAULT_UNIT_COST = 1
+
+    def __init__(self, budget: Optional[int] = None) -> None:
+        """
+        :param budget: Max units to use in run. No limit if None.
+        """
+        self.budget = budget
+        self.calls: List[APICall] = []
+        self.used = 0
+        self.video_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def cost(self, request) -> int:
+        """
+        Unit cost of a request.
+        """
+        return self.UNIT_COSTS.get(request.methodId, self.DEFAULT_UNIT_COST)
+
+    def can_afford(self, request) -> bool:
+        """
+        Check if a request can be made without exceeding budget.
+        """
+        return self.budget is None or self.used + self.cost(request) <= self.budget
+
+    @contextlib.contextmanager
+    def for_video(self, video_id: str) -> Iterator[None]:
+        """
+        Attribute calls within context to a video.
+        """
+        prev_video_id, self.video_id = self.video_id, video_id
+        try:
+            yield
+        finally:
+            self.video_id = prev_video_id
+
+    def record(
+        self, request, latency: float, size: int, cached: bool = False
+    ) -> APICall:
+        """
+        Record a call. Responses served from the cache cost no units.
+        """
+        call = APICall(
+            method=request.methodId,
+            video_id=self.video_id,
+            cost=0 if cached else self.cost(request),
+            latency=latency,
+            size=size,
+            cached=cached,
+        )
+        with self._lock:
+            self.calls.append(call)
+            self.used += call.cost
+        return call
+
+    @staticmethod
+    def totals(calls: List[APICall]) -> Dict:
+        by_method: Dict[str, int] = {}
+        for call in calls:
+            by_method[call.method] = by_method.get(call.method, 0) + call.cost
+        return {
+            "calls": len(calls),
+            "cached_calls": sum(call.cached for call in calls),
+            "units": sum(call.cost for call in calls),
+            "latency": round(sum(call.latency for call in calls), 4),
+            "bytes": sum(call.size for call in calls),
+            "units_by_method": by_method,
+        }
+
+    def stats(self) -> Dict:
+        """
+        Totals per run and per video.
+        """
+        videos: Dict[str, List[APICall]] = {}
+        for call in self.calls:
+            videos.setdefault(call.video_id or "", []).append(call)
+        return {
+            "budget": self.budget,
+            "run": self.totals(self.calls),
+            "videos": {
+                video_id: self.totals(calls) for video_id, calls in videos.items()
+            },
+            "calls": [asdict(call) for call in self.calls],
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Write stats to a json file.
+        """
+        with open(path, "w") as jfile:
+            json.dump(self.stats(), jfile, indent=2)
+        logger.info(f"API usage stats saved to {path}.")
+
+    def summary(self) -> str:
+        run = self.totals(self.calls)
+        budget = f"/{self.budget}" if self.budget is not None else ""
+        return (
+            f"API usage: {run['calls']} calls ({run['cached_calls']} cached), "
+            f"{run['units']}{budget} units, {run['bytes'] / 1024:.1f} KiB "
+            f"in {run['latency']:.2f}s."
+        )
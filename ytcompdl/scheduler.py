@@ -0,0 +1,63 @@
+import logging
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Stream copy. I/O bound and barely uses the CPU.
+COPY = "copy"
+# mp3 encode. libmp3lame is single-threaded.
+AUDIO = "audio"
+# h264 encode. libx264 scales with threads.
+VIDEO = "video"
+
+
+@dataclass(frozen=True)
+class Schedule:
+    """
+    Number of concurrent ffmpeg jobs and threads given to each.
+    """
+
+    kind: str
+    n_workers: int
+    threads: int
+    filter_threads: int
+
+
+def job_kind(output_type: str, stream_copy: bool) -> str:
+    """
+    Kind of ffmpeg job used to render tracks.
+    :param output_type: audio or video
+    :param stream_copy: tracks are cut without encoding.
+    :return: job kind (string)
+    """
+    if stream_copy:
+        return COPY
+    return AUDIO if output_type == "audio" else VIDEO
+
+
+def plan(kind: str, n_jobs: int, cpu_budget: int) -> Schedule:
+    """
+    Split a CPU budget between concurrent ffmpeg jobs and threads per job.
+    Without limits, every ffmpeg job starts threads for every core so n workers oversubscribe the CPU n times.
+    * copy: one thread each. As many workers as jobs within budget.
+    * audio: one thread each as the encoder is single-threaded. Remaining budget is left idle.
+    * video: as many workers as jobs within budget. Leftover cores go to threads of each job.
+    :param kind: job kind. copy, audio or video
+    :param n_jobs: number of jobs to run.
+    :param cpu_budget: number of cores to use.
+    :return: schedule
+    """
+    cpu_budget = max(1, cpu_budget)
+    n_workers = max(1, min(n_jobs, cpu_budget))
+    if kind == VIDEO:
+        threads = max(1, cpu_budget // n_workers)
+        # Fade filters are cheap compared to the encoder.
+        filter_threads = max(1, threads // 2)
+    else:
+        threads = filter_threads = 1
+
+    schedule = Schedule(kind, n_workers, threads, filter_threads)
+    logger.debug(
+        f"Scheduled {n_jobs} {kind} jobs within {cpu_budget} cores: {schedule}"
+    )
+    return schedule
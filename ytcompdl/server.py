@@ -0,0 +1,476 @@
+import re
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+import collections
+import dataclasses
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .batch import BatchContext, build_context, expand_urls, process_video
+from .yt_api import video_id
+from .errors import QuotaExceededError, JobCancelledError
+from . import tracing
+from .tracing import Span
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+CANCELLING = "cancelling"
+CANCELLED = "cancelled"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (CANCELLED, DONE, FAILED)
+
+# Options that can be set per job. Everything else is fixed when the server starts.
+# comment isn't one as it prompts on the server's stdin and would block the dispatcher.
+JOB_OPTIONS = {
+    "output_type": str,
+    "regex_cfg": str,
+    "resolution": str,
+    "metadata": str,
+    "timestamps": bool,
+    "slice": bool,
+    "fade": str,
+    "fade_time": float,
+    "rm_src": bool,
+    "single_decode": bool,
+    "keyframe_tolerance": float,
+    "good_enough": float,
+    "stream": bool,
+    "chunked": bool,
+    "connections": int,
+    "track_timeout": float,
+}
+# Options that can also be null.
+OPTIONAL_JOB_OPTIONS = ("metadata", "track_timeout")
+# Finished jobs kept for status requests.
+MAX_FINISHED_JOBS = 1000
+# Seconds between keep-alive comments on idle event streams.
+KEEPALIVE_INTERVAL = 15
+DEFAULT_RETRY_AFTER = 5
+
+
+class JobError(Exception):
+    """
+    Invalid request to the job API. Returned to the client with its HTTP status.
+    """
+
+    def __init__(self, status: int, msg: str):
+        self.status = status
+        self.msg = msg
+        super().__init__(msg)
+
+
+@dataclasses.dataclass
+class Job:
+    id: str
+    url: str
+    options: Dict[str, Any]
+    status: str = QUEUED
+    submitted_at: float = dataclasses.field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    results: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+    # Progress events in order. Streamed to clients.
+    events: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+    # Set to stop a running job. Checked between videos, stages and tracks.
+    cancel_event: threading.Event = dataclasses.field(default_factory=threading.Event)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "options": self.options,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "results": self.results,
+        }
+
+
+def parse_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate per-job options.
+    :param options: options of job request.
+
+    :return: options with ints given for floats converted.
+    """
+    parsed = {}
+    for name, value in options.items():
+        if (opt_type := JOB_OPTIONS.get(name)) is None:
+            raise JobError(400, f"Unknown or server-wide option: {name}")
+        # bool is a subclass of int.
+        if opt_type is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if type(value) is not opt_type and not (
+            value is None and name in OPTIONAL_JOB_OPTIONS
+        ):
+            raise JobError(400, f"Option {name} must be {opt_type.__name__}.")
+        parsed[name] = value
+    return parsed
+
+
+class JobManager:
+    """
+    Bounded queue of jobs run one at a time by a dispatcher thread.
+    Jobs share one warm batch context: API client, response cache, quota and source store.
+    """
+
+    def __init__(self, ctx: BatchContext, max_queued: int) -> None:
+        self.ctx = ctx
+        self.max_queued = max_queued
+        self.jobs: Dict[str, Job] = {}
+        self.running: Optional[Job] = None
+        self._queue: Deque[Job] = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        # Durations of recent jobs to estimate when to retry a rejected submit.
+        self._durations: Deque[float] = collections.deque(maxlen=20)
+        tracing.tracer.listeners.append(self._on_spans)
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="ytcompdl-dispatcher", daemon=True
+        )
+
+    def start(self) -> None:
+        self._dispatcher.start()
+
+    def stop(self) -> None:
+        """
+        Stop dispatching after the running job. Queued jobs are cancelled.
+        """
+        with self._cond:
+            self._stopped = True
+            while self._queue:
+                self._set_status(self._queue.popleft(), CANCELLED)
+            self._cond.notify_all()
+
+    def submit(self, url: str, options: Dict[str, Any]) -> Job:
+        """
+        Queue a job.
+        :param url: Youtube video or playlist url.
+        :param options: per-job options.
+
+        :return: queued job.
+        """
+        options = parse_options(options)
+        with self._cond:
+            if self._stopped:
+                raise JobError(503, "Server is shutting down.")
+            if len(self._queue) >= self.max_queued:
+                raise JobError(429, f"Queue is full ({self.max_queued} jobs).")
+            job = Job(id=uuid.uuid4().hex[:12], url=url, options=options)
+            self.jobs[job.id] = job
+            self._queue.append(job)
+            self._add_event(job, "status", {"status": job.status})
+            self._cond.notify_all()
+        logger.info(f"Queued job {job.id} for {url}.")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._cond:
+            if (job := self.jobs.get(job_id)) is None:
+                raise JobError(404, f"No job {job_id}.")
+            return job
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [job.summary() for job in self.jobs.values()]
+
+    def cancel(self, job_id: str) -> Job:
+        """
+        Cancel a job. Queued jobs are removed from the queue.
+        Running jobs stop after their current stage or track and their ffmpeg processes are killed.
+        Tracks already rendered are kept in their journals.
+        """
+        with self._cond:
+            job = self.get(job_id)
+            if job.status in FINISHED:
+                raise JobError(409, f"Job {job_id} already {job.status}.")
+            if job.status == QUEUED:
+                self._queue.remove(job)
+                job.finished_at = time.time()
+                self._set_status(job, CANCELLED)
+                self._prune()
+            elif job.status == RUNNING:
+                job.cancel_event.set()
+                self._set_status(job, CANCELLING)
+        logger.info(f"Cancelling job {job_id}.")
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "max_queued": self.max_queued,
+                "running": self.running.id if self.running else None,
+                "quota": self.ctx.quota.summary(),
+                "source_store": (
+                    self.ctx.source_store.summary() if self.ctx.source_store else None
+                ),
+            }
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a slot in the queue is likely free.
+        """
+        if not self._durations:
+            return DEFAULT_RETRY_AFTER
+        return max(1, math.ceil(sum(self._durations) / len(self._durations)))
+
+    def wait_events(
+        self, job: Job, n_seen: int, timeout: float
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Wait for events of a job after the first n_seen.
+        :return: new events and if the job is finished.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: len(job.events) > n_seen or job.status in FINISHED, timeout
+            )
+            return job.events[n_seen:], job.status in FINISHED
+
+    def _add_event(self, job: Job, event: str, data: Dict[str, Any]) -> None:
+        job.events.append({"event": event, "time": time.time(), **data})
+        self._cond.notify_all()
+
+    def _set_status(self, job: Job, status: str) -> None:
+        job.status = status
+        self._add_event(job, "status", {"status": status})
+
+    def _on_spans(self, spans: List[Span]) -> None:
+        with self._cond:
+            if (job := self.running) is None:
+                return
+            for span in spans:
+                self._add_event(
+                    job,
+                    "span",
+                    {
+                        "name": span.name,
+                        "category": span.category,
+                        "duration": span.duration,
+                        "attrs": span.attrs,
+                    },
+                )
+
+    def _prune(self) -> None:
+        finished = [job for job in self.jobs.values() if job.status in FINISHED]
+        for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stopped)
+                if self._stopped:
+                    return
+                job = self._queue.popleft()
+                job.started_at = time.time()
+                self.running = job
+                self._set_status(job, RUNNING)
+
+            status, error = self._run(job)
+
+            with self._cond:
+                self.running = None
+                job.finished_at = time.time()
+                job.error = error
+                if job.status == CANCELLING:
+                    status = CANCELLED
+                self._set_status(job, status)
+                self._durations.append(job.finished_at - job.started_at)
+                self._prune()
+            logger.info(f"Job {job.id} {status}.")
+            self._save_stats()
+
+    def _run(self, job: Job) -> Tuple[str, Optional[str]]:
+        """
+        Process each video of a job.
+        :return: final status and error.
+        """
+        ctx = dataclasses.replace(self.ctx, args={**self.ctx.args, **job.options})
+        try:
+            for url in expand_urls(ctx.yt_client, [job.url], ctx.api_cache, ctx.quota):
+                if job.cancel_event.is_set():
+                    break
+                result = dataclasses.asdict(
+                    process_video(ctx, url, video_id(url), None, job.cancel_event)
+                )
+                with self._cond:
+                    job.results.append(result)
+                    self._add_event(job, "video", result)
+        except JobCancelledError:
+            return CANCELLED, None
+        except QuotaExceededError:
+            return FAILED, "Quota budget reached."
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed.")
+            return FAILED, f"{e.__class__.__name__}: {e}"
+        if all(res["status"] in (DONE, "skipped") for res in job.results):
+            return DONE, None
+        return FAILED, None
+
+    def _save_stats(self) -> None:
+        args = self.ctx.args
+        if args["quota_stats"]:
+            self.ctx.quota.save(args["quota_stats"])
+        # Spans of the last job only so memory doesn't grow with each job.
+        tracing.save(args["trace"], args["metrics"])
+        tracing.tracer.reset()
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of a job manager.
+    * POST /jobs {"url": ..., "options": {...}} -> 202 job. 429 with Retry-After if the queue is full.
+    * GET /jobs -> all jobs.
+    * GET /jobs/<id> -> job.
+    * DELETE /jobs/<id> -> cancelled job.
+    * GET /jobs/<id>/events -> progress as server-sent events until the job finishes.
+    * GET /health -> queue stats.
+    """
+
+    JOB_PATH = re.compile(r"^/jobs/(?P<job_id>[0-9a-f]+)(?P<events>/events)?/?$")
+    MAX_BODY_SIZE = 64 * 1024
+    manager: JobManager
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info(f"{self.address_string()} {format % args}")
+
+    def do_GET(self) -> None:
+        self._handle(self._get)
+
+    def do_POST(self) -> None:
+        self._handle(self._post)
+
+    def do_DELETE(self) -> None:
+        self._handle(self._delete)
+
+    def _handle(self, method) -> None:
+        try:
+            method()
+        except JobError as e:
+            headers = {}
+            if e.status == 429:
+                headers["Retry-After"] = str(self.manager.retry_after())
+            self._send_json(e.status, {"error": e.msg}, headers)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away. ex. closed event stream.
+            pass
+
+    def _get(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/health":
+            self._send_json(200, self.manager.stats())
+        elif path.rstrip("/") == "/jobs":
+            self._send_json(200, {"jobs": self.manager.list_jobs()})
+        elif match := self.JOB_PATH.match(path):
+            job = self.manager.get(match.group("job_id"))
+            if match.group("events"):
+                self._stream_events(job)
+            else:
+                self._send_json(200, job.summary())
+        else:
+            raise JobError(404, f"No such path {path}.")
+
+    def _post(self) -> None:
+        if self.path.split("?", 1)[0].rstrip("/") != "/jobs":
+            raise JobError(404, f"No such path {self.path}.")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.MAX_BODY_SIZE:
+            raise JobError(413, "Request body too large.")
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise JobError(400, "Request body isn't valid json.")
+        if not isinstance(request, dict) or not isinstance(request.get("url"), str):
+            raise JobError(400, "Request must have a url.")
+        options = request.get("options", {})
+        if not isinstance(options, dict):
+            raise JobError(400, "Options must be an object.")
+        job = self.manager.submit(request["url"], options)
+        self._send_json(202, job.summary(), {"Location": f"/jobs/{job.id}"})
+
+    def _delete(self) -> None:
+        if not (match := self.JOB_PATH.match(self.path)) or match.group("events"):
+            raise JobError(404, f"No such path {self.path}.")
+        job = self.manager.cancel(match.group("job_id"))
+        self._send_json(200, job.summary())
+
+    def _send_json(
+        self, status: int, body: Any, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_events(self, job: Job) -> None:
+        """
+        Send events of a job as they happen. Earlier events are sent first. Closed once the job is finished.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True
+        n_seen = 0
+        while True:
+            events, finished = self.manager.wait_events(job, n_seen, KEEPALIVE_INTERVAL)
+            for event in events:
+                self.wfile.write(
+                    f"event: {event['event']}\n"
+                    f"data: {json.dumps(event, default=str)}\n\n".encode("utf-8")
+                )
+            if not events:
+                self.wfile.write(b": keepalive\n\n")
+            self.wfile.flush()
+            n_seen += len(events)
+            if finished and n_seen == len(job.events):
+                return
+
+
+def serve(
+    args: Dict, host: str = "127.0.0.1", port: int = 8765, max_queued: int = 100
+) -> int:
+    """
+    Run jobs submitted over HTTP with one warm API client and caches until interrupted.
+    :param args: CLI args in YTCompDL positional order. Defaults of each job.
+    :param host: address to listen on. Jobs are unauthenticated so only bind to trusted interfaces.
+    :param port: port to listen on.
+    :param max_queued: max jobs waiting to run. Further submits are rejected until a job starts.
+
+    :return: 0 once stopped.
+    """
+    ctx = build_context(args)
+    manager = JobManager(ctx, max_queued)
+    handler = type("BoundJobRequestHandler", (JobRequestHandler,), {"manager": manager})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    manager.start()
+    logger.info(f"Serving jobs on http://{host}:{server.server_address[1]}.")
+    print(f"Serving jobs on http://{host}:{server.server_address[1]}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+        server.server_close()
+        if ctx.source_store is not None:
+            print(ctx.source_store.summary())
+            ctx.source_store.close()
+    return 0
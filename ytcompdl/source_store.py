@@ -0,0 +1,195 @@
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import pathlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def clone_file(src: str, dest: str) -> None:
+    """
+    Hardlink src to dest. Copies if a hardlink isn't possible. ex. dest is on another filesystem.
+    Copies use copy_file_range where available so filesystems supporting reflinks (btrfs, xfs) share extents.
+    :param src: source file.
+    :param dest: destination file. Replaced if it exists.
+    """
+    tmp_dest = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.link(src, tmp_dest)
+        except OSError:
+            with open(src, "rb") as src_file, open(tmp_dest, "wb") as dest_file:
+                _copy_contents(src_file, dest_file)
+        os.replace(tmp_dest, dest)
+    except BaseException:
+        try:
+            os.remove(tmp_dest)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _copy_contents(src_file, dest_file) -> None:
+    if hasattr(os, "copy_file_range"):
+        try:
+            while os.copy_file_range(src_file.fileno(), dest_file.fileno(), 1024**3):
+                pass
+            return
+        except OSError:
+            # Not supported between these filesystems.
+            src_file.seek(0)
+            dest_file.seek(0)
+            dest_file.truncate()
+    shutil.copyfileobj(src_file, dest_file)
+
+
+class SourceStore:
+    """
+    Store of downloaded source streams shared by all output directories and output types.
+    * Streams are keyed by content (video id, itag and size) instead of title so each is downloaded once.
+    * Outputs get hardlinks to stored streams so no space is used twice.
+    * Least recently used streams are evicted once the store is larger than max_bytes.
+    Safe to share between threads and processes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS streams (
+            key TEXT PRIMARY KEY,
+            fname TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            added_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+    """
+    INDEX_FNAME = "index.sqlite"
+
+    def __init__(self, root: str, max_bytes: int = 10 * 1024**3):
+        """
+        :param root: store directory.
+        :param max_bytes: Max total size of stored streams.
+        """
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        self._lock = threading.Lock()
+        # Wait on other processes' write locks instead of failing.
+        self._conn = sqlite3.connect(
+            self.root.joinpath(self.INDEX_FNAME), timeout=30, check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(self.SCHEMA)
+
+    @staticmethod
+    def stream_key(video_id: str, itag: int, size: int) -> str:
+        """
+        Key of a stream. Size changes if YouTube re-encodes a stream under the same itag.
+        """
+        return f"{video_id}_{itag}_{size}"
+
+    def get(self, key: str, dest: str) -> bool:
+        """
+        Link a stored stream to dest.
+        :param key: stream key.
+        :param dest: destination file.
+        :return: True if stream was stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fname, size FROM streams WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is not None:
+            fname, size = row
+            src = str(self.root.joinpath(fname))
+            try:
+                if os.path.getsize(src) == size:
+                    clone_file(src, dest)
+                    with self._lock, self._conn:
+                        self._conn.execute(
+                            "UPDATE streams SET accessed_at = ? WHERE key = ?",
+                            (time.time(), key),
+                        )
+                    self.hits += 1
+                    self.bytes_saved += size
+                    logger.info(f"Linked stored stream {key} to {dest}.")
+                    return True
+            except OSError as e:
+                logger.warning(f"Unable to use stored stream {key}: {e}")
+            # Removed or truncated outside of the store.
+            self._remove([(key, fname)])
+
+        self.misses += 1
+        return False
+
+    def put(self, key: str, src: str) -> None:
+        """
+        Store a downloaded stream by linking it into the store.
+        :param key: stream key.
+        :param src: downloaded stream file.
+        """
+        fname = f"{key}{pathlib.Path(src).suffix}"
+        size = os.path.getsize(src)
+        if size > self.max_bytes:
+            logger.info(f"Stream {key} ({size} bytes) larger than store. Not stored.")
+            return
+        try:
+            clone_file(src, str(self.root.joinpath(fname)))
+        except OSError as e:
+            logger.warning(f"Unable to store stream {key}: {e}")
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO streams VALUES (?, ?, ?, ?, ?)",
+                (key, fname, size, now, now),
+            )
+        logger.info(f"Stored stream {key} ({size} bytes).")
+        self._evict()
+
+    def _evict(self) -> None:
+        """
+        Remove least recently used streams until store is within max_bytes.
+        """
+        total_size = 0
+        evicted = []
+        with self._lock:
+            for key, fname, size in self._conn.execute(
+                "SELECT key, fname, size FROM streams ORDER BY accessed_at DESC"
+            ):
+                total_size += size
+                if total_size > self.max_bytes:
+                    evicted.append((key, fname))
+        if evicted:
+            self._remove(evicted)
+            logger.info(f"Evicted {len(evicted)} stored streams.")
+
+    def _remove(self, entries) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM streams WHERE key = ?", [(key,) for key, _ in entries]
+            )
+        # Outputs linked to a removed stream keep their copy.
+        for _, fname in entries:
+            try:
+                os.remove(self.root.joinpath(fname))
+            except FileNotFoundError:
+                pass
+
+    def summary(self) -> str:
+        return (
+            f"Source store: {self.hits} hits, {self.misses} misses, "
+            f"{self.bytes_saved / 1024**2:.1f} MB not downloaded."
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
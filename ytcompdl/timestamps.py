@@ -0,0 +1,129 @@
+import re
+import itertools
+from typing import Optional, Tuple
+
+MS_PER_SECOND = 1000
+# Max number of colon-separated fields. (H:MM:SS)
+MAX_TIME_FIELDS = 3
+# Default percent similarity (0-1) at which a comment is used without checking further comments.
+GOOD_ENOUGH_SIMILARITY = 0.98
+
+
+def parse_timestamp_ms(str_time: str) -> int:
+    """
+    Parse a H:MM:SS, MM:SS or M:SS time string into milliseconds.
+    The leading field is unbounded so hours above 23 (or minutes above 59 in MM:SS) are allowed.
+    :param str_time: time-like string.
+    :return: time in milliseconds (int)
+    """
+    total = 0
+    field = 0
+    n_fields = 1
+    n_digits = 0
+    for char in str_time:
+        if char == ":":
+            # Minutes and seconds fields must be within 0-59.
+            if n_digits == 0 or (n_fields > 1 and field > 59):
+                break
+            total = total * 60 + field
+            field = 0
+            n_digits = 0
+            n_fields += 1
+        elif "0" <= char <= "9":
+            field = field * 10 + ord(char) - 48
+            n_digits += 1
+        else:
+            break
+    else:
+        if n_digits and n_fields <= MAX_TIME_FIELDS and (n_fields == 1 or field < 60):
+            return (total * 60 + field) * MS_PER_SECOND
+
+    raise ValueError(f"Invalid timestamp: {str_time!r}")
+
+
+# config_regex.yaml timestamp shapes the tokenizer reproduces.
+START_TIMESTAMP_TEMPLATE = (
+    "(.*?)(?:{ignored_spacers})*({time})(?:{ignored_spacers})*(.*)"
+)
+DURATION_TIMESTAMP_TEMPLATE = (
+    "(.*?)(?:{ignored_spacers})*({time})(?:{ignored_spacers})*"
+    "({time})(?:{ignored_spacers})*(.*)"
+)
+
+
+class TimestampTokenizer:
+    """
+    Single pass timestamp tokenizer equivalent to the default start and duration timestamp patterns.
+    Time tokens are found with the config time pattern and titles are split off by stripping runs of spacers.
+    Avoids the backtracking of (.*?)(?:spacers)*(time)... patterns on long lines.
+    """
+
+    def __init__(self, time_regex: str, ign_regex: str) -> None:
+        """
+        :param time_regex: time pattern.
+        :param ign_regex: alternation of ignored spacers. No spacers if empty.
+        """
+        self.time_pattern = re.compile(time_regex)
+        self.spacers_pattern = re.compile(f"(?:{ign_regex})+") if ign_regex else None
+        # Two times separated only by spacers. Times are matched with backtracking like the duration pattern,
+        # so a time token can be split into two adjacent times. ex. 7:83747885:77 -> 7:83, 747885:77
+        spacers = f"(?:{ign_regex})*" if ign_regex else ""
+        self.duration_pattern = re.compile(
+            f"(?P<start>{time_regex}){spacers}(?P<end>{time_regex})"
+        )
+
+    def tokenize(self, line: str) -> Optional[Tuple[str, ...]]:
+        """
+        Split a line into (title_front, time, title_back) if it has a single time
+        or (title_front, start_time, end_time, title_back) if it has two times separated only by spacers.
+        :param line: single line of text.
+        :return: timestamp tuple or None if line is not a timestamp.
+        """
+        # Only need to know if there are more than two times.
+        times = list(itertools.islice(self.time_pattern.finditer(line), 3))
+        if len(times) == 1:
+            (time,) = times
+            return (
+                self._front(line, time.start()),
+                time.group(),
+                self._back(line, time.end()),
+            )
+        elif len(times) == 2:
+            # The earliest pair can't start before the first time token.
+            if not (duration := self.duration_pattern.search(line, times[0].start())):
+                return None
+            return (
+                self._front(line, duration.start("start")),
+                duration.group("start"),
+                duration.group("end"),
+                self._back(line, duration.end("end")),
+            )
+        return None
+
+    def _skip_spacers(self, line: str, pos: int, endpos: Optional[int] = None) -> int:
+        """
+        Position after the run of spacers starting at pos.
+        """
+        if self.spacers_pattern is None:
+            return pos
+        endpos = len(line) if endpos is None else endpos
+        if spacers := self.spacers_pattern.match(line, pos, endpos):
+            return spacers.end()
+        return pos
+
+    def _front(self, line: str, time_start: int) -> str:
+        """
+        Text before a time without the run of spacers directly preceding it.
+        """
+        front_end = time_start
+        if self.spacers_pattern is not None:
+            for spacers in self.spacers_pattern.finditer(line, 0, time_start):
+                if spacers.end() == time_start:
+                    front_end = spacers.start()
+        return line[:front_end]
+
+    def _back(self, line: str, time_end: int) -> str:
+        """
+        Text after a time without the run of spacers directly following it.
+        """
+        return line[self._skip_spacers(line, time_end) :]
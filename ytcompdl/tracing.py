@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    # Epoch seconds so spans of ffmpeg child processes line up with the parent's.
+    start: float
+    duration: float
+    pid: int
+    tid: int
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+class Tracer:
+    """
+    Record timed spans of pipeline stages.
+    Spans are recorded in-process. ffmpeg child processes get spans from the executor that waits on them.
+    """
+
+    # Span attributes exported as metrics.
+    BYTE_ATTRS = ("bytes_in", "bytes_out")
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        # Called with spans as they're added. ex. to stream progress of a job.
+        self.listeners: List[Callable[[List[Span]], None]] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, category: str = "stage", **attrs: Any
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Time a block of code.
+        :param name: stage name.
+        :param category: stage category. ex. api, ffmpeg, track
+        :param attrs: span attributes. ex. bytes_in, bytes_out, exit_code
+        :return: span attributes (dict) that can be updated within the block.
+        """
+        start = time.time()
+        perf_start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = e.__class__.__name__
+            raise
+        finally:
+            self.add(
+                [
+                    Span(
+                        name=name,
+                        category=category,
+                        start=start,
+                        duration=time.perf_counter() - perf_start,
+                        pid=os.getpid(),
+                        tid=threading.get_ident(),
+                        attrs=attrs,
+                    )
+                ]
+            )
+
+    def add(self, spans: List[Span]) -> None:
+        """
+        Add spans. ex. spans of ffmpeg child processes.
+        """
+        with self._lock:
+            self.spans.extend(spans)
+        for listener in self.listeners:
+            listener(spans)
+
+    def reset(self) -> None:
+        """
+        Drop recorded spans. ex. after each job of a long-running server.
+        """
+        with self._lock:
+            self.spans = []
+
+    def chrome_trace(self) -> Dict:
+        """
+        Spans as complete events in Chrome trace format.
+        https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+        """
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": round(span.start * 1e6),
+                    "dur": round(span.duration * 1e6),
+                    "pid": span.pid,
+                    "tid": span.tid,
+                    "args": span.attrs,
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def save_chrome_trace(self, path: str) -> None:
+        """
+        Write spans to a Chrome trace json file. Open with chrome://tracing or https://ui.perfetto.dev.
+        """
+        with open(path, "w") as jfile:
+            json.dump(self.chrome_trace(), jfile, default=str)
+        logger.info(f"Trace with {len(self.spans)} spans saved to {path}.")
+
+    def prometheus(self) -> str:
+        """
+        Per-stage totals in Prometheus text exposition format.
+        """
+        stages: Dict[tuple, Dict[str, float]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(
+                (span.category, span.name),
+                {
+                    "seconds": 0.0,
+                    "calls": 0,
+                    "errors": 0,
+                    "bytes_in": 0,
+                    "bytes_out": 0,
+                },
+            )
+            stage["seconds"] += span.duration
+            stage["calls"] += 1
+            stage["errors"] += int(
+                "error" in span.attrs or span.attrs.get("exit_code", 0) != 0
+            )
+            for attr in self.BYTE_ATTRS:
+                stage[attr] += span.attrs.get(attr, 0)
+
+        metrics = {
+            "seconds": "Seconds spent in stage during last run.",
+            "calls": "Number of times stage ran during last run.",
+            "errors": "Number of failed runs of stage during last run.",
+            "bytes_in": "Bytes read by stage during last run.",
+            "bytes_out": "Bytes written by stage during last run.",
+        }
+        lines = []
+        for metric, help_text in metrics.items():
+            name = f"ytcompdl_stage_{metric}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for (category, stage_name), stage in sorted(stages.items()):
+                labels = (
+                    f'category="{_escape_label(category)}",'
+                    f'stage="{_escape_label(stage_name)}"'
+                )
+                lines.append(f"{name}{{{labels}}} {stage[metric]}")
+        lines += [
+            "# HELP ytcompdl_last_run_timestamp_seconds Time the last run finished.",
+            "# TYPE ytcompdl_last_run_timestamp_seconds gauge",
+            f"ytcompdl_last_run_timestamp_seconds {time.time()}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def save_prometheus(self, path: str) -> None:
+        """
+        Write metrics for node exporter's textfile collector.
+        Written to a temp file first so the collector never reads a partial file.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as mfile:
+            mfile.write(self.prometheus())
+        os.replace(tmp_path, path)
+        logger.info(f"Metrics saved to {path}.")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def file_size(path: str) -> int:
+    """
+    Size of file in bytes. 0 if it doesn't exist.
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+# Tracer of this process.
+tracer = Tracer()
+span = tracer.span
+
+
+def save(trace_file: Optional[str] = None, metrics_file: Optional[str] = None) -> None:
+    """
+    Export spans of this process to the given files.
+    :param trace_file: Chrome trace json path.
+    :param metrics_file: Prometheus textfile path.
+    """
+    if trace_file:
+        tracer.save_chrome_trace(trace_file)
+    if metrics_file:
+        tracer.save_prometheus(metrics_file)
@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from pytube.helpers import safe_filename
+
+from .timestamps import MS_PER_SECOND
+from .errors import YTAPIError
+
+logger = logging.getLogger(__name__)
+
+# Album tags allowed in optional metadata files.
+ALLOWED_TAGS = ("album", "composer", "genre", "artist", "album_artist", "date")
+# ex. PT1H2M3S or P1DT2H for videos longer than a day.
+ISO_DURATION_REGEX = re.compile(
+    r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$"
+)
+SECONDS_PER_UNIT = (86400, 3600, 60, 1)
+
+
+def parse_iso_duration_ms(iso_duration: str) -> int:
+    """
+    Parse an ISO 8601 duration of the YouTube Data API into milliseconds.
+    :param iso_duration: duration string. ex. PT1H2M3S
+    :return: duration in milliseconds (int)
+    """
+    match = ISO_DURATION_REGEX.match(iso_duration)
+    seconds = sum(
+        int(value) * unit
+        for value, unit in zip(match.groups() if match else (), SECONDS_PER_UNIT)
+        if value
+    )
+    # ex. P0D for live streams.
+    if not seconds:
+        raise YTAPIError(f"Unable to parse ISO8601 duration string. ({iso_duration})")
+    return seconds * MS_PER_SECOND
+
+
+def parse_year(published_at: str) -> str:
+    """
+    Year of an upload date. Current year if it can't be parsed.
+    :param published_at: ISO 8601 date. ex. 2020-01-01T00:00:00Z
+    """
+    year = published_at.split("-")[0]
+    if not year.isdigit():
+        logger.warning("Unable to parse year uploaded. Defaulting to current year.")
+        return str(datetime.datetime.now().year)
+    return year
+
+
+def load_metadata(metadata_fname: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Load and validate album tags from an optional metadata file.
+    :param metadata_fname: path to json file of tags.
+    :return: tag and value pairs.
+    """
+    if not (os.path.exists(metadata_fname) and ".json" in metadata_fname):
+        raise YTAPIError("Invalid path to json metadata file.")
+    with open(metadata_fname, "r") as jfile:
+        data = json.load(jfile)
+    # check if tags in deserialized json are valid.
+    if not all(tag in ALLOWED_TAGS for tag in data):
+        raise YTAPIError("Invalid album metadata provided.")
+    logger.info("Valid album metadata provided.")
+    return tuple((tag, str(value)) for tag, value in data.items())
+
+
+@dataclass(frozen=True, slots=True)
+class VideoInfo:
+    """
+    Video information parsed once from the videos.list response.
+    Immutable and without references to the API client so it's cheap to copy, pickle and share.
+    """
+
+    video_id: str
+    # Title as uploaded and as a safe filename.
+    title: str
+    safe_title: str
+    description: str
+    channel: str
+    year_uploaded: str
+    duration_ms: int
+    # Album tags as tag and value pairs.
+    metadata: Tuple[Tuple[str, str], ...]
+
+    @classmethod
+    def from_response(
+        cls, video_id: str, item: dict, opt_metadata: Optional[str] = None
+    ) -> "VideoInfo":
+        """
+        Build from a videos.list item with snippet and contentDetails parts.
+        :param video_id: video id
+        :param item: videos.list item.
+        :param opt_metadata: path to optional album metadata (.json). Tags from video information if None.
+
+        :return: video info
+        """
+        snippet, content_details = item["snippet"], item["contentDetails"]
+        title = snippet["title"]
+        channel = snippet["channelTitle"]
+        year_uploaded = parse_year(snippet.get("publishedAt", ""))
+        if opt_metadata is None:
+            metadata = (
+                ("album", title),
+                ("album_artist", channel),
+                ("year", year_uploaded),
+            )
+            logger.info(
+                f"No optional album metadata provided. Applying defaults. {metadata}"
+            )
+        else:
+            metadata = load_metadata(opt_metadata)
+
+        return cls(
+            video_id=video_id,
+            title=title,
+            safe_title=safe_filename(title),
+            description=snippet["description"],
+            channel=channel,
+            year_uploaded=year_uploaded,
+            duration_ms=parse_iso_duration_ms(content_details["duration"]),
+            metadata=metadata,
+        )
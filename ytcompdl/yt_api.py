@@ -0,0 +1,167 @@
+import re
+import sys
+import json
+import time
+import itertools
+import logging
+import traceback
+
+from typing import Iterable, Iterator, Optional, Tuple
+
+from .api_cache import APICache
+from .quota import QuotaTracker
+from .tracing import span
+from .errors import YTAPIError, QuotaExceededError
+
+logger = logging.getLogger(__name__)
+
+YT_VIDEO_URL = "https://www.youtube.com/watch?v={video_id}"
+YT_ID_REGEX = re.compile(r"(?<=v=)(.*?)(?=(?:&|$))")
+YT_PLAYLIST_ID_REGEX = re.compile(r"(?<=list=)(.*?)(?=(?:&|$))")
+# Max number of comma-separated ids accepted by videos.list.
+MAX_IDS_PER_REQUEST = 50
+
+
+def build_yt_client(api_key_file: str):
+    """
+    Build YouTube Data API client.
+    Client can be shared by multiple YTCompDL instances.
+    :param api_key_file: Youtube API key as .env file.
+
+    :return: YouTube Data API v3 resource.
+    """
+    # Imported here as googleapiclient is slow to import and only needed once a job runs.
+    import dotenv
+    from googleapiclient.discovery import build
+
+    api_key = dotenv.dotenv_values(api_key_file).get("YT_API_KEY")
+    if api_key is None:
+        raise YTAPIError("No YouTube Data API key detected in environment variables.")
+    try:
+        # Setup build func to allow access to Youtube API.
+        return build(
+            serviceName="youtube",
+            version="v3",
+            developerKey=api_key,
+            # Use the discovery document bundled with googleapiclient instead of fetching or caching one.
+            static_discovery=True,
+            cache_discovery=False,
+        )
+    except Exception:
+        traceback.print_exc(limit=2, file=sys.stdout)
+        sys.exit(1)
+
+
+def execute_request(
+    request,
+    api_cache: Optional[APICache] = None,
+    quota: Optional[QuotaTracker] = None,
+) -> dict:
+    """
+    Execute an API request. Through the response cache if one is given.
+    Recorded by the quota tracker if one is given.
+    :param request: googleapiclient HttpRequest.
+    :param api_cache: optional response cache.
+    :param quota: optional quota tracker.
+
+    :return: response (dict)
+    """
+    if quota is not None and not quota.can_afford(request):
+        raise QuotaExceededError(
+            f"Request to {request.methodId} would exceed quota budget. "
+            f"({quota.used}/{quota.budget} units used)"
+        )
+    with span(request.methodId, category="api") as attrs:
+        start = time.perf_counter()
+        if api_cache is not None:
+            response, cached = api_cache.fetch(request)
+        else:
+            response, cached = request.execute(), False
+        latency = time.perf_counter() - start
+        attrs.update(cached=cached, bytes_in=len(json.dumps(response)))
+
+    if quota is not None:
+        quota.record(request, latency=latency, size=attrs["bytes_in"], cached=cached)
+    return response
+
+
+def video_id(url: str) -> Optional[str]:
+    """
+    Video id from url.
+    :param url: Youtube url.
+    :return: video id or None if not a video url.
+    """
+    if id_search := YT_ID_REGEX.search(url):
+        return id_search.group(1)
+    return None
+
+
+def playlist_id(url: str) -> Optional[str]:
+    """
+    Playlist id from url. Urls to a video in a playlist are treated as video urls.
+    :param url: Youtube url.
+    :return: playlist id or None if not a playlist url.
+    """
+    if video_id(url) is None and (id_search := YT_PLAYLIST_ID_REGEX.search(url)):
+        return id_search.group(1)
+    return None
+
+
+def playlist_video_ids(
+    yt_client,
+    playlist_id: str,
+    api_cache: Optional[APICache] = None,
+    quota: Optional[QuotaTracker] = None,
+) -> Iterator[str]:
+    """
+    List ids of all videos in a playlist by paging through playlistItems.
+    :param yt_client: YouTube Data API client.
+    :param playlist_id: playlist id.
+    :param api_cache: optional response cache.
+    :param quota: optional quota tracker.
+
+    :return: video ids (iterator of str)
+    """
+    playlist_request = yt_client.playlistItems().list(
+        part="contentDetails",
+        playlistId=playlist_id,
+        maxResults=50,
+    )
+    while playlist_request:
+        playlist_response = execute_request(playlist_request, api_cache, quota)
+        for item in playlist_response.get("items", []):
+            yield item["contentDetails"]["videoId"]
+        # list next returns None if no items remaining.
+        playlist_request = yt_client.playlistItems().list_next(
+            playlist_request, playlist_response
+        )
+
+
+def resolve_videos(
+    yt_client,
+    video_ids: Iterable[str],
+    parts: Tuple[str, ...] = ("snippet", "contentDetails"),
+    api_cache: Optional[APICache] = None,
+    quota: Optional[QuotaTracker] = None,
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Get video information of many videos with one videos.list request per 50 ids.
+    :param yt_client: YouTube Data API client.
+    :param video_ids: video ids.
+    :param parts: parts of video to get.
+    :param api_cache: optional response cache.
+    :param quota: optional quota tracker.
+
+    :return: video id and its videos.list item (iterator of tuples). Unavailable videos are skipped.
+    """
+    video_ids = iter(video_ids)
+    while chunk := list(itertools.islice(video_ids, MAX_IDS_PER_REQUEST)):
+        # maxResults isn't supported with id. All items of up to 50 ids are returned in one page.
+        info_request = yt_client.videos().list(part=",".join(parts), id=",".join(chunk))
+        info_response = execute_request(info_request, api_cache, quota)
+        items = {item["id"]: item for item in info_response.get("items", [])}
+        for vid_id in chunk:
+            if item := items.get(vid_id):
+                yield vid_id, item
+            else:
+                logger.warning(f"No video information available for {vid_id}.")
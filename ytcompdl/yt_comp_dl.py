@@ -1,37 +1,133 @@
 import os
 import re
-import sys
 import yaml
 import pathlib
 import datetime
 import pprint
 import logging
-import json
-import dotenv
-import traceback
-import multiprocessing as mp
-
-from typing import List, Iterator
-from functools import reduce
-from googleapiclient.discovery import build
+import heapq
+import threading
+import contextlib
+import dataclasses
+
+from typing import List, Iterator, Tuple, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import reduce, lru_cache
 from pytube.helpers import safe_filename
 
 from .pytube_dl import Pytube_Dl
-from .ffmpeg_utils import slice_source, apply_fade, apply_metadata
-from .errors import YTAPIError, PostProcessError, PyTubeError
+from .yt_api import build_yt_client, execute_request, YT_ID_REGEX
+from .yt_api import video_id as parse_video_id
+from .video_info import VideoInfo, ALLOWED_TAGS
+from .api_cache import APICache
+from .source_store import SourceStore
+from .quota import QuotaTracker
+from . import tracing
+from .tracing import span, file_size
+from .scheduler import plan, job_kind
+from .journal import TrackJournal, track_key, part_path, file_checksum
+from .timestamps import (
+    MS_PER_SECOND,
+    GOOD_ENOUGH_SIMILARITY,
+    START_TIMESTAMP_TEMPLATE,
+    DURATION_TIMESTAMP_TEMPLATE,
+    TimestampTokenizer,
+    parse_timestamp_ms,
+)
+from .ffmpeg_exec import FFmpegJob, run_jobs
+from .ffmpeg_utils import (
+    check_ffmpeg,
+    render_track_cmd,
+    render_tracks_cmd,
+    keyframe_index,
+    snap_to_keyframe,
+    can_stream_copy,
+)
+from .errors import YTAPIError, PostProcessError, PyTubeError, JobCancelledError
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def load_regex_patterns(
+    regex_config: str,
+) -> Tuple[
+    re.Pattern, re.Pattern, re.Pattern, re.Pattern, Optional[TimestampTokenizer]
+]:
+    """
+    Load and compile regex patterns from config file.
+    Cached so that multiple videos with the same config only load it once.
+    :param regex_config: Path to regex config file (.yaml)
+    :return: time, ignored spacers, start timestamp and duration timestamp patterns
+        and a tokenizer if the timestamp patterns have the default shape.
+    """
+    with open(regex_config, "r") as yaml_file:
+        try:
+            regex_patterns = yaml.safe_load(yaml_file)
+        except yaml.YAMLError:
+            raise Exception(f"Invalid yaml file. {regex_config}")
+
+    # Check that all patterns exist.
+    expected_patterns = [
+        "ignored_spacers",
+        "time",
+        "start_timestamp",
+        "duration_timestamp",
+    ]
+    if any(pattern not in expected_patterns for pattern in regex_patterns.keys()):
+        raise ValueError(f"Missing one or more expected patterns. {expected_patterns}")
+
+    # Check that types are correct.
+    for regex_name, pattern in regex_patterns.items():
+        if regex_name == "ignored_spacers" and isinstance(pattern, list):
+            if any(isinstance(ign_char, str) is False for ign_char in pattern):
+                raise ValueError("Invalid character in ignored_spacers.")
+        elif not isinstance(pattern, str):
+            raise ValueError(
+                f"Regular expression pattern for {regex_name} is invalid. {pattern}"
+            )
+
+    time_regex = regex_patterns["time"]
+    try:
+        ign_regex = "|".join(f"\\{char}" for char in regex_patterns["ignored_spacers"])
+    except TypeError:
+        logging.debug('No ignored characters provided for spacer. Using "" as default.')
+        ign_regex = ""
+
+    start_timestamps_regex = re.compile(
+        regex_patterns["start_timestamp"].format(
+            ignored_spacers=ign_regex, time=time_regex
+        )
+    )
+    dur_timestamps_regex = re.compile(
+        regex_patterns["duration_timestamp"].format(
+            ignored_spacers=ign_regex, time=time_regex
+        )
+    )
+    # Custom timestamp patterns fall back to regex matching.
+    tokenizer = None
+    default_templates = (START_TIMESTAMP_TEMPLATE, DURATION_TIMESTAMP_TEMPLATE)
+    if default_templates == (
+        regex_patterns["start_timestamp"],
+        regex_patterns["duration_timestamp"],
+    ):
+        tokenizer = TimestampTokenizer(time_regex, ign_regex)
+
+    return (
+        re.compile(time_regex),
+        re.compile(ign_regex),
+        start_timestamps_regex,
+        dur_timestamps_regex,
+        tokenizer,
+    )
+
+
 class YTCompDL(Pytube_Dl):
     # YT Data API parts of video to get. Fed to get_video_info
     YT_VIDEO_PARTS = ("snippet", "contentDetails")
-    # Subtract by one base time to be consistent with timedeltas.
-    BASE_TIME = datetime.datetime.strptime("1900-01-01 00:00:00", "%Y-%m-%d %H:%M:%S")
-    YT_ISO_DUR_REGEX = re.compile(r"(\d{1,2}H)?(\d{1,2}M)?(\d{1,2}S)")
     # Regexp to parse strings (id, timestamps, etc.)
     # Works only if text is split line-by-line.
-    YT_ID_REGEX = re.compile(r"(?<=v=)(.*?)(?=(?:&|$))")
+    YT_ID_REGEX = YT_ID_REGEX
 
     # Max comments to query from.
     MAX_COMMENTS = 1000
@@ -40,10 +136,15 @@ class YTCompDL(Pytube_Dl):
     # Percent similarity (0-1) to original duration of video. NOTE: Last timestamp cannot be considered in
     # calculation! This means that comments with longer tracks at end will have reduced overall similarity
     LENGTH_THRESHOLD = 0.5
+    # Max number of valid comments to keep as candidates.
+    MAX_CANDIDATES = 10
+    GOOD_ENOUGH_SIMILARITY = GOOD_ENOUGH_SIMILARITY
 
     # Download configs
-    ALLOWED_TAGS = ("album", "composer", "genre", "artist", "album_artist", "date")
+    ALLOWED_TAGS = ALLOWED_TAGS
     OUTPUT_FILE_EXT = {"audio": "mp3", "video": "mp4"}
+    # Sliced audio is encoded per track from the downloaded aac source instead of a full mp3.
+    SLICED_SOURCE_FILE_EXT = {"audio": "m4a", "video": "mp4"}
 
     def __init__(
         self,
@@ -61,6 +162,29 @@ class YTCompDL(Pytube_Dl):
         fade_end: str = "both",
         fade_time: float = 0.5,
         rm_src: bool = False,
+        single_decode: bool = False,
+        keyframe_tolerance: float = 1.0,
+        cache_file: Optional[str] = None,
+        cache_ttl: float = 86400,
+        cache_size: int = 256,
+        quota_budget: Optional[int] = None,
+        quota_stats: Optional[str] = None,
+        good_enough: float = GOOD_ENOUGH_SIMILARITY,
+        trace_file: Optional[str] = None,
+        metrics_file: Optional[str] = None,
+        stream_dl: bool = False,
+        chunked: bool = False,
+        n_connections: int = 4,
+        store_dir: Optional[str] = None,
+        store_size: int = 10240,
+        track_timeout: Optional[float] = None,
+        *,
+        yt_client=None,
+        video_info: Optional[dict] = None,
+        api_cache: Optional[APICache] = None,
+        source_store: Optional[SourceStore] = None,
+        quota: Optional[QuotaTracker] = None,
+        cancel_event: Optional[threading.Event] = None,
     ):
         """
         :param api_key_file: Youtube API key as .env file. (string)
@@ -73,6 +197,29 @@ class YTCompDL(Pytube_Dl):
         :param slice_output: Slice output by timestamps. (bool)
         :param fade_end: Fade an end of the output. (string)
         :param fade_time: Time to fade audio or video. (float)
+        :param rm_src: Remove downloaded source file after processing. (bool)
+        :param single_decode: Cut all tracks with a single ffmpeg process. (bool)
+        :param keyframe_tolerance: Max seconds to snap stream copy cuts to a keyframe. (float)
+        :param cache_file: SQLite file to cache API responses in. No cache if None. (string)
+        :param cache_ttl: Seconds a cached API response is fresh. (float)
+        :param cache_size: Max size of API response cache in MB. (int)
+        :param quota_budget: Max API quota units to use. Comment scanning stops before exceeding it. (int)
+        :param quota_stats: json file to write API usage stats to. (string)
+        :param good_enough: Percent similarity (0-1) at which comment scanning stops. (float)
+        :param trace_file: json file to write a Chrome trace of pipeline stages to. (string)
+        :param metrics_file: Prometheus textfile to write per-stage metrics to. (string)
+        :param stream_dl: Pipe downloaded audio into ffmpeg instead of saving the source stream first. (bool)
+        :param chunked: Convert unsliced audio in n_processes chunks encoded in parallel. (bool)
+        :param n_connections: Number of connections used to download each stream. (int)
+        :param store_dir: Directory to keep downloaded streams in for other outputs. No store if None. (string)
+        :param store_size: Max size of stored streams in MB. (int)
+        :param track_timeout: Max seconds to render a track before its ffmpeg process is killed. (float)
+        :param yt_client: Shared YouTube Data API client. Built from api_key_file if None.
+        :param video_info: Prefetched videos.list item of video. Requested from the API if None. (dict)
+        :param api_cache: Shared API response cache. Overrides cache_file. (APICache)
+        :param source_store: Shared source stream store. Overrides store_dir. (SourceStore)
+        :param quota: Shared API quota tracker. Overrides quota_budget. (QuotaTracker)
+        :param cancel_event: Event to stop processing on. ex. a cancelled server job. (threading.Event)
         Titles and track numbers applied by default.
         """
         self.video_url = video_url
@@ -93,94 +240,71 @@ class YTCompDL(Pytube_Dl):
 
         self.opt_metadata = opt_metadata
         self.choose_comment = choose_comment
+        self.good_enough = good_enough
         self.save_timestamps = save_timestamps
         self.slice_output = slice_output
         self.fade_end = fade_end
         self.fade_time = fade_time
         self.rm_src = rm_src
-
-        api_key = dotenv.dotenv_values(api_key_file).get("YT_API_KEY")
-        if api_key is None:
+        self.single_decode = single_decode
+        self.keyframe_tolerance = keyframe_tolerance
+        self.track_timeout = track_timeout
+        self.cancel_event = cancel_event
+
+        # Reuse shared resources if given. ex. batch mode.
+        self.YT = yt_client if yt_client else build_yt_client(api_key_file)
+        self.video_info = video_info
+        if api_cache is None and cache_file:
+            api_cache = APICache(cache_file, cache_ttl, cache_size * 1024**2)
+        self.api_cache = api_cache
+        if source_store is None and store_dir:
+            source_store = SourceStore(store_dir, store_size * 1024**2)
+        self.quota = quota if quota is not None else QuotaTracker(quota_budget)
+        self.quota_stats = quota_stats
+
+        self.trace_file = trace_file
+        self.metrics_file = metrics_file
+
+        if (vid_id := parse_video_id(video_url)) is None:
             raise YTAPIError(
-                "No YouTube Data API key detected in environment variables."
+                f"Unable to parse video id from provided url. ({video_url})"
             )
-        try:
-            # Setup build func to allow access to Youtube API.
-            self.YT = build(
-                serviceName="youtube",
-                version="v3",
-                developerKey=api_key,
-            )
-        except Exception:
-            traceback.print_exc(limit=2, file=sys.stdout)
-            sys.exit(1)
-
-        # Get video info.
-        self.snippets, self.content_details = list(
-            self.get_video_info(*self.YT_VIDEO_PARTS)
-        )
-        # comment instance vars
-        self.comment = None
-        self.timestamp_style = None
-        # timestamps
-        self.titles, self.times = self.format_timestamps()
+        with self.quota.for_video(vid_id):
+            # Get video info.
+            with span("video_info", video_id=vid_id):
+                self.info = VideoInfo.from_response(
+                    vid_id, self.get_video_info(vid_id), opt_metadata
+                )
+            # comment instance vars
+            self.comment = None
+            self.timestamp_style = None
+            # timestamps
+            with span("timestamps", video_id=self.video_id) as attrs:
+                self.titles, self.times = self.format_timestamps()
+                attrs["n_tracks"] = len(self.titles)
+        logger.info(self.quota.summary())
 
         # Place at the end to allow custom errors if invalid args.
-        super().__init__(video_url, res)
+        super().__init__(
+            video_url,
+            res,
+            stream_dl,
+            self.n_processes if chunked else 1,
+            n_connections,
+            source_store,
+        )
 
     def load_config_regex(self) -> None:
         """
         Load regex patterns from config file by setting instance vars.
         """
-        with open(self.regex_config, "r") as yaml_file:
-            try:
-                regex_patterns = yaml.safe_load(yaml_file)
-            except yaml.YAMLError:
-                raise Exception(f"Invalid yaml file. {self.regex_config}")
-
-        # Check that all patterns exist.
-        expected_patterns = [
-            "ignored_spacers",
-            "time",
-            "start_timestamp",
-            "duration_timestamp",
-        ]
-        if any(pattern not in expected_patterns for pattern in regex_patterns.keys()):
-            raise ValueError(
-                f"Missing one or more expected patterns. {expected_patterns}"
-            )
-
-        # Check that types are correct.
-        for regex_name, pattern in regex_patterns.items():
-            if regex_name == "ignored_spacers" and isinstance(pattern, list):
-                if any(isinstance(ign_char, str) is False for ign_char in pattern):
-                    raise ValueError("Invalid character in ignored_spacers.")
-            elif not isinstance(pattern, str):
-                raise ValueError(
-                    f"Regular expression pattern for {regex_name} is invalid. {pattern}"
-                )
-
-        self.YT_TIME_REGEX = regex_patterns["time"]
-        try:
-            self.YT_IGN_REGEX = "|".join(
-                f"\\{char}" for char in regex_patterns["ignored_spacers"]
-            )
-        except TypeError:
-            logging.debug(
-                'No ignored characters provided for spacer. Using "" as default.'
-            )
-            self.YT_IGN_REGEX = ""
-
-        self.YT_START_TIMESTAMPS_REGEX = re.compile(
-            regex_patterns["start_timestamp"].format(
-                ignored_spacers=self.YT_IGN_REGEX, time=self.YT_TIME_REGEX
-            )
-        )
-        self.YT_DUR_TIMESTAMPS_REGEX = re.compile(
-            regex_patterns["duration_timestamp"].format(
-                ignored_spacers=self.YT_IGN_REGEX, time=self.YT_TIME_REGEX
-            )
-        )
+        (
+            self.YT_TIME_REGEX,
+            self.YT_IGN_REGEX,
+            self.YT_START_TIMESTAMPS_REGEX,
+            self.YT_DUR_TIMESTAMPS_REGEX,
+            self.timestamp_tokenizer,
+        ) = load_regex_patterns(self.regex_config)
 
     @property
     def title(self) -> str:
@@ -188,15 +312,15 @@ class YTCompDL(Pytube_Dl):
         Safe filename for title of video
         :return: Safe title filename.
         """
-        return safe_filename(self.snippets["title"])
+        return self.info.safe_title
 
     @property
     def desc(self) -> str:
         """
         Video description
-        :return: Safe title filename.
+        :return: description.
         """
-        return self.snippets["description"]
+        return self.info.description
 
     @property
     def channel(self) -> str:
@@ -204,126 +328,117 @@ class YTCompDL(Pytube_Dl):
         Channel name
         :return: channel name.
         """
-        return self.snippets["channelTitle"]
+        return self.info.channel
 
     @property
     def year_uploaded(self) -> str:
-        try:
-            year_uploaded = self.snippets["publishedAt"].split("-")[0]
-        except (ValueError, KeyError):
-            logger.warning("Unable to parse year uploaded. Defaulting to current year.")
-            year_uploaded = str(datetime.datetime.now().year)
-        return year_uploaded
+        return self.info.year_uploaded
 
     @property
     def video_id(self) -> str:
+        return self.info.video_id
+
+    @property
+    def duration(self) -> datetime.timedelta:
         """
-        Video id from url.
-        :return: id_search (string)
+        Video duration as datetime timedelta.
         """
-        if id_search := re.search(self.YT_ID_REGEX, self.video_url):
-            return id_search.group(1)
-        else:
-            raise YTAPIError(
-                f"Unable to parse video id from provided url. ({self.video_url})"
-            )
+        return datetime.timedelta(milliseconds=self.info.duration_ms)
 
     @property
-    def duration(self) -> datetime.timedelta:
+    def duration_ms(self) -> int:
         """
-        Converts iso8601 duration string into duration as datetime timedelta .
-        :return: duration (datetime timedelta)
+        Video duration in milliseconds.
         """
-        if hms := re.search(self.YT_ISO_DUR_REGEX, self.content_details["duration"]):
-            dt_strptime_fmt = "PT" + "".join(
-                "%" + (match[-1] * 2) for match in hms.groups() if match
-            )
-            datetime_duration = datetime.datetime.strptime(
-                self.content_details["duration"], dt_strptime_fmt
-            )
-            duration_total = datetime_duration - self.BASE_TIME
-            return duration_total
-        else:
-            raise YTAPIError("Unable to parse ISO8601 duration string.")
+        return self.info.duration_ms
 
     @property
     def metadata(self) -> dict:
         """
-        Metadata from video information to add to media.
-        If opt_metadata included and validated, use instead.
-        :return: metadata or data (dict)
+        Album tags to add to media. From opt_metadata if included, else from video information.
+        :return: metadata (dict)
         """
-        if self.opt_metadata is None:
-            metadata = {
-                "album": self.snippets["title"],
-                "album_artist": self.channel,
-                "year": self.year_uploaded,
-            }
-            logger.info(
-                f"No optional album metadata provided. Applying defaults. {metadata.items()}"
+        return dict(self.info.metadata)
+
+    @property
+    def source_path(self) -> str:
+        """
+        Path of downloaded source file.
+        :return: source path (string)
+        """
+        file_exts = (
+            self.SLICED_SOURCE_FILE_EXT if self.slice_output else self.OUTPUT_FILE_EXT
+        )
+        if self.output_type.lower() in file_exts.keys():
+            return os.path.join(
+                self.output_dir,
+                f"{self.title}.{file_exts[self.output_type.lower()]}",
             )
-            return metadata
         else:
-            if os.path.exists(self.opt_metadata) and ".json" in self.opt_metadata:
-                with open(self.opt_metadata, "r") as jfile:
-                    data = json.load(jfile)
-            else:
-                raise YTAPIError("Invalid path to json metadata file.")
-            # check if tags in deserialized json are valid.
-            if all(tag in self.ALLOWED_TAGS for tag, _ in data.items()):
-                logger.info("Valid album metadata provided.")
-                return data
-            else:
-                raise YTAPIError("Invalid album metadata provided.")
+            raise PyTubeError(f"Invalid output category ({self.output_type}).")
+
+    @property
+    def output_path(self) -> str:
+        """
+        Path of final output. Folder of tracks if sliced. Otherwise, source file.
+        :return: output path (string)
+        """
+        if self.slice_output:
+            return str(self.output_dir.joinpath(self.title))
+        return self.source_path
 
     def download(self) -> int:
         """
         Download YT video provided by url and process using timestamps.
         :return: None
         """
+        video_path = self.source_path
 
-        if self.output_type.lower() in self.OUTPUT_FILE_EXT.keys():
-            video_path = os.path.join(
-                self.output_dir,
-                f"{self.title}.{self.OUTPUT_FILE_EXT[self.output_type.lower()]}",
-            )
-        else:
-            raise PyTubeError(f"Invalid output category ({self.output_type}).")
-
-        if not os.path.exists(video_path):
+        # Interrupted downloads resume from their .part files.
+        if not self.is_downloaded(video_path):
             logger.info(
-                f"Downloading {self.output_type.lower()} for {self.snippets['title']}."
+                f"Downloading {self.output_type.lower()} for {self.info.title}."
             )
-            self.pytube_dl(video_path)
+            with span("download", video_id=self.video_id) as attrs:
+                self.pytube_dl(video_path)
+                attrs["bytes_out"] = file_size(video_path)
         else:
             logger.info("Pre-existing file found.")
 
-        self._postprocess(video_path)
+        self.check_cancelled()
+        with span("postprocess", video_id=self.video_id):
+            self._postprocess(video_path)
 
-        # remove original source file.
+        # remove original source file and its keyframe index.
         if self.rm_src and self.slice_output:
-            try:
-                os.remove(video_path)
-            except FileNotFoundError:
-                pass
+            for src_path in (video_path, f"{video_path}.keyframes.json"):
+                try:
+                    os.remove(src_path)
+                except FileNotFoundError:
+                    pass
+
+        if self.source_store is not None:
+            logger.info(self.source_store.summary())
+        if self.quota_stats:
+            self.quota.save(self.quota_stats)
+        tracing.save(self.trace_file, self.metrics_file)
 
         return 0
 
+    def check_cancelled(self) -> None:
+        """
+        Stop processing if cancel_event is set. Finished tracks are kept in the journal.
+        :raises JobCancelledError: if cancelled.
+        """
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise JobCancelledError(f"Cancelled processing {self.video_id}.")
+
     @staticmethod
-    def _postprocess_track(
-        video_path: pathlib.Path,
-        num: int,
-        title: str,
-        times: List[datetime.timedelta],
-        output_dir: pathlib.Path,
-        output_type: str,
-        fade_end: str,
-        fade_time: int,
-        metadata: dict,
-    ) -> str:
+    def _track_output(
+        num: int, title: str, output_dir: pathlib.Path, output_type: str
+    ) -> pathlib.Path:
         """
-        Process a single track.
-        instance var needs to be picklable so instead pass vars
+        Output path of a single track.
         """
         # If empty title or unknown, give generic name.
         # else clean and format.
@@ -334,43 +449,145 @@ class YTCompDL(Pytube_Dl):
 
         ext = "mp3" if output_type == "audio" else "mp4"
 
-        # ffmpeg can't apply inplace so need intermediate files with unique names.
-        slice_path = output_dir.joinpath(f"{hash(title)}_{safe_title}.{ext}")
-        fade_path = output_dir.joinpath(f"{hash(title + 'fade')}_{safe_title}.{ext}")
-        final_output = output_dir.joinpath(f"{safe_title}.{ext}")
-
-        if final_output.exists():
-            return str(final_output)
-
-        # convert timedelta times to seconds (int).
-        duration = tuple(int(time.seconds) for time in times)
+        return output_dir.joinpath(f"{safe_title}.{ext}")
 
-        if not slice_path.exists():
-            slice_path = slice_source(
-                input_fname=video_path, output_fname=str(slice_path), duration=duration
+    def _track_jobs(
+        self, video_path: pathlib.Path, title_folder: pathlib.Path
+    ) -> List[Tuple[str, int, str, Tuple[float, float], pathlib.Path]]:
+        """
+        Key, number, title, duration and output of each track.
+        Keys are derived from the source and everything that changes a track's output so they're stable across runs.
+        """
+        source_size = file_size(str(video_path))
+        jobs = []
+        for num, (title, duration) in enumerate(
+            zip(self.titles, self.track_durations(video_path)), 1
+        ):
+            key = track_key(
+                self.video_id,
+                pathlib.Path(video_path).suffix,
+                source_size,
+                num,
+                title,
+                duration,
+                self.output_type,
+                self.fade_end,
+                self.fade_time,
+                self.metadata,
             )
+            output = self._track_output(num, title, title_folder, self.output_type)
+            jobs.append((key, num, title, duration, output))
+        return jobs
 
-        if not fade_path.exists():
-            fade_path = apply_fade(
-                input_fname=str(slice_path),
-                output_fname=str(fade_path),
-                fade_end=fade_end,
-                duration=duration,
-                seconds=float(fade_time),
-                remove_original=True,
+    def _pending_track_jobs(
+        self, jobs: list, journal: TrackJournal
+    ) -> List[Tuple[str, int, str, Tuple[float, float], pathlib.Path]]:
+        """
+        Tracks not rendered by a previous run. Journal is updated to only hold current tracks.
+        """
+        journal.prune(job[0] for job in jobs)
+        journal.remove_orphans()
+        pending = [job for job in jobs if not journal.is_done(job[0], job[4])]
+        if n_done := len(jobs) - len(pending):
+            done_msg = f"Skipping {n_done} tracks completed by a previous run."
+            logger.info(done_msg)
+            print(done_msg)
+        journal.start({key: output for key, _, _, _, output in pending})
+        return pending
+
+    def _postprocess_single_decode(
+        self, video_path: pathlib.Path, title_folder: pathlib.Path
+    ) -> List[str]:
+        """
+        Process all tracks with a single ffmpeg process. See ffmpeg_utils.render_tracks_cmd.
+        """
+        jobs = self._track_jobs(video_path, title_folder)
+        journal = TrackJournal(title_folder)
+        pending = self._pending_track_jobs(jobs, journal)
+
+        if not pending:
+            return [str(output) for *_, output in jobs]
+
+        part_outputs = [str(part_path(output)) for *_, output in pending]
+        ffmpeg_job = FFmpegJob(
+            key=video_path,
+            cmd=render_tracks_cmd(
+                input_fname=str(video_path),
+                tracks=[
+                    (part_output, duration, title, num)
+                    for part_output, (_, num, title, duration, _) in zip(
+                        part_outputs, pending
+                    )
+                ],
+                album_tags=self.metadata,
+                fade_end=self.fade_end,
+                seconds=float(self.fade_time),
+            ),
+            stage="ffmpeg.render_tracks",
+            input_fnames=[str(video_path)],
+            output_fnames=part_outputs,
+            # One process renders every track so it gets the time of all of them.
+            timeout=self.track_timeout * len(pending) if self.track_timeout else None,
+        )
+        # Run like _postprocess_tracks so a timeout or cancel kills the process.
+        with contextlib.closing(
+            run_jobs([ffmpeg_job], 1, self.cancel_event)
+        ) as results:
+            result = next(results, None)
+        self.check_cancelled()
+        # Outputs of a failed or killed process may be truncated. Keep them out of the journal.
+        if result.exit_code != 0:
+            reason = (
+                "timed out" if result.timed_out else f"exit code {result.exit_code}"
             )
+            raise PostProcessError(
+                f"Unable to render tracks of {video_path}. ({reason})"
+            )
+
+        for key, num, title, _, output in pending:
+            part_output = part_path(output)
+            if not part_output.exists():
+                raise PostProcessError(f"Unable to render track {num} ({title}).")
+            os.replace(part_output, output)
+            journal.done(key, output, file_checksum(str(output)))
 
-        # can't add metadata inplace
-        final_output = apply_metadata(
-            input_fname=str(fade_path),
-            output_fname=str(final_output),
-            title=title,
-            track=num,
-            album_tags=metadata,
-            remove_original=True,
+        return [str(output) for *_, output in jobs]
+
+    def stream_copy(self, video_path: str) -> bool:
+        """
+        Check if tracks are cut from source without encoding.
+        :param video_path: source file path.
+        :return: True if tracks are stream copied.
+        """
+        track_ext = self.OUTPUT_FILE_EXT[self.output_type.lower()]
+        return self.fade_end.lower() == "none" and can_stream_copy(
+            str(video_path), f"track.{track_ext}"
         )
 
-        return str(final_output)
+    def track_durations(self, video_path: str) -> List[Tuple[float, float]]:
+        """
+        Start and end of each track in seconds.
+        Stream copy cuts are snapped to the nearest source keyframe within keyframe_tolerance.
+        :param video_path: source file path.
+        :return: durations (list of tuples)
+        """
+        # convert millisecond times to seconds (int).
+        durations = [
+            tuple(time // MS_PER_SECOND for time in times) for times in self.times
+        ]
+
+        if not self.stream_copy(video_path) or self.keyframe_tolerance <= 0:
+            return durations
+
+        if keyframes := keyframe_index(str(video_path)):
+            durations = [
+                tuple(
+                    snap_to_keyframe(time, keyframes, self.keyframe_tolerance)
+                    for time in duration
+                )
+                for duration in durations
+            ]
+        return durations
 
     def _postprocess(self, video_path):
         if not self.slice_output:
@@ -384,35 +601,110 @@ class YTCompDL(Pytube_Dl):
         if not title_folder.exists():
             title_folder.mkdir(parents=True, exist_ok=True)
 
-        post_process_msg = f"Running post-processing in {self.n_processes} processes."
         logger.info(f"Processing file: {video_path}")
-        logger.info(post_process_msg)
         logger.info(f"Slicing: {self.slice_output}")
         logger.info(f"Applying fade ({self.fade_time}): {self.fade_end}")
 
-        print(post_process_msg)
-        with mp.Pool(processes=self.n_processes) as pool:
-            args = [
-                (
-                    video_path,
-                    num,
-                    title,
-                    times,
-                    title_folder,
-                    self.output_type,
-                    self.fade_end,
-                    self.fade_time,
-                    self.metadata,
-                )
-                for num, (title, times) in enumerate(zip(self.titles, self.times), 1)
-            ]
-            res = pool.starmap(self._postprocess_track, args)
+        if self.single_decode:
+            logger.info("Reading source once for all tracks.")
+            res = self._postprocess_single_decode(video_path, title_folder)
+        else:
+            res = self._postprocess_tracks(video_path, title_folder)
 
         done_msg = f"Completed processing. {len(res)} files produced."
         logger.info(done_msg)
         print(done_msg)
         return res
 
+    @check_ffmpeg
+    def _postprocess_tracks(
+        self, video_path: pathlib.Path, title_folder: pathlib.Path
+    ) -> List[str]:
+        """
+        Render each track with a separate ffmpeg process. See ffmpeg_exec.run_jobs.
+        Cores (n_processes) are split between concurrent processes and ffmpeg threads of each.
+        Tracks are renamed from their temporary output and recorded in the journal as each finishes.
+        """
+        jobs = self._track_jobs(video_path, title_folder)
+        journal = TrackJournal(title_folder)
+        pending = self._pending_track_jobs(jobs, journal)
+        if not pending:
+            return [str(output) for *_, output in jobs]
+
+        schedule = plan(
+            job_kind(self.output_type, self.stream_copy(video_path)),
+            n_jobs=len(pending),
+            cpu_budget=self.n_processes,
+        )
+        post_process_msg = (
+            f"Running post-processing in {schedule.n_workers} ffmpeg processes "
+            f"with {schedule.threads} threads each."
+        )
+        logger.info(post_process_msg)
+        print(post_process_msg)
+
+        ffmpeg_jobs = [
+            FFmpegJob(
+                key=(key, num, title, duration, output),
+                cmd=render_track_cmd(
+                    input_fname=str(video_path),
+                    output_fname=str(part_path(output)),
+                    duration=duration,
+                    title=title,
+                    track=num,
+                    album_tags=self.metadata,
+                    fade_end=self.fade_end,
+                    seconds=float(self.fade_time),
+                    threads=schedule.threads,
+                    filter_threads=schedule.filter_threads,
+                ),
+                stage="ffmpeg.render_track",
+                input_fnames=[str(video_path)],
+                output_fnames=[str(part_path(output))],
+                timeout=self.track_timeout,
+            )
+            for key, num, title, duration, output in pending
+        ]
+        # Closed on an error or cancel so running ffmpeg processes are killed.
+        with contextlib.closing(
+            run_jobs(ffmpeg_jobs, schedule.n_workers, self.cancel_event)
+        ) as results:
+            for result in results:
+                key, num, title, duration, output = result.key
+                part_output = part_path(output)
+                if result.exit_code != 0 or not part_output.exists():
+                    reason = (
+                        "timed out"
+                        if result.timed_out
+                        else f"exit code {result.exit_code}"
+                    )
+                    raise PostProcessError(
+                        f"Unable to render track {num} ({title}). ({reason})"
+                    )
+                os.replace(part_output, output)
+                logger.info(f"Rendered track {num} from {duration[0]}-{duration[1]}.")
+                tracing.tracer.add(
+                    [
+                        dataclasses.replace(
+                            result.span,
+                            name="track",
+                            category="track",
+                            attrs={
+                                "track": num,
+                                "title": title,
+                                "duration": duration,
+                                "bytes_out": file_size(str(output)),
+                            },
+                        )
+                    ]
+                )
+                journal.done(key, output, file_checksum(str(output)))
+                self.check_cancelled()
+        # run_jobs ends early once cancelled.
+        self.check_cancelled()
+
+        return [str(output) for *_, output in jobs]
+
     def format_timestamps(self):
         """
         Format timestamps by splitting into times and titles
@@ -423,7 +715,7 @@ class YTCompDL(Pytube_Dl):
         times = []
 
         for timestamp in self.timestamps():
-            times.append(self.convert_str_time(timestamp[1:-1], rtn_fmt="timedelta"))
+            times.append(self.convert_str_time(timestamp[1:-1]))
             try:
                 # If empty group is at start. Timestamp title at end.
                 if timestamp.index("") == 0:
@@ -440,17 +732,14 @@ class YTCompDL(Pytube_Dl):
             times = reduce(lambda x, y: x + y, times)
             dur_times = []
             for i in range(len(times) - 1):
-                if i == 0:
-                    add_time = datetime.timedelta(seconds=0)
-                else:
-                    add_time = datetime.timedelta(seconds=1)
+                add_time = 0 if i == 0 else MS_PER_SECOND
                 dur_times.append([times[i] + add_time, times[i + 1]])
             # Add final timestamp
-            dur_times.append([times[-1] + datetime.timedelta(seconds=1), self.duration])
+            dur_times.append([times[-1] + MS_PER_SECOND, self.duration_ms])
             times = dur_times
         else:
             # Take last duration timestamp's ending time and add 1 second.
-            times.append([times[-1][1] + datetime.timedelta(seconds=1), self.duration])
+            times.append([times[-1][1] + MS_PER_SECOND, self.duration_ms])
         return titles, times
 
     def clean_timestamps(self, timestamps) -> List[List[str]]:
@@ -461,70 +750,65 @@ class YTCompDL(Pytube_Dl):
         """
         # pprint.pprint(timestamps)
         return [
-            [re.sub(self.YT_IGN_REGEX, "", item.strip()).strip() for item in timestamp]
+            [self.YT_IGN_REGEX.sub("", item.strip()).strip() for item in timestamp]
             for timestamp in timestamps
         ]
 
-    def convert_str_time(self, str_times, rtn_fmt="datetime"):
+    def convert_str_time(self, str_times) -> List[int]:
         """
-        Convert string time to datetime
+        Convert string times to milliseconds.
         :param str_times: time-like strings (iterable)
-        :param rtn_fmt: return datetime or timedelta? (string)
-        :return: datetime objects (list)
+        :return: times in milliseconds (list of ints)
         """
         # Check if str_times iterable has any invalid dtypes (not a str).
         if any(not isinstance(str_time, str) for str_time in str_times):
             raise YTAPIError(
                 f"Unable to convert invalid string timestamp.\n" f"{str_times}"
             )
-        time_length = 8
-        # First pad time to standardize.
-        converted_times = []
-        for str_time in str_times:
-            while len(str_time) < time_length:
-                # if str_time close to next time unit (hour, minute, etc.)
-                if (len(str_time) + 1) % 3 == 0:
-                    # Append colon.
-                    str_time = ":" + str_time
-                else:
-                    # Pad with 0's.
-                    str_time = "0" + str_time
-            if rtn_fmt == "datetime":
-                converted_times.append(datetime.datetime.strptime(str_time, "%H:%M:%S"))
-            elif rtn_fmt == "timedelta":
-                converted_times.append(
-                    (datetime.datetime.strptime(str_time, "%H:%M:%S") - self.BASE_TIME)
-                )
-        return converted_times
+        try:
+            return [parse_timestamp_ms(str_time) for str_time in str_times]
+        except ValueError as e:
+            raise YTAPIError(f"Unable to convert string timestamp. {e}")
 
     def validate_timestamps(
         self, timestamps, min_num_timestamps=5, percent_threshold=0.5
     ):
+        """
+        Validate timestamps by their similarity to the video duration.
+        :return: percent similarity message or None if invalid.
+        """
+        if percent_identity := self.timestamp_similarity(
+            timestamps, min_num_timestamps, percent_threshold
+        ):
+            return f"Percent similarity: {round(percent_identity * float(100), 2)}%"
+
+    def timestamp_similarity(
+        self, timestamps, min_num_timestamps=5, percent_threshold=0.5
+    ) -> Optional[float]:
+        """
+        Ratio (0-1) of total length of timestamps to video duration.
+        :return: ratio or None if invalid.
+        """
         # If total number of timestamps below minimum, reject timestamps
         # If total length not within 50% of actual video length, reject timestamps.
 
         if len(timestamps) < min_num_timestamps:
-            return
+            return None
 
         # Currently prefixed sum. Convert to individual lengths first.
         # Iterate through each timestamp ignoring last item, the track title.
-        dt_timestamps = [
+        ms_timestamps = [
             self.convert_str_time(timestamp[1:-1]) for timestamp in timestamps
         ]
         if self.timestamp_style == "Start":
-            # convert_str_time returns a list of datetimes. only one datetime with start timestamp style so take
+            # convert_str_time returns a list of times. only one time with start timestamp style so take
             # first item.
-            dt_timestamps = [dt[0] for dt in dt_timestamps]
-            # subtract next timestamp by current current timestamp
-            dt_lengths = [
-                dt_timestamps[ind + 1] - dt_timestamps[ind]
-                for ind in range(len(dt_timestamps) - 1)
-            ]
+            ms_timestamps = [ms[0] for ms in ms_timestamps]
+            # Sum of lengths between consecutive start times.
+            total_length = ms_timestamps[-1] - ms_timestamps[0]
         else:
             # end of timestamp - start of timestamp
-            dt_lengths = [dur[1] - dur[0] for dur in dt_timestamps]
-
-        total_length = reduce(lambda x, y: x + y, dt_lengths)
+            total_length = sum(dur[1] - dur[0] for dur in ms_timestamps)
 
         # If estimated length is under percent threshold, reject timestamp.
         # Main issue is that with start timestamps, last item will not be counted and less accurate in general.
@@ -533,25 +817,28 @@ class YTCompDL(Pytube_Dl):
         # So no "END" or "FIN". Not worth risk of matching track title.
 
         # As a result, default percent threshold high but not insanely high. Adjust accordingly.
-        percent_identity = total_length / self.duration
+        percent_identity = total_length / self.duration_ms
         if percent_threshold <= percent_identity:
-            return f"Percent similarity: {round(percent_identity * float(100), 2)}%"
+            return percent_identity
+        return None
 
-    def get_video_info(self, *parts: str) -> Iterator[dict]:
+    def get_video_info(self, vid_id: str) -> dict:
         """
-        Extract video information parts from YouTube video ID.
+        Request YT_VIDEO_PARTS of a video from the API.
+        Uses prefetched video_info if provided.
+        :param vid_id: video id.
+        :return: videos.list item (dict)
         """
-        if self.video_id:
+        if self.video_info is None:
             # query desired parts from video with matching video id.
             info_request = self.YT.videos().list(
-                part=f"{','.join(parts)}", id=self.video_id
+                part=f"{','.join(self.YT_VIDEO_PARTS)}", id=vid_id
             )
-            info_response = info_request.execute()
+            info_response = execute_request(info_request, self.api_cache, self.quota)
             if len(info_response["items"]) == 0:
                 raise YTAPIError("No video information available.")
-            for part in parts:
-                requested_part = info_response["items"][0][part]
-                yield requested_part
+            self.video_info = info_response["items"][0]
+        return self.video_info
 
     def set_timestamp_style(self, timestamps):
         # if length of all timestamps is 3, timestamp is based on start of chapter.
@@ -563,17 +850,25 @@ class YTCompDL(Pytube_Dl):
         else:
             raise YTAPIError("Invalid format in retrieved timestamps.")
 
-    def find_timestamps(self, timestamp_string):
+    def find_timestamps(self, timestamp_string) -> Iterator[Tuple[str, ...]]:
+        """
+        Find timestamps line-by-line.
+        :param timestamp_string: comment or description.
+        :return: timestamps as (str_title_front, *timestamp, str_title_back)
+        """
         # Replace '"' with '' to help extract titles
         # Split comment into lines to avoid bad regex matches at end.
         timestamp_string = timestamp_string.replace('"', "").split("\n")
 
         for line in timestamp_string:
-            if timestamps := re.findall(self.YT_TIME_REGEX, line):
+            if self.timestamp_tokenizer is not None:
+                if timestamp := self.timestamp_tokenizer.tokenize(line):
+                    yield timestamp
+            elif timestamps := self.YT_TIME_REGEX.findall(line):
                 if len(timestamps) == 1:
-                    yield re.findall(self.YT_START_TIMESTAMPS_REGEX, line)
+                    yield from self.YT_START_TIMESTAMPS_REGEX.findall(line)
                 elif len(timestamps) == 2:
-                    yield re.findall(self.YT_DUR_TIMESTAMPS_REGEX, line)
+                    yield from self.YT_DUR_TIMESTAMPS_REGEX.findall(line)
 
     def timestamps(self):
         """
@@ -581,14 +876,9 @@ class YTCompDL(Pytube_Dl):
         * timestamp can be one - two strings
         :return:
         """
-        valid_timestamps = []
-        parsed_timestamps = []
-
         if desc_timestamps := list(self.find_timestamps(self.desc)):
             logger.info("Timestamps found in description.")
             chosen_comment = self.desc.split("\n")
-            # remove extra list from list comprehension
-            desc_timestamps = reduce(lambda x, y: x + y, desc_timestamps)
             # Set timestamp style.
             self.set_timestamp_style(desc_timestamps)
             chosen_timestamps = self.clean_timestamps(desc_timestamps)
@@ -598,24 +888,9 @@ class YTCompDL(Pytube_Dl):
                 "Timestamps not found in description. Checking comment section."
             )
 
-            for comment in self.extract_comments(max_comments=self.MAX_COMMENTS):
-                if comm_timestamps := list(self.find_timestamps(comment)):
-                    comm_timestamps = reduce(lambda x, y: x + y, comm_timestamps)
-                    # Set timestamp style.
-
-                    self.set_timestamp_style(comm_timestamps)
-                    if time_perc_identity := self.validate_timestamps(
-                        comm_timestamps,
-                        min_num_timestamps=self.MIN_NUM_TIMESTAMPS,
-                        percent_threshold=self.LENGTH_THRESHOLD,
-                    ):
-                        valid_timestamps.append(
-                            [time_perc_identity, *comment.split("\n")]
-                        )
-                        parsed_timestamps.append(comm_timestamps)
-                        logger.info(
-                            f"Valid comment timestamps found ({time_perc_identity})."
-                        )
+            valid_timestamps, parsed_timestamps = self.rank_comments(
+                self.extract_comments(max_comments=self.MAX_COMMENTS)
+            )
 
             # If choose_comment=True, allow to choose which timestamps to select when multiple are valid.
             # Else, return comment timestamps with highest percentage identity.
@@ -626,13 +901,8 @@ class YTCompDL(Pytube_Dl):
                 chosen_comment = valid_timestamps[int(comment_num) - 1]
                 chosen_timestamps = parsed_timestamps[int(comment_num) - 1]
             else:
-                sorted_comments = list(
-                    sorted(valid_timestamps, key=lambda x: x[0], reverse=True)
-                )
-                chosen_comment = sorted_comments[0]
-                # Need original index before sort to get parsed timestamps.
-                original_index = valid_timestamps.index(chosen_comment)
-                chosen_timestamps = parsed_timestamps[original_index]
+                chosen_comment = valid_timestamps[0]
+                chosen_timestamps = parsed_timestamps[0]
 
             self.set_timestamp_style(chosen_timestamps)
 
@@ -642,6 +912,55 @@ class YTCompDL(Pytube_Dl):
 
         return self.clean_timestamps(chosen_timestamps)
 
+    def rank_comments(
+        self, comments: Iterator[str]
+    ) -> Tuple[List[List[str]], List[List[Tuple[str, ...]]]]:
+        """
+        Rank comments with valid timestamps by similarity to video duration.
+        Only the top MAX_CANDIDATES comments are kept.
+        Stops consuming comments once one is at least good_enough similar unless choosing comments.
+        :param comments: comments to rank.
+        :return: valid comments as [similarity message, *lines] and their parsed timestamps. Best first.
+        """
+        # min-heap of (similarity, -order, comment lines, parsed timestamps)
+        candidates = []
+        for order, comment in enumerate(comments):
+            if not (comm_timestamps := list(self.find_timestamps(comment))):
+                continue
+            # Set timestamp style.
+            self.set_timestamp_style(comm_timestamps)
+            if not (
+                similarity := self.timestamp_similarity(
+                    comm_timestamps,
+                    min_num_timestamps=self.MIN_NUM_TIMESTAMPS,
+                    percent_threshold=self.LENGTH_THRESHOLD,
+                )
+            ):
+                continue
+
+            time_perc_identity = (
+                f"Percent similarity: {round(similarity * float(100), 2)}%"
+            )
+            logger.info(f"Valid comment timestamps found ({time_perc_identity}).")
+            # Earlier comments are more relevant so win ties.
+            candidate = (
+                similarity,
+                -order,
+                [time_perc_identity, *comment.split("\n")],
+                comm_timestamps,
+            )
+            if len(candidates) < self.MAX_CANDIDATES:
+                heapq.heappush(candidates, candidate)
+            else:
+                heapq.heappushpop(candidates, candidate)
+
+            if not self.choose_comment and similarity >= self.good_enough:
+                logger.info("Found good enough comment timestamps. Stopping search.")
+                break
+
+        ranked = sorted(candidates, reverse=True)
+        return [cand[2] for cand in ranked], [cand[3] for cand in ranked]
+
     @staticmethod
     def select_comment(valid_timestamps):
         for num, v_comment in enumerate(valid_timestamps):
@@ -684,20 +1003,53 @@ class YTCompDL(Pytube_Dl):
             maxResults=100,
             order="relevance",
         )
-        # Increment for first request.
-        comments_checked += 100
-        while comment_request:
-            comment_response = comment_request.execute()
-            if comment_threads := comment_response.get("items"):
-                for thread in comment_threads:
-                    top_level_comment = thread["snippet"]["topLevelComment"]
-                    yield top_level_comment["snippet"]["textOriginal"]
-                # list next returns None if no items remaining.
-                comment_request = self.YT.commentThreads().list_next(
-                    comment_request, comment_response
-                )
+        # Fetch the next page in the background while the current page is consumed.
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            next_page = self._prefetch_comments(executor, comment_request, 0)
+            while next_page:
+                comment_request, comment_response = next_page.result()
+                # Increment for each request.
                 comments_checked += 100
-            else:
-                logger.info("No comments found.")
-            if comments_checked == max_comments:
-                comment_request = None
+                next_page = None
+                if comments_checked < max_comments:
+                    # list next returns None if no items remaining.
+                    next_page = self._prefetch_comments(
+                        executor,
+                        self.YT.commentThreads().list_next(
+                            comment_request, comment_response
+                        ),
+                        comments_checked,
+                    )
+
+                if comment_threads := comment_response.get("items"):
+                    for thread in comment_threads:
+                        top_level_comment = thread["snippet"]["topLevelComment"]
+                        yield top_level_comment["snippet"]["textOriginal"]
+                else:
+                    logger.info("No comments found.")
+        finally:
+            # Don't start queued requests if the consumer stops early.
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _prefetch_comments(
+        self, executor: ThreadPoolExecutor, comment_request, comments_checked: int
+    ) -> Optional[Future]:
+        """
+        Submit a comment page request to run in the background.
+        :return: future of request and its response or None if no request to make.
+        """
+        if comment_request is None:
+            return None
+        if not self.quota.can_afford(comment_request):
+            logger.warning(
+                f"Stopping comment scan after {comments_checked} comments "
+                f"to stay within quota budget. ({self.quota.used}/{self.quota.budget} units used)"
+            )
+            return None
+        return executor.submit(
+            lambda: (
+                comment_request,
+                execute_request(comment_request, self.api_cache, self.quota),
+            )
+        )